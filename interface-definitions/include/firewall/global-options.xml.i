@@ -143,6 +143,12 @@
       </properties>
       <defaultValue>300</defaultValue>
     </leafNode>
+    <leafNode name="ruleset-optimize">
+      <properties>
+        <help>Merge adjacent rules differing only in address or port into sets and verdict maps</help>
+        <valueless/>
+      </properties>
+    </leafNode>
     <leafNode name="send-redirects">
       <properties>
         <help>Policy for sending IPv4 ICMP redirect messages</help>
@@ -12,8 +12,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import socket
+
+from typing import Iterable
+from typing import Iterator
+
 from vyos.utils.process import rc_cmd
 
+accel_cli_host = '127.0.0.1'
+accel_cli_timeout = 60
+
 def get_server_statistics(accel_statistics, pattern, sep=':') -> dict:
     import re
 
@@ -38,33 +46,58 @@ def get_server_statistics(accel_statistics, pattern, sep=':') -> dict:
     return stat_dict
 
 
-def accel_cmd(port: int, command: str) -> str:
-    _, output = rc_cmd(f'/usr/bin/accel-cmd -p{port} {command}')
-    return output
+def accel_cmd_lines(port: int, command: str) -> Iterator[str]:
+    """
+    Run command on the accel-ppp TCP CLI (the one used by accel-cmd) and
+    yield its output line by line as it is received
+    """
+    with socket.create_connection((accel_cli_host, port),
+                                  timeout=accel_cli_timeout) as sock:
+        # accel-ppp closes the connection after the exit command, so the
+        # output of command is complete once EOF is read
+        sock.sendall(f'{command}\nexit\n'.encode())
+        with sock.makefile('rb') as stream:
+            for line in stream:
+                yield line.decode(errors='replace').rstrip('\r\n')
 
 
-def accel_out_parse(accel_output: list[str]) -> list[dict[str, str]]:
-    """ Parse accel-cmd show sessions output """
-    data_list: list[dict[str, str]] = list()
-    field_names: list[str] = list()
+def accel_cmd(port: int, command: str) -> str:
+    try:
+        return '\n'.join(accel_cmd_lines(port, command)).strip()
+    except OSError:
+        # CLI not reachable, let accel-cmd report the error
+        _, output = rc_cmd(f'/usr/bin/accel-cmd -p{port} {command}')
+        return output
+
 
-    field_names_unstripped: list[str] = accel_output.pop(0).split('|')
-    for field_name in field_names_unstripped:
-        field_names.append(field_name.strip())
+def accel_out_iter(accel_output: Iterable[str]) -> Iterator[dict[str, str]]:
+    """ Parse accel-cmd show sessions output, one dict per session """
+    lines = iter(accel_output)
+    header = next(lines, None)
+    if header is None:
+        return
+    field_names: list[str] = [field_name.strip() for field_name in header.split('|')]
 
-    while accel_output:
-        if '|' not in accel_output[0]:
-            accel_output.pop(0)
+    for line in lines:
+        # skip the header separator and anything that is not a row
+        if '|' not in line:
             continue
+        yield {field_name: field_value.strip()
+               for field_name, field_value in zip(field_names, line.split('|'))}
 
-        current_item: list[str] = accel_output.pop(0).split('|')
-        item_dict: dict[str, str] = {}
 
-        for field_index in range(len(current_item)):
-            field_name: str = field_names[field_index]
-            field_value: str = current_item[field_index].strip()
-            item_dict[field_name] = field_value
+def accel_out_parse(accel_output: list[str]) -> list[dict[str, str]]:
+    """ Parse accel-cmd show sessions output """
+    return list(accel_out_iter(accel_output))
 
-        data_list.append(item_dict)
 
-    return data_list
+def accel_sessions(port: int, columns: list[str],
+                   order: str = None) -> Iterator[dict[str, str]]:
+    """
+    Stream sessions from the accel-ppp CLI as dicts, only the given columns
+    are rendered by accel-ppp
+    """
+    command = f'show sessions {",".join(columns)}'
+    if order:
+        command += f' order {order}'
+    return accel_out_iter(accel_cmd_lines(port, command))
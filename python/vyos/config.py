@@ -64,6 +64,7 @@
 
 import re
 import json
+from copy import deepcopy
 from typing import Union
 
 import vyos.configtree
@@ -140,6 +141,7 @@ def __init__(self, session_env=None, config_source=None):
 
         self._level = []
         self._dict_cache = {}
+        self._subtree_dict_cache = {}
         (self._running_config,
          self._session_config) = self._config_source.get_configtree_tuple()
 
@@ -278,6 +280,53 @@ def get_cached_root_dict(self, effective=False):
 
         return config_dict
 
+    def get_cached_dict(self, lpath: list, effective=False) -> dict:
+        """
+        Return a dict containing (at least) the config below lpath, nested
+        under the keys of lpath, as get_sub_dict() expects.
+
+        If the root dict has already been materialized it is used directly;
+        otherwise only the subtree at lpath is exported from the config
+        tree, and the result is cached per path.
+        """
+        if not lpath or self.has_cached_root_dict(effective=effective):
+            return self.get_cached_root_dict(effective)
+
+        key = (effective, tuple(lpath))
+        cached = self._subtree_dict_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if effective:
+            config = self._running_config
+        else:
+            config = self._session_config
+
+        if config and config.exists(lpath):
+            subtree = config.get_subtree(lpath, with_node=True)
+            config_dict = json.loads(subtree.to_json())
+        else:
+            config_dict = {}
+
+        for k in reversed(lpath[:-1]):
+            config_dict = {k: config_dict}
+
+        self._subtree_dict_cache[key] = config_dict
+
+        return config_dict
+
+    def has_cached_root_dict(self, effective=False) -> bool:
+        return bool(self._dict_cache.get(effective, {}))
+
+    def set_cached_root_dict(self, config_dict: dict, effective=False):
+        """
+        Seed the root dict cache with a dict previously computed from an
+        identical config tree, e.g. kept by vyos-configd across commits.
+        The dict is shared, not copied: get_config_dict() and ConfigDiff
+        only hand out copies of it.
+        """
+        self._dict_cache[effective] = config_dict
+
     def verify_mangling(self, key_mangling):
         if not (isinstance(key_mangling, tuple) and \
                 (len(key_mangling) == 2) and \
@@ -309,8 +358,10 @@ def get_config_dict(self, path=[], effective=False, key_mangling=None,
         del kwargs['with_pki']
 
         lpath = self._make_path(path)
-        root_dict = self.get_cached_root_dict(effective)
-        conf_dict = get_sub_dict(root_dict, lpath, get_first_key=get_first_key)
+        root_dict = self.get_cached_dict(lpath, effective)
+        # the root dict is cached, possibly across commits, callers are free
+        # to modify what they get
+        conf_dict = deepcopy(get_sub_dict(root_dict, lpath, get_first_key=get_first_key))
 
         rpath = lpath if get_first_key else lpath[:-1]
 
@@ -352,7 +403,7 @@ def get_config_defaults(self, path=[], effective=False, key_mangling=None,
                             no_tag_node_value_mangle=False, get_first_key=False,
                             recursive=False) -> dict:
         lpath = self._make_path(path)
-        root_dict = self.get_cached_root_dict(effective)
+        root_dict = self.get_cached_dict(lpath, effective)
         conf_dict = get_sub_dict(root_dict, lpath, get_first_key)
 
         defaults = relative_defaults(lpath, conf_dict,
@@ -23,8 +23,6 @@
 from typing import Tuple
 from filecmp import cmp
 from datetime import datetime
-from textwrap import dedent
-from pathlib import Path
 from tabulate import tabulate
 from shutil import copy, chown
 from urllib.parse import urlsplit
@@ -33,7 +31,13 @@
 from vyos.config import Config
 from vyos.configtree import ConfigTree
 from vyos.configtree import ConfigTreeError
+from vyos.configtree import DiffTree
 from vyos.configtree import show_diff
+from vyos.config_revision import RevisionStore
+from vyos.config_revision import RevisionStoreError
+from vyos.config_revision import change_summary
+from vyos.config_revision import summary_touches
+from vyos.config_revision import summary_depth
 from vyos.load_config import load
 from vyos.load_config import LoadConfigError
 from vyos.defaults import directories
@@ -58,6 +62,9 @@
 config_file = os.path.join(directories['config'], 'config.boot')
 archive_dir = os.path.join(directories['config'], 'archive')
 archive_config_file = os.path.join(archive_dir, 'config.boot')
+revision_dir = os.path.join(archive_dir, 'revisions')
+# commit log and logrotate files of the config.boot.N.gz archive, migrated
+# to the revision store on initialization
 commit_log_file = os.path.join(archive_dir, 'commits')
 logrotate_conf = os.path.join(archive_dir, 'lr.conf')
 logrotate_state = os.path.join(archive_dir, 'lr.state')
@@ -93,11 +100,9 @@ def unsaved_commits(allow_missing_config=False) -> bool:
     return ret
 
 def get_file_revision(rev: int):
-    revision = os.path.join(archive_dir, f'config.boot.{rev}.gz')
     try:
-        with gzip.open(revision) as f:
-            r = f.read().decode()
-    except FileNotFoundError:
+        r = RevisionStore(revision_dir).get(rev)
+    except RevisionStoreError:
         logger.warning(f'commit revision {rev} not available')
         return ''
     return r
@@ -107,7 +112,15 @@ def get_config_tree_revision(rev: int):
     return ConfigTree(c)
 
 def is_node_revised(path: list = [], rev1: int = 1, rev2: int = 0) -> bool:
-    from vyos.configtree import DiffTree
+    # answered from the change summaries of the commit log, if possible
+    try:
+        revised = RevisionStore(revision_dir).is_revised(path, rev1, rev2)
+    except RevisionStoreError:
+        revised = None
+    if revised is False:
+        return False
+    if revised and len(path) <= summary_depth:
+        return True
     left = get_config_tree_revision(rev1)
     right = get_config_tree_revision(rev2)
     diff_tree = DiffTree(left, right)
@@ -134,6 +147,7 @@ def __init__(self, session_env=None, config=None):
 
         self.max_revisions = int(d.get('commit_revisions', 0))
         self.num_revisions = 0
+        self.revisions = RevisionStore(revision_dir)
         self.locations = d.get('commit_archive', {}).get('location', [])
         self.source_address = d.get('commit_archive',
                                     {}).get('source_address', '')
@@ -222,7 +236,6 @@ def confirm(self) -> Tuple[str,int]:
 
         if self._archive_active_config():
             self._add_log_entry(**entry)
-            self._update_archive()
 
         msg = 'Reboot timer stopped'
         return msg, 0
@@ -257,11 +270,9 @@ def rollback(self, rev: int, no_prompt: bool=False) -> Tuple[str,int]:
         if rc != 0:
             raise ConfigMgmtError(out)
 
-        path = os.path.join(archive_dir, f'config.boot.{rev}.gz')
-        with gzip.open(path) as f:
-            config = f.read()
+        config = self._get_file_revision(rev)
         try:
-            with open(rollback_config, 'wb') as f:
+            with open(rollback_config, 'w') as f:
                 f.write(config)
             copy(rollback_config, config_file)
         except OSError as e:
@@ -309,16 +320,25 @@ def compare(self, saved: bool=False, commands: bool=False,
         if rev1 is not None:
             if not self._check_revision_number(rev1):
                 return f'Invalid revision number {rev1}', 1
-            ct1 = self._get_config_tree_revision(rev1)
-            ct2 = self.working_config
+            if rev2 is None:
+                ct1 = self._get_config_tree_revision(rev1)
+                ct2 = self.working_config
             msg = f'No changes between working and revision {rev1} configurations.\n'
         if rev2 is not None:
             if not self._check_revision_number(rev2):
                 return f'Invalid revision number {rev2}', 1
+            msg = f'No changes between revisions {rev2} and {rev1} configurations.\n'
             # compare older to newer
-            ct2 = ct1
+            if rev1 is None:
+                ct2 = ct1
+            else:
+                # skip parsing revisions if the commit index shows no
+                # changes in between
+                path = [] if commands else self.edit_path
+                if not self._is_revised(path, rev1, rev2):
+                    return msg, 0
+                ct2 = self._get_config_tree_revision(rev1)
             ct1 = self._get_config_tree_revision(rev2)
-            msg = f'No changes between revisions {rev2} and {rev1} configurations.\n'
 
         out = ''
         path = [] if commands else self.edit_path
@@ -358,10 +378,19 @@ def wrap_compare(self, options) -> Tuple[str,int]:
     # Initialization and post-commit hooks for conf-mode
     #
     def initialize_revision(self):
-        """Initialize config archive, logrotate conf, and commit log.
+        """Initialize config archive, revision store, and commit log.
         """
         mask = os.umask(0o002)
         os.makedirs(archive_dir, exist_ok=True)
+        # revisions are added by post-commit hooks running as the
+        # committing user
+        for d in (revision_dir, self.revisions.object_dir):
+            os.makedirs(d, exist_ok=True)
+            try:
+                chown(d, group='vyattacfg')
+                os.chmod(d, 0o2775)
+            except OSError as e:
+                logger.warning(f'cannot set permissions of {d}: {e}')
         json_dir = os.path.dirname(config_json)
         try:
             os.makedirs(json_dir, exist_ok=True)
@@ -369,10 +398,10 @@ def initialize_revision(self):
         except OSError as e:
             logger.warning(f'cannot create {json_dir}: {e}')
 
-        self._add_logrotate_conf()
+        if os.path.exists(commit_log_file):
+            self._migrate_archive()
 
-        if (not os.path.exists(commit_log_file) or
-            self._get_number_of_revisions() == 0):
+        if self._get_number_of_revisions() == 0:
             user = self._get_user()
             via = 'init'
             comment = ''
@@ -380,12 +409,11 @@ def initialize_revision(self):
             # and diff consistency
             if self._archive_active_config():
                 self._add_log_entry(user, via, comment)
-                self._update_archive()
 
         os.umask(mask)
 
     def commit_revision(self):
-        """Update commit log and rotate archived config.boot.
+        """Update commit log and add archived config.boot to revisions.
 
         commit_revision is called in post-commit-hooks, if
         ['commit-archive', 'commit-revisions'] is configured.
@@ -396,7 +424,6 @@ def commit_revision(self):
 
         if self._archive_active_config():
             self._add_log_entry()
-            self._update_archive()
 
     def commit_archive(self):
         """Upload config to remote archive.
@@ -421,14 +448,28 @@ def commit_archive(self):
 
     # op-mode functions
     #
-    def get_raw_log_data(self) -> list:
+    def get_raw_log_data(self, path: Optional[list]=None) -> list:
         """Return list of dicts of log data:
-           keys: [timestamp, user, commit_via, commit_comment]
+           keys: [timestamp, user, commit_via, commit_comment, revision,
+                  changes]
+
+        'changes' is the number of values changed by the commit, if known;
+        if 'path' is given, only commits with changes at or below path are
+        returned.
         """
         log = self._get_log_entries()
+        summaries = self.revisions.summaries()
         res_l = []
-        for line in log:
+        for rev, line in enumerate(log):
+            summary = summaries[rev]
+            if path is not None and summary is not None:
+                if not summary_touches(summary, path):
+                    continue
             d = self._get_log_entry(line)
+            d['revision'] = rev
+            d['changes'] = None
+            if summary is not None:
+                d['changes'] = sum(a + r for _, a, r in summary)
             res_l.append(d)
 
         return res_l
@@ -442,7 +483,7 @@ def format_log_data(data: list) -> str:
             time_d = datetime.fromtimestamp(int(l['timestamp']))
             time_str = time_d.strftime("%Y-%m-%d %H:%M:%S")
 
-            res_l.append([l_no, time_str,
+            res_l.append([l.get('revision', l_no), time_str,
                           f"by {l['user']}", f"via {l['commit_via']}"])
 
             if l['commit_comment'] != 'commit': # default comment
@@ -495,28 +536,69 @@ def _get_saved_config_tree(self):
     def _get_file_revision(self, rev: int):
         if rev not in range(0, self._get_number_of_revisions()):
             raise ConfigMgmtError('revision not available')
-        revision = os.path.join(archive_dir, f'config.boot.{rev}.gz')
-        with gzip.open(revision) as f:
-            r = f.read().decode()
+        try:
+            r = self.revisions.get(rev)
+        except RevisionStoreError as e:
+            raise ConfigMgmtError(e) from e
         return r
 
     def _get_config_tree_revision(self, rev: int):
         c = self._get_file_revision(rev)
         return ConfigTree(c)
 
-    def _add_logrotate_conf(self):
-        conf: str = dedent(f"""\
-        {archive_config_file} {{
-            su root vyattacfg
-            rotate {self.max_revisions}
-            start 0
-            compress
-            copy
-        }}
-        """)
-        conf_file = Path(logrotate_conf)
-        conf_file.write_text(conf)
-        conf_file.chmod(0o644)
+    def _get_change_summary(self, config: str) -> Optional[list]:
+        # summary of changes against the most recent revision, recorded
+        # with the commit log entry
+        try:
+            left = None
+            if self._get_number_of_revisions() > 0:
+                left = ConfigTree(self.revisions.get(0))
+            diff = DiffTree(left, ConfigTree(config))
+        except (ValueError, ConfigTreeError, RevisionStoreError) as e:
+            logger.warning(f'cannot summarize commit changes: {e}')
+            return None
+        return change_summary(diff.dict.get('add', {}),
+                              diff.dict.get('sub', {}))
+
+    def _is_revised(self, path: list, rev1: int, rev2: int) -> bool:
+        try:
+            return self.revisions.is_revised(path, rev1, rev2) is not False
+        except RevisionStoreError:
+            return True
+
+    def _add_revision(self, config: str, entry: str):
+        summary = self._get_change_summary(config)
+        self.revisions.append(config, entry, summary)
+        self.revisions.truncate(self.max_revisions)
+
+    def _migrate_archive(self):
+        # import config.boot.N.gz revisions rotated by logrotate into the
+        # revision store, oldest first; archives which can not be read are
+        # kept along with the commit log
+        if self._get_number_of_revisions() > 0:
+            return
+
+        with open(commit_log_file) as f:
+            entries = f.readlines()
+        failed = []
+        for rev in reversed(range(len(entries))):
+            revision = os.path.join(archive_dir, f'config.boot.{rev}.gz')
+            try:
+                with gzip.open(revision) as f:
+                    config = f.read().decode()
+            except OSError as e:
+                logger.warning(f'commit revision {rev} not migrated: {e}')
+                failed.append(rev)
+                continue
+            self._add_revision(config, entries[rev])
+            os.unlink(revision)
+
+        if failed:
+            logger.warning(f'{commit_log_file} kept, commit revisions {failed} not migrated')
+            return
+        for f in (commit_log_file, logrotate_conf, logrotate_state):
+            if os.path.exists(f):
+                os.unlink(f)
 
     def _archive_active_config(self) -> bool:
         save_to_tmp = (boot_configuration_complete() or not
@@ -558,27 +640,13 @@ def _archive_active_config(self) -> bool:
 
         return True
 
-    @staticmethod
-    def _update_archive():
-        cmd = f"sudo logrotate -f -s {logrotate_state} {logrotate_conf}"
-        rc, out = rc_cmd(cmd)
-        if rc != 0:
-            logger.critical(f'logrotate failure: {out}')
-
-    @staticmethod
-    def _get_log_entries() -> list:
+    def _get_log_entries(self) -> list:
         """Return lines of commit log as list of strings
         """
-        entries = []
-        if os.path.exists(commit_log_file):
-            with open(commit_log_file) as f:
-                entries = f.readlines()
-
-        return entries
+        return self.revisions.log_entries()
 
     def _get_number_of_revisions(self) -> int:
-        l = self._get_log_entries()
-        return len(l)
+        return len(self.revisions)
 
     def _check_revision_number(self, rev: int) -> bool:
         self.num_revisions = self._get_number_of_revisions()
@@ -674,15 +742,11 @@ def _add_log_entry(self, user: str='', commit_via: str='',
                                     commit_comment=commit_comment,
                                     timestamp=timestamp)
 
-        log_entries = self._get_log_entries()
-        log_entries.insert(0, entry)
-        if len(log_entries) > self.max_revisions:
-            log_entries = log_entries[:-1]
-
         try:
-            with open(commit_log_file, 'w') as f:
-                f.writelines(log_entries)
-        except OSError as e:
+            with open(archive_config_file) as f:
+                config = f.read()
+            self._add_revision(config, entry)
+        except (OSError, RevisionStoreError) as e:
             logger.critical(e)
 
         os.umask(mask)
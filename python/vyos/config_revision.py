@@ -0,0 +1,407 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Append-only store of config revisions.
+
+Every revision is kept as a content-addressed object, either a full
+snapshot of the config or a line delta against the most recent snapshot.
+A fixed-size record per revision in the index file refers to the objects
+and to the commit log entry of the revision in the log file, so appending
+a revision, counting revisions and locating any of them does not depend
+on the number of revisions kept. The log entry is followed by a summary
+of the paths changed by the commit, so questions about the commit history
+are answered without reconstructing and diffing revisions.
+
+Layout of the store directory:
+
+    index      one record per revision, oldest first
+    log        commit log entries, '|timestamp|user|via|comment|', each
+               followed by a line with the JSON change summary
+    start      number of expired records at the head of the index
+    objects/   gzip compressed objects, named by sha256 of their content
+"""
+
+import os
+import json
+import gzip
+
+from hashlib import sha256
+from typing import NamedTuple
+from typing import Optional
+
+# a new full snapshot is written after this many deltas
+snapshot_interval = 20
+# number of consecutive lines used to locate copies in a line delta
+delta_block = 4
+# changed values are summarized per path of up to this many nodes
+summary_depth = 3
+
+class RevisionStoreError(Exception):
+    pass
+
+class _Record(NamedTuple):
+    kind: str       # 'F' for a full snapshot, 'D' for a delta
+    object: str     # object holding the snapshot or the delta
+    base: str       # snapshot object the delta applies to
+    digest: str     # sha256 of the config text of the revision
+    depth: int      # number of deltas written since the snapshot
+    offset: int     # location of the log entry in the log file
+    length: int
+    summary: int    # length of the change summary following the entry
+
+    def encode(self) -> bytes:
+        return (f'{self.kind} {self.object} {self.base} {self.digest} '
+                f'{self.depth:04d} {self.offset:012d} {self.length:06d} '
+                f'{self.summary:010d}\n').encode()
+
+    @classmethod
+    def decode(cls, data: bytes):
+        kind, obj, base, digest, *fields = data.decode().split()
+        return cls(kind, obj, base, digest, *map(int, fields))
+
+record_size = len(_Record('F', '0' * 64, '0' * 64, '0' * 64, 0, 0, 0, 0).encode())
+
+def _digest(data: bytes) -> str:
+    return sha256(data).hexdigest()
+
+def line_delta(base: list, lines: list) -> list:
+    """Return delta from list of lines 'base' to 'lines': a list of
+    [start, end] ranges copied from base, and strings to insert.
+    """
+    # copies are located by the first occurrence of a line in base, and
+    # only taken if a block of consecutive lines matches; matching is
+    # linear in the size of the config, at the price of a slightly larger
+    # delta than a minimal diff
+    index = dict(zip(reversed(base), range(len(base) - 1, -1, -1)))
+
+    delta = []
+    insert = []
+    start = pos = None
+    j = 0
+    while j < len(lines):
+        if pos is not None:
+            # skip equal runs a chunk at a time
+            chunk = lines[j:j + 64]
+            if base[pos:pos + 64] == chunk:
+                pos += len(chunk)
+                j += len(chunk)
+                continue
+            if pos < len(base) and base[pos] == lines[j]:
+                pos += 1
+                j += 1
+                continue
+            delta.append([start, pos])
+            pos = None
+        block = lines[j:j + delta_block]
+        match = index.get(lines[j])
+        if match is None or base[match:match + len(block)] != block:
+            insert.append(lines[j])
+            j += 1
+            continue
+        if insert:
+            delta.append(''.join(insert))
+            insert = []
+        start = pos = match
+    if pos is not None:
+        delta.append([start, pos])
+    if insert:
+        delta.append(''.join(insert))
+
+    return delta
+
+def apply_line_delta(base: list, delta: list) -> str:
+    out = []
+    for op in delta:
+        if isinstance(op, str):
+            out.append(op)
+        else:
+            out.extend(base[op[0]:op[1]])
+    return ''.join(out)
+
+def _count_values(node) -> int:
+    # leaf values in a config dict; a valueless node counts as one value
+    if isinstance(node, dict):
+        return sum(map(_count_values, node.values())) if node else 1
+    if isinstance(node, list):
+        return len(node)
+    return 1
+
+def _summarize(node, path: list, depth: int):
+    if len(path) == depth or not isinstance(node, dict) or not node:
+        yield tuple(path), _count_values(node)
+        return
+    for key, value in node.items():
+        yield from _summarize(value, path + [key], depth)
+
+def change_summary(added: dict, removed: dict, depth: int=summary_depth) -> list:
+    """Return summary of a config diff, as found in the 'add' and 'sub'
+    trees of a DiffTree: a list of [path, added, removed], counting the
+    values changed below each path of up to 'depth' nodes.
+    """
+    summary = {}
+    for i, tree in enumerate((added, removed)):
+        if not tree:
+            continue
+        for path, count in _summarize(tree, [], depth):
+            summary.setdefault(path, [0, 0])[i] += count
+    return [[list(path), *counts] for path, counts in sorted(summary.items())]
+
+def summary_touches(summary: list, path: list) -> bool:
+    """Return whether the changes of a summary are at or below 'path'; a
+    path deeper than the summary matches on its leading nodes.
+    """
+    for changed, _, _ in summary:
+        n = min(len(changed), len(path))
+        if changed[:n] == path[:n]:
+            return True
+    return False
+
+class RevisionStore:
+    """Config revisions, numbered from 0 for the most recent one."""
+    def __init__(self, path: str):
+        self.path = path
+        self.index_file = os.path.join(path, 'index')
+        self.log_file = os.path.join(path, 'log')
+        self.start_file = os.path.join(path, 'start')
+        self.object_dir = os.path.join(path, 'objects')
+        self._snapshot = (None, [])
+
+    def __len__(self) -> int:
+        return max(0, self._records() - self._start())
+
+    def _records(self) -> int:
+        try:
+            return os.path.getsize(self.index_file) // record_size
+        except FileNotFoundError:
+            return 0
+
+    def _start(self) -> int:
+        try:
+            with open(self.start_file) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _read_records(self, first: int, count: int) -> list:
+        with open(self.index_file, 'rb') as f:
+            f.seek(first * record_size)
+            data = f.read(count * record_size)
+        return [_Record.decode(data[i:i + record_size])
+                for i in range(0, len(data), record_size)]
+
+    def _record(self, rev: int) -> _Record:
+        records = self._records()
+        if not 0 <= rev < records - self._start():
+            raise RevisionStoreError(f'revision {rev} not available')
+        return self._read_records(records - 1 - rev, 1)[0]
+
+    def _object_path(self, name: str) -> str:
+        return os.path.join(self.object_dir, name)
+
+    def _read_object(self, name: str) -> bytes:
+        try:
+            with gzip.open(self._object_path(name)) as f:
+                return f.read()
+        except (OSError, EOFError) as e:
+            raise RevisionStoreError(f'cannot read object {name}: {e}') from e
+
+    def _write_object(self, data: bytes) -> str:
+        name = _digest(data)
+        path = self._object_path(name)
+        # objects are immutable; identical content is stored once
+        if not os.path.exists(path):
+            tmp = f'{path}.{os.getpid()}'
+            with open(tmp, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp, path)
+        return name
+
+    def _snapshot_lines(self, name: str) -> list:
+        # the latest snapshot is the base of all revisions written since
+        if self._snapshot[0] != name:
+            text = self._read_object(name).decode()
+            self._snapshot = (name, text.splitlines(keepends=True))
+        return self._snapshot[1]
+
+    def get(self, rev: int) -> str:
+        """Return config text of revision 'rev'."""
+        record = self._record(rev)
+        base = self._snapshot_lines(record.base)
+        if record.kind == 'F':
+            text = ''.join(base)
+        else:
+            delta = json.loads(self._read_object(record.object))
+            text = apply_line_delta(base, delta)
+        if _digest(text.encode()) != record.digest:
+            raise RevisionStoreError(f'revision {rev} is corrupted')
+        return text
+
+    def digest(self, rev: int) -> str:
+        return self._record(rev).digest
+
+    def log_entry(self, rev: int) -> str:
+        record = self._record(rev)
+        with open(self.log_file, 'rb') as f:
+            f.seek(record.offset)
+            return f.read(record.length).decode()
+
+    def summary(self, rev: int) -> Optional[list]:
+        """Return change summary of revision 'rev' against the previous
+        revision, or None if unknown.
+        """
+        record = self._record(rev)
+        with open(self.log_file, 'rb') as f:
+            f.seek(record.offset + record.length)
+            return json.loads(f.read(record.summary) or 'null')
+
+    def _read_log(self) -> list:
+        # (entry, summary data) of all revisions, most recent first
+        start = self._start()
+        count = self._records() - start
+        if count <= 0:
+            return []
+        records = self._read_records(start, count)
+        base = records[0].offset
+        with open(self.log_file, 'rb') as f:
+            f.seek(base)
+            data = f.read()
+        log = []
+        for r in reversed(records):
+            offset = r.offset - base
+            log.append((data[offset:offset + r.length],
+                        data[offset + r.length:offset + r.length + r.summary]))
+        return log
+
+    def log_entries(self) -> list:
+        """Return commit log entries, most recent first."""
+        return [entry.decode() for entry, _ in self._read_log()]
+
+    def summaries(self) -> list:
+        """Return change summaries, most recent first."""
+        return [json.loads(summary or 'null') for _, summary in self._read_log()]
+
+    def touched(self, path: list) -> list:
+        """Return revisions with changes at or below 'path'; revisions
+        without a change summary are included.
+        """
+        return [rev for rev, summary in enumerate(self.summaries())
+                if summary is None or summary_touches(summary, path)]
+
+    def is_revised(self, path: list, rev1: int, rev2: int) -> Optional[bool]:
+        """Return whether there are changes at or below 'path' between
+        revisions 'rev1' and 'rev2', from the change summaries of the
+        revisions in between, or None if one of them is unknown. For a
+        path deeper than summary_depth, True means the path may have
+        changed.
+        """
+        low, high = sorted((rev1, rev2))
+        if self.digest(low) == self.digest(high):
+            return False
+        revised = False
+        for summary in self.summaries()[low:high]:
+            if summary is None:
+                return None
+            revised = revised or summary_touches(summary, path)
+        return revised
+
+    def append(self, text: str, entry: str, summary: Optional[list]=None):
+        """Add config text as most recent revision, with commit log entry
+        and summary of the changes against the previous revision.
+        """
+        data = text.encode()
+        digest = _digest(data)
+        lines = text.splitlines(keepends=True)
+
+        records = self._records()
+        last = self._read_records(records - 1, 1)[0] if len(self) else None
+        record = None
+        if last is not None and last.depth + 1 < snapshot_interval:
+            try:
+                base = self._snapshot_lines(last.base)
+                delta = json.dumps(line_delta(base, lines),
+                                   separators=(',', ':')).encode()
+                # a delta larger than half the config is not worth it
+                if len(delta) < len(data) // 2:
+                    name = self._write_object(delta)
+                    record = _Record('D', name, last.base, digest,
+                                     last.depth + 1, 0, 0, 0)
+            except RevisionStoreError:
+                pass
+        if record is None:
+            name = self._write_object(data)
+            record = _Record('F', name, name, digest, 0, 0, 0, 0)
+            self._snapshot = (name, lines)
+
+        entry = entry.encode()
+        summary = json.dumps(summary, separators=(',', ':')).encode() + b'\n'
+        with open(self.log_file, 'ab') as f:
+            offset = f.tell()
+            f.write(entry + summary)
+        record = record._replace(offset=offset, length=len(entry),
+                                 summary=len(summary))
+
+        with open(self.index_file, 'ab') as f:
+            # drop a partial record left by an interrupted append
+            if f.tell() != records * record_size:
+                f.truncate(records * record_size)
+            f.write(record.encode())
+
+    def truncate(self, max_revisions: int):
+        """Keep only the 'max_revisions' most recent revisions."""
+        expired = len(self) - max_revisions
+        if expired <= 0:
+            return
+        start = self._start() + expired
+        # expired records are only marked; the index and log are rewritten
+        # once per snapshot interval
+        if start < snapshot_interval:
+            self._write_start(start)
+            return
+        self._compact(start)
+
+    def _write_start(self, start: int):
+        tmp = f'{self.start_file}.{os.getpid()}'
+        with open(tmp, 'w') as f:
+            f.write(f'{start}\n')
+        os.replace(tmp, self.start_file)
+
+    def _compact(self, start: int):
+        records = self._read_records(start, self._records() - start)
+        with open(self.log_file, 'rb') as f:
+            f.seek(records[0].offset)
+            log = f.read()
+
+        log_out = []
+        index_out = []
+        offset = 0
+        base = records[0].offset
+        for r in records:
+            size = r.length + r.summary
+            log_out.append(log[r.offset - base:r.offset - base + size])
+            index_out.append(r._replace(offset=offset).encode())
+            offset += size
+
+        for path, data in ((self.log_file, log_out), (self.index_file, index_out)):
+            tmp = f'{path}.{os.getpid()}'
+            with open(tmp, 'wb') as f:
+                f.writelines(data)
+            os.replace(tmp, path)
+        self._write_start(0)
+
+        used = {r.object for r in records} | {r.base for r in records}
+        for name in os.listdir(self.object_dir):
+            if name not in used:
+                os.unlink(self._object_path(name))
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
+from copy import deepcopy
 from enum import IntFlag
 from enum import auto
 
@@ -62,8 +63,9 @@ def _key_sets_from_dicts(session_dict, effective_dict):
 def _dict_from_key_set(key_set, d):
     # This will always be applied to a key_set obtained from a get_sub_dict,
     # hence there is no possibility of KeyError, as get_sub_dict guarantees
-    # a return type of dict
-    ret = {k: d[k] for k in key_set}
+    # a return type of dict; values are copied, as d is part of the cached
+    # root dict of the config
+    ret = {k: deepcopy(d[k]) for k in key_set}
 
     return ret
 
@@ -249,7 +251,7 @@ def get_child_nodes_diff(self, path=[], expand_nodes=Diff(0), no_defaults=False,
                 sub = get_sub_dict(self._diff_dict, ['sub'], get_first_key=True)
                 inter = get_sub_dict(self._diff_dict, ['inter'], get_first_key=True)
                 ret = {}
-                ret[enum_to_key(Diff.MERGE)] = session_dict
+                ret[enum_to_key(Diff.MERGE)] = deepcopy(session_dict)
                 ret[enum_to_key(Diff.DELETE)] = get_sub_dict(sub, self._make_path(path),
                                                              get_first_key=True)
                 ret[enum_to_key(Diff.ADD)] = get_sub_dict(add, self._make_path(path),
@@ -328,7 +330,7 @@ def get_node_diff(self, path=[], expand_nodes=Diff(0), no_defaults=False,
                 sub = get_sub_dict(self._diff_dict, ['sub'], get_first_key=True)
                 inter = get_sub_dict(self._diff_dict, ['inter'], get_first_key=True)
                 ret = {}
-                ret[enum_to_key(Diff.MERGE)] = session_dict
+                ret[enum_to_key(Diff.MERGE)] = deepcopy(session_dict)
                 ret[enum_to_key(Diff.DELETE)] = get_sub_dict(sub, self._make_path(path))
                 ret[enum_to_key(Diff.ADD)] = get_sub_dict(add, self._make_path(path))
                 ret[enum_to_key(Diff.STABLE)] = get_sub_dict(inter, self._make_path(path))
@@ -387,9 +389,9 @@ def get_value_diff(self, path=[]):
         new_value = None
         old_value = None
         if new_value_dict:
-            new_value = next(iter(new_value_dict.values()))
+            new_value = deepcopy(next(iter(new_value_dict.values())))
         if old_value_dict:
-            old_value = next(iter(old_value_dict.values()))
+            old_value = deepcopy(next(iter(old_value_dict.values())))
 
         if new_value and isinstance(new_value, dict):
             raise ConfigDiffError("get_value_changed called on non-leaf node")
@@ -18,9 +18,17 @@
 import sys
 import subprocess
 
+from tempfile import NamedTemporaryFile
+
+from vyos.configtree import ConfigTree
+from vyos.configtree import ConfigTreeError
 from vyos.defaults import directories
 from vyos.utils.process import is_systemd_service_running
 from vyos.utils.dict import dict_to_paths
+from vyos.xml_ref import is_leaf
+from vyos.xml_ref import is_multi
+from vyos.xml_ref import is_tag
+from vyos.xml_ref import is_valueless
 
 CLI_SHELL_API = '/bin/cli-shell-api'
 SET = '/opt/vyatta/sbin/my_set'
@@ -95,6 +103,55 @@ class ConfigSessionError(Exception):
     pass
 
 
+def _split_value(path: list) -> tuple:
+    """
+    Split a set/delete path into node path and value according to the
+    reference tree, raise ValueError for paths that do not exist there
+    """
+    if len(path) > 1 and is_leaf(path[:-1]):
+        return path[:-1], path[-1]
+    if is_leaf(path) and not is_valueless(path):
+        raise ValueError(f'Configuration path [{" ".join(path)}] requires a value')
+    return path, None
+
+
+def _apply_op(tree: ConfigTree, op: str, path: list):
+    node_path, value = _split_value(path)
+    if op == 'set':
+        if value is None:
+            if not tree.exists(node_path):
+                tree.set(node_path)
+        elif is_multi(node_path):
+            if not tree.exists(node_path) or value not in tree.return_values(node_path):
+                tree.set(node_path, value=value, replace=False)
+        else:
+            tree.set(node_path, value=value)
+        for i in range(1, len(node_path)):
+            if is_tag(node_path[:i]):
+                tree.set_tag(node_path[:i])
+    elif op == 'delete':
+        if value is None:
+            tree.delete(node_path)
+        else:
+            tree.delete_value(node_path, value)
+            if is_multi(node_path) and not tree.return_values(node_path):
+                tree.delete(node_path)
+    else:
+        raise ValueError(f"'{op}' is not a valid operation")
+
+
+def _path_state(tree: ConfigTree, path: list) -> bool:
+    """ True if path (including the value, if any) exists in tree """
+    node_path, value = _split_value(path)
+    if not tree.exists(node_path):
+        return False
+    if value is None:
+        return True
+    if is_multi(node_path):
+        return value in tree.return_values(node_path)
+    return value == tree.return_value(node_path)
+
+
 class ConfigSession(object):
     """
     The write API of VyOS.
@@ -147,6 +204,11 @@ def __run_command(self, cmd_list):
             raise ConfigSessionError(output)
         return output
 
+    def __working_config(self):
+        # without the option, showConfig prints a diff against the active
+        # config as soon as the session has uncommitted changes
+        return self.__run_command(SHOW_CONFIG + ['--show-working-only'])
+
     def get_session_env(self):
         return self.__session_env
 
@@ -159,8 +221,7 @@ def set(self, path, value=None):
 
     def set_section(self, path: list, d: dict):
         try:
-            for p in dict_to_paths(d):
-                self.set(path + p)
+            self.apply_ops([('set', path + p, None) for p in dict_to_paths(d)])
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
@@ -173,32 +234,87 @@ def delete(self, path, value=None):
 
     def load_section(self, path: list, d: dict):
         try:
-            self.delete(path)
+            ops = [('delete', path, None)]
             if d:
-                for p in dict_to_paths(d):
-                    self.set(path + p)
+                ops += [('set', path + p, None) for p in dict_to_paths(d)]
+            self.apply_ops(ops)
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
     def set_section_tree(self, d: dict):
         try:
             if d:
-                for p in dict_to_paths(d):
-                    self.set(p)
+                self.apply_ops([('set', p, None) for p in dict_to_paths(d)])
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
     def load_section_tree(self, mask: dict, d: dict):
         try:
+            ops = []
             if mask:
-                for p in dict_to_paths(mask):
-                    self.delete(p)
+                ops += [('delete', p, None) for p in dict_to_paths(mask)]
             if d:
-                for p in dict_to_paths(d):
-                    self.set(p)
+                ops += [('set', p, None) for p in dict_to_paths(d)]
+            self.apply_ops(ops)
         except (ValueError, ConfigSessionError) as e:
             raise ConfigSessionError(e)
 
+    def apply_ops(self, ops: list):
+        """
+        Apply a list of (op, path, value) tuples, op being one of 'set',
+        'delete' or 'comment', as a single load of the session config
+        instead of one my_set/my_delete process per path.
+
+        The ops are applied in order to a ConfigTree of the session config,
+        which is then loaded with 'cli-shell-api loadFile' -- that validates
+        all set values like my_set does. If an op can not be applied
+        (e.g. invalid path, deleting a non-existent path) or was rejected
+        on load, ConfigSessionError is raised listing every failed op; in
+        the former case nothing is loaded.
+        """
+        errors = []
+        tree = ConfigTree(self.__working_config())
+        changes = []
+        comments = []
+        for op, path, value in ops:
+            full_path = path + [value] if value else path
+            if op == 'comment':
+                comments.append((path, value))
+                continue
+            try:
+                _apply_op(tree, op, full_path)
+                changes.append((op, full_path))
+            except (ValueError, ConfigTreeError) as e:
+                errors.append(f'{op} [{" ".join(full_path)}]: {e}')
+
+        if errors:
+            raise ConfigSessionError('\n'.join(errors))
+
+        if changes:
+            with NamedTemporaryFile('w', prefix='vyos-session-') as f:
+                f.write(tree.to_string())
+                f.flush()
+                try:
+                    output = self.load_config(f.name)
+                except ConfigSessionError as e:
+                    output = str(e)
+
+            # loadFile skips invalid nodes and carries on, find the ops
+            # which did not make it into the session config
+            loaded = ConfigTree(self.__working_config())
+            for op, full_path in changes:
+                if _path_state(loaded, full_path) != _path_state(tree, full_path):
+                    errors.append(f'{op} [{" ".join(full_path)}]: {output.strip()}')
+
+        for path, value in comments:
+            try:
+                self.comment(path, value=value)
+            except ConfigSessionError as e:
+                errors.append(f'comment [{" ".join(path)}]: {e}')
+
+        if errors:
+            raise ConfigSessionError('\n'.join(errors))
+
     def comment(self, path, value=None):
         if not value:
             value = [""]
@@ -309,11 +309,22 @@ def is_leaf(self, path):
             return False
 
 class ConfigSourceString(ConfigSource):
-    def __init__(self, running_config_text=None, session_config_text=None):
+    def __init__(self, running_config_text=None, session_config_text=None,
+                 running_config_tree=None, session_config_tree=None):
+        """
+        Already parsed ConfigTree objects may be passed in place of the
+        config strings, in which case parsing of that string is skipped.
+        """
         super().__init__()
 
         try:
-            self._running_config = ConfigTree(running_config_text) if running_config_text else None
-            self._session_config = ConfigTree(session_config_text) if session_config_text else None
+            if running_config_tree is not None:
+                self._running_config = running_config_tree
+            else:
+                self._running_config = ConfigTree(running_config_text) if running_config_text else None
+            if session_config_tree is not None:
+                self._session_config = session_config_tree
+            else:
+                self._session_config = ConfigTree(session_config_text) if session_config_text else None
         except ValueError:
             raise ConfigSourceError(f"Init error in {type(self)}")
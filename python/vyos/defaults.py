@@ -40,6 +40,7 @@
 
 config_status = '/tmp/vyos-config-status'
 api_config_state = '/run/http-api-state'
+commit_stamp = '/run/vyos-commit-stamp'
 
 cfg_group = 'vyattacfg'
 
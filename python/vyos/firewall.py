@@ -14,17 +14,26 @@
 
 import csv
 import gzip
+import heapq
+import marshal
 import os
 import re
 
+from array import array
+from hashlib import sha1
+from itertools import product
+from mmap import ACCESS_READ
+from mmap import mmap
 from pathlib import Path
+from shutil import rmtree
 from socket import AF_INET
 from socket import AF_INET6
+from socket import inet_ntop
+from socket import inet_pton
 from socket import getaddrinfo
 from time import strftime
 
 from vyos.remote import download
-from vyos.template import is_ipv4
 from vyos.template import render
 from vyos.utils.dict import dict_search_args
 from vyos.utils.dict import dict_search_recursive
@@ -92,6 +101,338 @@ def find_nftables_rule(table, chain, rule_matches=[]):
 def remove_nftables_rule(table, chain, handle):
     cmd(f'sudo nft delete rule {table} {chain} handle {handle}')
 
+# Incremental ruleset update
+
+nft_object_kinds = ['chain', 'set', 'map', 'flowtable', 'counter', 'quota', 'limit',
+                    'ct helper', 'ct timeout', 'ct expectation', 'synproxy', 'secmark']
+
+_nft_object = re.compile(r'^(' + '|'.join(nft_object_kinds) + r')\s+(\S+)\s*\{$')
+
+def _nft_scan(text):
+    """ Yield characters of text with their brace depth, skipping quoted strings """
+    depth = 0
+    quoted = False
+    for i, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted:
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+            yield i, char, depth
+
+def _nft_depth(line):
+    """ Return change of brace depth by line """
+    line = re.sub(r'"[^"]*"', '', line)
+    return line.count('{') - line.count('}')
+
+def _nft_elements(text):
+    """
+    Return set elements of nft 'elements = { ... }' text starting after the
+    opening brace, and the text following the closing brace
+    """
+    elements = []
+    start = 0
+    for i, char, depth in _nft_scan(text):
+        if char == ',' and depth == 0:
+            elements.append(text[start:i].strip())
+            start = i + 1
+        elif depth < 0:
+            elements.append(text[start:i].strip())
+            return [e for e in elements if e], text[i + 1:]
+    raise ValueError('Unbalanced braces in set elements')
+
+def parse_nft_ruleset(text):
+    """
+    Parse nft script as rendered by the firewall templates.
+
+    Returns a list of top-level items, either ('statement', line) or
+    ('table', name, objects). objects maps (kind, name) of the objects
+    defined in the table block, and ('table', '') for lines of the block
+    itself, to their list of body lines, in order of appearance.
+    """
+    items = []
+    depth = 0
+    objects = body = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        change = _nft_depth(line)
+        if depth == 0:
+            match = re.match(r'^table\s+(.+?)\s*\{$', line)
+            if match:
+                objects = {('table', ''): []}
+                items.append(('table', match[1], objects))
+            else:
+                items.append(('statement', line))
+        elif depth == 1 and change > 0 and _nft_object.match(line):
+            match = _nft_object.match(line)
+            body = objects.setdefault((match[1], match[2]), [])
+        elif depth == 1:
+            if change >= 0:
+                objects[('table', '')].append(line)
+        elif depth > 1 and depth + change >= 2:
+            body.append(line)
+        elif depth == 2 and line != '}':
+            # closing brace of object on the same line as its last statement
+            body.append(line.rstrip('}').strip())
+        depth += change
+    return items
+
+def _nft_set_parts(body):
+    """ Split set or map body into declaration and elements """
+    text = ' '.join(body)
+    match = re.search(r'\belements\s*=\s*\{', text)
+    if not match:
+        return text, []
+    elements, tail = _nft_elements(text[match.end():])
+    return f'{text[:match.start()]} {tail}'.strip(), elements
+
+def _nft_header(kind, body):
+    """ Return the declaration lines of a chain, which cannot be changed in place """
+    if kind == 'chain':
+        return [line for line in body if re.match(r'^(type|policy|comment)\b', line)]
+    return body
+
+def _nft_format(item):
+    """ Return top-level item of parse_nft_ruleset() as nft script lines """
+    if item[0] == 'statement':
+        return [item[1]]
+    out = [f'table {item[1]} {{']
+    for (kind, name), body in item[2].items():
+        if kind == 'table':
+            out += [f'    {line}' for line in body]
+            continue
+        out.append(f'    {kind} {name} {{')
+        out += [f'        {line}' for line in body]
+        out.append('    }')
+    return out + ['}']
+
+def _nft_table_delta(table, old, new):
+    """
+    Return nft commands to turn table from old into new objects, as
+    parse_nft_ruleset(), without touching unchanged objects. Returns None
+    if the table must be re-created.
+    """
+    if old[('table', '')] != new[('table', '')]:
+        return None
+
+    flush = []
+    block = {}
+    add = []
+    delete = []
+    for key, body in new.items():
+        kind, name = key
+        if kind == 'table' or old.get(key) == body:
+            continue
+        if key not in old:
+            block[key] = body
+        elif kind == 'chain':
+            if _nft_header(kind, old[key]) != _nft_header(kind, body):
+                return None
+            flush.append(f'flush chain {table} {name}')
+            block[key] = body
+        elif kind in ['set', 'map']:
+            old_head, old_elements = _nft_set_parts(old[key])
+            head, elements = _nft_set_parts(body)
+            if old_head != head:
+                return None
+            if 'auto-merge' in head:
+                # ranges are merged by the kernel, and cannot be deleted individually
+                flush.append(f'flush {kind} {table} {name}')
+                block[key] = body
+                continue
+            removed = set(old_elements) - set(elements)
+            added = set(elements) - set(old_elements)
+            if removed:
+                # map elements are deleted by key
+                keys = [e.split(' : ')[0] for e in old_elements if e in removed]
+                flush.append(f'delete element {table} {name} {{ {", ".join(keys)} }}')
+            if added:
+                add.append(f'add element {table} {name} {{ {", ".join(e for e in elements if e in added)} }}')
+        else:
+            return None
+
+    for kind, name in old:
+        if kind == 'table' or (kind, name) in new:
+            continue
+        if kind == 'chain':
+            # chains are deleted after the rules referring to them
+            flush.append(f'flush chain {table} {name}')
+            delete.insert(0, f'delete chain {table} {name}')
+        else:
+            delete.append(f'delete {kind} {table} {name}')
+
+    out = flush
+    if block:
+        out += _nft_format(('table', table, block))
+    return out + add + delete
+
+def nft_ruleset_delta(old_text, new_text):
+    """
+    Return nft script which turns the ruleset loaded from nft script
+    old_text into the one of new_text, in a single transaction.
+
+    Tables which are deleted and re-created by new_text are updated in
+    place instead: only changed chains are flushed and refilled, only
+    changed set elements are added or deleted, so unchanged chains keep
+    their rule counters, and sets filled at runtime keep their elements.
+    All other statements are repeated if any of them changed.
+
+    Returns None if the ruleset can only be replaced as a whole, an empty
+    string if there are no changes.
+    """
+    old_items = parse_nft_ruleset(old_text)
+    new_items = parse_nft_ruleset(new_text)
+
+    def managed(items):
+        return [item[1][len('delete table '):] for item in items
+                if item[0] == 'statement' and item[1].startswith('delete table ')]
+
+    tables = managed(new_items)
+    if not tables or managed(old_items) != tables:
+        return None
+
+    def split(items):
+        # managed tables, and all other statements and tables
+        return ({item[1]: item[2] for item in items if item[0] == 'table' and item[1] in tables},
+                [item for item in items if item[0] == 'table' and item[1] not in tables or
+                 item[0] == 'statement' and item[1] not in [f'delete table {t}' for t in tables]])
+
+    old_tables, old_other = split(old_items)
+    new_tables, new_other = split(new_items)
+    if list(old_tables) != list(new_tables):
+        return None
+
+    out = []
+    if old_other != new_other:
+        for item in new_other:
+            out += _nft_format(item)
+    for table, objects in new_tables.items():
+        delta = _nft_table_delta(table, old_tables[table], objects)
+        if delta is None:
+            return None
+        out += delta
+
+    return '\n'.join(out) + '\n' if out else ''
+
+# Rule render cache
+
+rule_cache_file = '/run/vyos-firewall-rule-cache'
+rule_cache_debug = '/tmp/vyos.firewall.debug'
+
+def _digest(conf):
+    # marshal format 2 has no references, so its output only depends on the
+    # values and their order - the same config in a different order is a
+    # cache miss at worst
+    return sha1(marshal.dumps(conf, 2)).digest()
+
+class RuleCache:
+    """
+    Rules rendered by the nft_rules and nat_rules template filters, kept on
+    tmpfs between commits, so only changed rules are rendered again.
+
+    Rules are stored per chain, with the rule ids and a hash of each rule
+    config. Unchanged chains are reused as a whole, otherwise the rules of
+    the chain whose rule id and config are unchanged. Chains not used by the
+    last 'expire' saves are dropped. The cache is discarded if the modules
+    rendering the rules changed.
+
+    DEBUG:
+    Hits and misses of the commit are printed on save() if
+    /tmp/vyos.firewall.debug exists.
+
+    Example:
+    >>> rule_cache.rules(('nft_rule', 'NAM', 'WAN', 'ip'), rules, render_rule)
+    >>> rule_cache.save()
+    """
+    expire = 32
+
+    def __init__(self, filename=rule_cache_file):
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self._chains = None
+        self._generation = 0
+
+    @staticmethod
+    def _version():
+        from vyos import nat
+        from vyos import template
+        return tuple(os.path.getmtime(module) for module in (__file__, nat.__file__, template.__file__))
+
+    def _load(self):
+        self._chains = {}
+        try:
+            with open(self.filename, 'rb') as f:
+                version, generation, chains = marshal.load(f)
+            if version == self._version():
+                self._chains = chains
+                self._generation = generation + 1
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    def rules(self, key, rules, render) -> list:
+        """
+        Return render(rule_id, rule_conf) for all items of dict rules of
+        the chain identified by tuple key, rendered by a previous call if
+        possible
+        """
+        if self._chains is None:
+            self._load()
+        key = ' '.join(map(str, key))
+        hashes = [_digest(rule_conf) for rule_conf in rules.values()]
+        ids = '\n'.join(rules)
+        digest = b''.join(hashes)
+        entry = self._chains.get(key)
+        if entry and entry[0] == ids and entry[1] == digest:
+            self.hits += len(rules)
+            self._chains[key] = entry[:3] + (self._generation,)
+            return entry[2].split('\0') if rules else []
+
+        cached = {}
+        if entry and entry[0]:
+            # per rule: hash of config and rendered rule, by rule id
+            old = [entry[1][i:i + 20] for i in range(0, len(entry[1]), 20)]
+            cached = dict(zip(entry[0].split('\n'), zip(old, entry[2].split('\0'))))
+
+        out = []
+        for rule_id, rule_conf, rule_digest in zip(rules, rules.values(), hashes):
+            rule = cached.get(rule_id)
+            if rule and rule[0] == rule_digest:
+                self.hits += 1
+                out.append(rule[1])
+            else:
+                self.misses += 1
+                out.append(render(rule_id, rule_conf))
+
+        self._chains[key] = (ids, digest, '\0'.join(out), self._generation)
+        return out
+
+    def save(self):
+        if self._chains is None:
+            return
+        if os.path.exists(rule_cache_debug):
+            print(f'Firewall rule cache: {self.hits} hits, {self.misses} misses')
+        self._chains = {key: entry for key, entry in self._chains.items()
+                        if entry[3] > self._generation - self.expire}
+        try:
+            # replaced atomically, as the cache is shared by conf mode scripts
+            with open(f'{self.filename}.tmp', 'wb') as f:
+                marshal.dump((self._version(), self._generation, self._chains), f)
+            os.replace(f'{self.filename}.tmp', self.filename)
+        except OSError:
+            pass
+        # the next commit of a long-lived process (vyos-configd) keeps the
+        # loaded chains, but counts as a new generation
+        self._generation += 1
+        self.hits = 0
+        self.misses = 0
+
+rule_cache = RuleCache()
+
 # Functions below used by template generation
 
 def nft_action(vyos_action):
@@ -543,29 +884,306 @@ def parse_time(time):
         out.append(f'day {{{",".join(out_days)}}}')
     return " ".join(out)
 
+# Ruleset optimizer
+
+# rule nodes adjacent rules may differ in to be merged, as (side, node)
+optimize_fields = [('source', 'address'), ('destination', 'address'),
+                   ('source', 'port'), ('destination', 'port')]
+# rule nodes with per rule state or referring to the rule id
+optimize_exclude = ['log', 'limit', 'recent']
+# actions which are verdicts, and can be values of a verdict map
+optimize_verdicts = ['accept', 'continue', 'drop', 'jump', 'return']
+# nftables comments are limited to 128 bytes
+optimize_comment_length = 128
+
+def _optimize_address(address):
+    """ Return address as integer, raises ValueError if it is no address """
+    family = AF_INET6 if ':' in address else AF_INET
+    try:
+        return int.from_bytes(inet_pton(family, address), 'big'), 128 if family == AF_INET6 else 32
+    except OSError:
+        raise ValueError(address)
+
+def _optimize_intervals(node, value):
+    """
+    Return address or port value as sorted list of (first, last) integer
+    intervals, or None if it can not be an element of a set
+    """
+    out = []
+    try:
+        for item in value.split(',') if node == 'port' else [value]:
+            if node == 'port':
+                first, _, last = item.partition('-')
+                first, last = int(first), int(last or first)
+            elif '-' in item:
+                first, last = (_optimize_address(address)[0] for address in item.split('-'))
+            else:
+                address, _, length = item.partition('/')
+                first, bits = _optimize_address(address)
+                host = bits - int(length or bits)
+                last = first | (1 << host) - 1
+                # networks with host bits set are not valid set elements
+                if host < 0 or first != last & ~((1 << host) - 1):
+                    return None
+            if first > last:
+                return None
+            out.append((first, last))
+    except ValueError:
+        return None
+    out.sort()
+    # elements of a set must not overlap
+    if any(a[1] >= b[0] for a, b in zip(out, out[1:])):
+        return None
+    return out
+
+def _optimize_rule(rule_conf):
+    """
+    Return (rest, key, verdict) of a rule: the rule config without mergeable
+    nodes and verdict as bytes, the mergeable nodes by index of
+    optimize_fields with their intervals, and the verdict as (action, target).
+    Returns None if the rule can not be merged.
+    """
+    if any(node in rule_conf for node in optimize_exclude):
+        return None
+    rest = dict(rule_conf)
+    key = {}
+    for index, (side, node) in enumerate(optimize_fields):
+        side_conf = rule_conf.get(side, {})
+        if 'fqdn' in side_conf or 'geoip' in side_conf:
+            return None
+        if node not in side_conf or (node == 'address' and 'address_mask' in side_conf):
+            continue
+        intervals = _optimize_intervals(node, side_conf[node])
+        if intervals is None:
+            continue
+        rest[side] = dict(rest[side])
+        rest[side][node] = None
+        key[index] = (side_conf[node], intervals)
+
+    verdict = None
+    if rule_conf.get('action') in optimize_verdicts and 'set' not in rule_conf:
+        verdict = (rest.pop('action'), rest.pop('jump_target', None))
+    return marshal.dumps(rest, 2), key, verdict
+
+def _optimize_overlap(spans, key, fields):
+    """
+    Check if any packet can match key and one of the keys in spans in all
+    fields, see _optimize_rule(). spans are the intervals of the keys by
+    field, as (first, last, key index).
+    """
+    matches = None
+    for index in fields:
+        found = {key_index for first, last, key_index in spans[index]
+                 for other_first, other_last in key[index][1]
+                 if first <= other_last and other_first <= last}
+        matches = found if matches is None else matches & found
+        if not matches:
+            return False
+    # rules are the same in all fields if there are none
+    return True
+
+def _optimize_merge(rule_conf, rules, fields):
+    """
+    Return config of rules as returned by _optimize_rule() merged, with
+    rule_conf of the first rule and the indexes of the differing fields
+    """
+    fields = sorted(fields)
+    verdicts = {verdict for _, _, verdict in rules}
+    elements = []
+    for _, key, verdict in rules:
+        values = [key[index][0].split(',') if optimize_fields[index][1] == 'port'
+                  else [key[index][0]] for index in fields]
+        for value in product(*values):
+            elements.append(list(value) + (list(verdict) if len(verdicts) > 1 else []))
+    return {'merge': {'rule': rule_conf, 'fields': [list(optimize_fields[i]) for i in fields],
+                      'elements': elements, 'vmap': len(verdicts) > 1}}
+
+def optimize_rules(rules, hook, fw_name, ip_name='ip') -> dict:
+    """
+    Merge adjacent rules of a chain which only differ in source or destination
+    address and port, into one rule matching an anonymous set (one node
+    differs) or a set of concatenations (two nodes differ), or into a verdict
+    map if their actions differ, e.g.
+
+        ip saddr . tcp dport { 192.0.2.1 . 22, 192.0.2.2 . 80 } counter accept
+
+    Rules are only merged if no packet can match more than one of them, so
+    the order of the rules is kept. Rules with a log, limit or recent node,
+    or with a FQDN or GeoIP address, are never merged.
+
+    Returns dict of rules as passed to parse_optimized_rule(). Merged rules
+    are keyed by the comma separated ids of the rules, which are also used
+    for the rule comment, so rule counters can be mapped to the rule ids.
+    """
+    family = {'ip6': 'ipv6', 'bri': 'bri'}.get(ip_name, 'ipv4')
+    comment_length = optimize_comment_length - len(f'{family}-{hook}-{fw_name}-')
+
+    out = {}
+    group = []
+    fields = set()
+    spans = {}
+    def flush():
+        if len(group) == 1:
+            out[group[0][0]] = rules[group[0][0]]
+        elif group:
+            ids = [rule_id for rule_id, _ in group]
+            out[','.join(ids)] = _optimize_merge(rules[ids[0]], [rule for _, rule in group], fields)
+
+    for rule_id, rule_conf in rules.items():
+        rule = _optimize_rule(rule_conf)
+        if group and rule:
+            rest, key, verdict = rule
+            first_rest, first_key, first_verdict = group[0][1]
+            length += len(rule_id) + 1
+            if rest == first_rest and key.keys() == first_key.keys() and length <= comment_length:
+                # fields not differing from the first rule are the same for the group
+                differ = fields | {index for index in key if key[index][0] != first_key[index][0]}
+                if (len(differ) <= 2 and (verdict == first_verdict or verdict and first_verdict)
+                        and not _optimize_overlap(spans, key, differ)):
+                    for index, (_, intervals) in key.items():
+                        spans[index] += [(first, last, len(group)) for first, last in intervals]
+                    group.append((rule_id, rule))
+                    fields = differ
+                    continue
+        flush()
+        group = [(rule_id, rule)] if rule else []
+        length = len(rule_id)
+        fields = set()
+        if rule:
+            spans = {index: [(first, last, 0) for first, last in intervals]
+                     for index, (_, intervals) in rule[1].items()}
+        else:
+            out[rule_id] = rule_conf
+    flush()
+    return out
+
+def parse_optimized_rule(rule_conf, hook, fw_name, rule_id, ip_name):
+    """ Render rule as returned by optimize_rules() """
+    if 'merge' not in rule_conf:
+        return parse_rule(rule_conf, hook, fw_name, rule_id, ip_name)
+
+    merge = rule_conf['merge']
+    rule_conf = dict(merge['rule'])
+    # render rule with placeholders for the merged nodes, which are replaced
+    # by the set or map afterwards
+    for index, (side, node) in enumerate(merge['fields']):
+        rule_conf[side] = dict(rule_conf[side])
+        rule_conf[side][node] = f'\0{index}'
+    if merge['vmap']:
+        rule_conf.pop('action')
+        rule_conf.pop('jump_target', None)
+    text = parse_rule(rule_conf, hook, fw_name, rule_id, ip_name)
+
+    count = len(merge['fields'])
+    selectors = {int(index): selector for selector, index in
+                 re.findall(r'(\S+ [sd](?:addr|port)) \{?\0(\d)\}?', text)}
+    selector = ' . '.join(selectors[index] for index in range(count))
+    keys = [' . '.join(element[:count]) for element in merge['elements']]
+    # the set is matched in any case, so the counter only counts packets
+    # matched by one of the rules
+    statement = f'{selector} {{ {", ".join(keys)} }}'
+    placeholder = re.compile(r'\S+ [sd](?:addr|port) \{?\0\d\}? ?')
+    first = placeholder.search(text)
+    text = text[:first.start()] + f'{statement} ' + placeholder.sub('', text[first.start():])
+    if not merge['vmap']:
+        return text
+
+    def_suffix = '6' if ip_name == 'ip6' else ''
+    verdicts = []
+    for key, (action, target) in zip(keys, (element[count:] for element in merge['elements'])):
+        verdict = f'{action} NAME{def_suffix}_{target}' if action == 'jump' else action
+        verdicts.append(f'{key} : {verdict}')
+    comment = text.rindex(' comment "')
+    return f'{text[:comment]} {selector} vmap {{ {", ".join(verdicts)} }}{text[comment:]}'
+
 # GeoIP
 
 nftables_geoip_conf = '/run/nftables-geoip.conf'
 geoip_database = '/usr/share/vyos-geoip/dbip-country-lite.csv.gz'
+geoip_ranges = '/usr/share/vyos-geoip/ranges'
 geoip_lock_file = '/run/vyos-geoip.lock'
 
-def geoip_load_data(codes=[]):
-    data = None
-
-    if not os.path.exists(geoip_database):
-        return []
-
+def _geoip_merge(ranges):
+    """ Return sorted (first, last) integer ranges with adjacent and overlapping ranges merged """
+    out = []
+    for first, last in ranges:
+        if out and first <= out[-1][1] + 1:
+            if last > out[-1][1]:
+                out[-1] = (out[-1][0], last)
+        else:
+            out.append((first, last))
+    return out
+
+def geoip_compile(database=geoip_database, directory=geoip_ranges):
+    """
+    Convert the GeoIP database once per database version into one binary
+    file per country and address family, holding the merged address ranges
+    of the country as array of unsigned 64 bit integers: first and last
+    address for IPv4, the upper and lower half of both for IPv6.
+
+    Returns the directory of the files for the current database version, or
+    None if the database can not be read.
+    """
+    stat = os.stat(database)
+    version = os.path.join(directory, f'{stat.st_size}-{stat.st_mtime_ns}')
+    if os.path.isdir(version):
+        return version
+
+    ranges = {}
     try:
-        with gzip.open(geoip_database, mode='rt') as csv_fh:
-            reader = csv.reader(csv_fh)
-            out = []
-            for start, end, code in reader:
-                if code.lower() in codes:
-                    out.append([start, end, code.lower()])
-            return out
-    except:
+        with gzip.open(database, mode='rt') as csv_fh:
+            for start, end, code in csv.reader(csv_fh):
+                family = AF_INET6 if ':' in start else AF_INET
+                ranges.setdefault((code.lower(), family), []).append(
+                    (int.from_bytes(inet_pton(family, start), 'big'),
+                     int.from_bytes(inet_pton(family, end), 'big')))
+    except (OSError, EOFError, ValueError):
         print('Error: Failed to open GeoIP database')
-    return []
+        return None
+
+    # files of a version are complete once its directory exists
+    tmp = f'{version}.tmp'
+    rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for (code, family), items in ranges.items():
+        items.sort()
+        values = array('Q')
+        for first, last in _geoip_merge(items):
+            if family == AF_INET:
+                values.extend((first, last))
+            else:
+                values.extend((first >> 64, first & 0xffffffffffffffff,
+                               last >> 64, last & 0xffffffffffffffff))
+        with open(os.path.join(tmp, f'{code}.{6 if family == AF_INET6 else 4}'), 'wb') as f:
+            values.tofile(f)
+    os.rename(tmp, version)
+
+    for name in os.listdir(directory):
+        if os.path.join(directory, name) != version:
+            rmtree(os.path.join(directory, name), ignore_errors=True)
+    return version
+
+def geoip_load_ranges(directory, code, ipv6=False) -> list:
+    """ Return merged (first, last) integer address ranges of country code """
+    filename = os.path.join(directory, f'{code.lower()}.{6 if ipv6 else 4}')
+    if not os.path.exists(filename) or not os.path.getsize(filename):
+        return []
+    with open(filename, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+        with memoryview(data) as view, view.cast('Q') as values:
+            values = values.tolist()
+    if not ipv6:
+        return list(zip(values[0::2], values[1::2]))
+    return [(values[i] << 64 | values[i + 1], values[i + 2] << 64 | values[i + 3])
+            for i in range(0, len(values), 4)]
+
+def geoip_elements(ranges, ipv6=False) -> list:
+    """ Return integer address ranges as nftables set elements """
+    family, length = (AF_INET6, 16) if ipv6 else (AF_INET, 4)
+    out = []
+    for first, last in ranges:
+        start = inet_ntop(family, first.to_bytes(length, 'big'))
+        out.append(start if first == last else f'{start}-{inet_ntop(family, last.to_bytes(length, "big"))}')
+    return out
 
 def geoip_download_data():
     url = 'https://download.db-ip.com/free/dbip-country-lite-{}.csv.gz'.format(strftime("%Y-%m"))
@@ -617,35 +1235,34 @@ def geoip_update(firewall, force=False):
         ipv4_sets = {}
         ipv6_sets = {}
 
-        # Map country codes to set names
+        # Map set names to country codes
         for codes, path in dict_search_recursive(firewall, 'country_code'):
             set_name = f'GEOIP_CC_{path[1]}_{path[2]}_{path[4]}'
             if ( path[0] == 'ipv4'):
-                for code in codes:
-                    ipv4_codes.setdefault(code, []).append(set_name)
+                ipv4_codes.setdefault(set_name, []).extend(code.lower() for code in codes)
             elif ( path[0] == 'ipv6' ):
                 set_name = f'GEOIP_CC6_{path[1]}_{path[2]}_{path[4]}'
-                for code in codes:
-                    ipv6_codes.setdefault(code, []).append(set_name)
+                ipv6_codes.setdefault(set_name, []).extend(code.lower() for code in codes)
 
         if not ipv4_codes and not ipv6_codes:
             if force:
                 print("GeoIP not in use by firewall")
             return True
 
-        geoip_data = geoip_load_data([*ipv4_codes, *ipv6_codes])
-
-        # Iterate IP blocks to assign to sets
-        for start, end, code in geoip_data:
-            ipv4 = is_ipv4(start)
-            if code in ipv4_codes and ipv4:
-                ip_range = f'{start}-{end}' if start != end else start
-                for setname in ipv4_codes[code]:
-                    ipv4_sets.setdefault(setname, []).append(ip_range)
-            if code in ipv6_codes and not ipv4:
-                ip_range = f'{start}-{end}' if start != end else start
-                for setname in ipv6_codes[code]:
-                    ipv6_sets.setdefault(setname, []).append(ip_range)
+        directory = geoip_compile(geoip_database, geoip_ranges)
+        if not directory:
+            return False
+
+        # Merge the ranges of all countries of a set
+        countries = {}
+        for codes, sets, ipv6 in ((ipv4_codes, ipv4_sets, False), (ipv6_codes, ipv6_sets, True)):
+            for set_name, set_codes in codes.items():
+                ranges = []
+                for code in set(set_codes):
+                    if (code, ipv6) not in countries:
+                        countries[(code, ipv6)] = geoip_load_ranges(directory, code, ipv6)
+                    ranges.append(countries[(code, ipv6)])
+                sets[set_name] = geoip_elements(_geoip_merge(heapq.merge(*ranges)), ipv6)
 
         render(nftables_geoip_conf, 'firewall/nftables-geoip-update.j2', {
             'ipv4_sets': ipv4_sets,
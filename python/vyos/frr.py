@@ -66,7 +66,12 @@
 """
 
 import tempfile
+import ipaddress
 import re
+import time
+import json
+import socket
+import threading
 
 from vyos import ConfigError
 from vyos.utils.process import cmd
@@ -223,18 +228,147 @@ def reload_configuration(config, daemon=None):
     return output
 
 
+def apply_configuration(config, daemon=None):
+    """ Apply configuration commands in a single vtysh session
+    Unlike reload_configuration() the configuration is not compared against
+    the running configuration, the supplied commands (e.g. a delta rendered by
+    FRRConfig) are executed as-is, just like a configuration file.
+
+    config:  The configuration commands to apply
+    daemon:  Send commands to the specified FRR daemon only,
+             supplying daemon=None sends them to all daemons
+    return:  None
+    """
+    if daemon and daemon not in _frr_daemons:
+        raise ValueError(f'The specified daemon type is not supported {repr(daemon)}')
+
+    f = tempfile.NamedTemporaryFile('w')
+    f.write(config)
+    f.flush()
+
+    cmd = f'{path_vtysh}'
+    if daemon:
+        cmd += f' -d {daemon}'
+    cmd += f' -f {f.name}'
+
+    LOG.debug(f'apply_configuration: Executing command "{cmd}"')
+    output, code = popen(cmd, stderr=STDOUT)
+    f.close()
+
+    for i, e in enumerate(output.split('\n')):
+        LOG.debug(f'apply_configuration: output {i:3} {e}')
+
+    if code:
+        raise ConfigurationNotValid(f'Applying FRR configuration failed: {repr(output)}')
+
+    return output
+
+
 def save_configuration():
     """ T3217: Save FRR configuration to /run/frr/config/frr.conf """
     return cmd(f'{path_vtysh} -n -w')
 
 
-def execute(command):
+class VtyClient:
+    """ Persistent connection to the vty socket of a single FRR daemon
+    Commands are sent using the vtysh protocol: a NUL terminated command
+    line, answered by the command output followed by three NUL bytes and
+    the command return code. Commands are serialized over the connection,
+    which is (re-)opened on demand.
+
+    Only commands available in the daemons view node (show commands) are
+    supported, configuration must use vtysh.
+    """
+    def __init__(self, daemon, path=path_config):
+        if daemon not in _frr_daemons:
+            raise ValueError(f'The specified daemon type is not supported {repr(daemon)}')
+        self.daemon = daemon
+        self.socket_path = os.path.join(path, f'{daemon}.vty')
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def _run(self, command):
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(command.encode() + b'\0')
+
+        chunks = []
+        tail = b''
+        while True:
+            data = self._sock.recv(65536)
+            if not data:
+                raise ConnectionResetError(f'{self.daemon} closed the vty connection')
+            chunks.append(data)
+            # the terminator may be split across reads
+            tail = (tail + data)[-4:]
+            if len(tail) == 4 and tail[:3] == b'\0\0\0':
+                break
+
+        output = b''.join(chunks)
+        return output[:-4].decode(errors='replace'), output[-1]
+
+    def execute(self, command):
+        """ Run command in the daemon
+        command:  str containing a single command line
+        return:   command output, OSError is raised on a non-zero return code
+        """
+        with self._lock:
+            try:
+                output, code = self._run(command)
+            except (BrokenPipeError, ConnectionResetError):
+                # daemon restarted since the last command, reconnect once
+                if self._sock is not None:
+                    self._sock.close()
+                self._sock = None
+                output, code = self._run(command)
+
+        output = output.replace('\r', '').strip()
+        if code:
+            raise OSError(code, output)
+        return output
+
+
+_vty_clients = {}
+
+def vty_client(daemon):
+    """ Return the shared VtyClient of daemon for this process """
+    if daemon not in _vty_clients:
+        _vty_clients[daemon] = VtyClient(daemon)
+    return _vty_clients[daemon]
+
+
+def execute(command, daemon=None):
     """ Run commands inside vtysh
     command:  str containing commands to execute inside a vtysh session
+    daemon:   FRR daemon handling the command; if specified the command is
+              sent over a persistent connection to the daemons vty socket
+              instead of forking vtysh (used as fallback if the socket can
+              not be reached)
     """
     if not isinstance(command, str):
         raise ValueError(f'command needs to be a string: {repr(command)}')
 
+    if daemon:
+        try:
+            return vty_client(daemon).execute(command)
+        except (FileNotFoundError, PermissionError, ConnectionError) as e:
+            LOG.debug(f'execute: vty socket of {daemon} not usable, using vtysh: {e}')
+
     cmd = f"{path_vtysh} -c '{command}'"
 
     output, code = popen(cmd, stderr=STDOUT)
@@ -245,6 +379,20 @@ def execute(command):
     return config
 
 
+def execute_json(command, daemon=None):
+    """ Run a show command with JSON output and return the decoded object
+    command:  str containing the command, 'json' is appended if missing
+    daemon:   see execute()
+    return:   decoded output, an empty dict for empty output
+    """
+    if not command.rstrip().endswith(' json'):
+        command = f'{command} json'
+    output = execute(command, daemon=daemon).strip()
+    if not output:
+        return {}
+    return json.loads(output)
+
+
 def configure(lines, daemon=False):
     """ run commands inside config mode vtysh
     lines:  list or str conaining commands to execute inside a configure session
@@ -403,6 +551,173 @@ def _find_elements(config, pattern, start_at=0):
     return [i for i, element in enumerate(config[start_at:], start=0) if re.match(pattern + '$', element)]
 
 
+# Top-level blocks that can not be removed with "no <header>", their
+# content is removed line by line inside the context instead
+_context_only_blocks = ('interface ', 'vrf ')
+
+_re_prefix_list = re.compile(r'^(ipv6|ip) prefix-list (\S+ (?:seq \d+ )?(?:permit|deny)) (\S+)'
+                             r'(?: ge (\d+))?(?: le (\d+))?$')
+
+def _normalize_line(line):
+    '''Return a configuration line as FRR shows it in its running config'''
+    line = ' '.join(line.split())
+    match = _re_prefix_list.match(line)
+    if match and match.group(3) != 'any':
+        family, rule, prefix, ge, le = match.groups()
+        try:
+            prefix = ipaddress.ip_network(prefix, strict=False)
+        except ValueError:
+            return line
+        if prefix.prefixlen == 0 and not ge and le == str(prefix.max_prefixlen):
+            return f'{family} prefix-list {rule} any'
+        line = f'{family} prefix-list {rule} {prefix}'
+        line += f' ge {ge}' if ge else ''
+        line += f' le {le}' if le else ''
+    return line
+
+def _negate_line(line):
+    if line.startswith('no '):
+        return line[3:]
+    return f'no {line}'
+
+def _config_blocks(config):
+    '''Split a configuration into its top-level stanzas
+    config:  (list) A list containing the configuration lines
+
+    return:
+        None: The configuration can not be split, e.g. indented lines outside
+              of a stanza
+        dict: {header: (is_block, nested, [body lines])} with lines normalized
+              as by _normalize_line(), in order of appearance. Lines of nested
+              contexts (e.g. address-family) keep their additional indentation,
+              such stanzas can only be compared as a whole.
+    '''
+    blocks = {}
+    current = None
+    for line in config:
+        line = line.rstrip()
+        if line.strip() in ('', '!', 'end'):
+            continue
+        if line.startswith('exit'):
+            # exit, exit-vrf
+            if current is not None:
+                blocks[current][0] = True
+            current = None
+            continue
+        if line[0] == ' ':
+            if current is None:
+                return None
+            indent = len(line) - len(line.lstrip())
+            line = _normalize_line(line)
+            block = blocks[current]
+            block[0] = True
+            if indent > 1 or line.startswith('exit'):
+                block[1] = True
+            block[2].append(' ' * (indent - 1) + line)
+            continue
+        current = _normalize_line(line)
+        blocks.setdefault(current, [False, False, []])
+    return {header: tuple(block) for header, block in blocks.items()}
+
+def _config_delta(original, config):
+    '''Render the commands transforming configuration <original> into <config>
+    original:  (list) A list containing the currently active configuration
+    config:    (list) A list containing the new configuration
+
+    return:
+        None: No delta can be computed for the configurations, see _config_blocks(),
+              or a stanza with nested contexts was changed
+        list: Configuration commands, removals are issued before additions
+    '''
+    old = _config_blocks(original)
+    new = _config_blocks(config)
+    if old is None or new is None:
+        return None
+
+    delta = []
+    for header, (is_block, nested, body) in old.items():
+        if header in new:
+            continue
+        if is_block and body and header.startswith(_context_only_blocks):
+            if nested:
+                return None
+            delta += [header] + [_negate_line(x) for x in reversed(body)] + ['exit']
+        else:
+            delta.append(_negate_line(header))
+
+    for header, (is_block, nested, body) in new.items():
+        if old.get(header) == (is_block, nested, body):
+            continue
+        if not is_block:
+            delta.append(header)
+            continue
+        _, old_nested, old_body = old.get(header, (False, False, []))
+        if nested or old_nested:
+            return None
+        removed = [x for x in reversed(old_body) if x not in body]
+        added = [x for x in body if x not in old_body]
+        delta += [header] + [_negate_line(x) for x in removed] + added + ['exit']
+
+    return delta
+
+
+_re_meta = frozenset('.^$*+?{}[]|()')
+
+def _literal_pattern(pattern):
+    '''Return the line matched by a regex pattern consisting only of literal
+    (or escaped) characters, None if the pattern is a real regex or can match
+    an indented line'''
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+    literal = []
+    escaped = False
+    for c in pattern:
+        if escaped:
+            if c.isalnum():
+                return None
+            literal.append(c)
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c in _re_meta:
+            return None
+        else:
+            literal.append(c)
+    if escaped or not literal or literal[0].isspace():
+        return None
+    return ''.join(literal)
+
+def _top_level_pattern(pattern):
+    '''True if pattern can only match top-level (non-indented) lines'''
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+    return bool(pattern) and pattern[0] not in _re_meta and \
+           pattern[0] != '\\' and not pattern[0].isspace()
+
+def _keys_between(low, high, count):
+    '''Return <count> increasing order keys (tuples) between low and high,
+    high=None denotes the end of the configuration'''
+    if high is not None and high[:len(low)] == low:
+        base = low + (high[len(low)] - 1,)
+    else:
+        base = low
+    return [base + (i,) for i in range(count)]
+
+
+class _Block:
+    '''A top-level configuration line and the indented lines following it.
+    Blocks are doubly linked in configuration order, key is a tuple sorting
+    in the same order so positions can be compared without a list scan'''
+    __slots__ = ('lines', 'key', 'prev', 'next', 'alive')
+
+    def __init__(self, lines, key):
+        self.lines = lines
+        self.key = key
+        self.prev = None
+        self.next = None
+        self.alive = True
+
+
 class FRRConfig:
     '''Main FRR Configuration manipulation object
     Using this object the user could load, manipulate and commit the configuration to FRR
@@ -454,17 +769,55 @@ def test_configuration(self):
         LOG.debug('test_configation: Testing configuration')
         mark_configuration('\n'.join(self.config))
 
-    def commit_configuration(self, daemon=None):
+    def _commit_delta(self, daemon=None):
+        '''Apply only the changed stanzas between original and current config
+        return: True if the delta was applied, False if frr-reload is required
+        '''
+        delta = _config_delta(self.original_config, self.config)
+        if delta is None:
+            LOG.debug('commit_configuration: no delta available, nested context changed')
+            return False
+
+        for i, e in enumerate(delta):
+            LOG.debug(f'commit_configuration: delta      {i:3} {e}')
+        if not delta:
+            return True
+
+        try:
+            apply_configuration('\n'.join(delta), daemon=daemon)
+        except (FrrError, OSError) as e:
+            LOG.debug(f'commit_configuration: applying delta failed, using frr-reload: {e}')
+            return False
+        return True
+
+    def commit_configuration(self, daemon=None, incremental=False):
         '''
         Commit the current configuration to FRR daemon: str with name of the
         FRR daemon to commit to or None to use the consolidated config.
 
+        incremental: compute the delta between the loaded and the current
+        configuration and apply only the changed stanzas in a single vtysh
+        session. frr-reload is used when no delta can be computed (a stanza
+        with nested contexts like address-family changed) or when applying
+        the delta fails.
+
         Configuration is automatically saved after apply
         '''
         LOG.debug('commit_configuration:  Commiting configuration')
         for i, e in enumerate(self.config):
             LOG.debug(f'commit_configuration: new_config {i:3} {e}')
 
+        name = daemon if daemon else 'integrated'
+        start = time.monotonic()
+        if incremental and self._commit_delta(daemon):
+            LOG.debug(f'commit_configuration: {name} delta applied in '
+                      f'{time.monotonic() - start:.3f}s')
+            start = time.monotonic()
+            save_configuration()
+            LOG.debug(f'commit_configuration: {name} saved in '
+                      f'{time.monotonic() - start:.3f}s')
+            return
+
         # https://github.com/FRRouting/frr/issues/10132
         # https://github.com/FRRouting/frr/issues/10133
         count = 0
@@ -486,9 +839,113 @@ def commit_configuration(self, daemon=None):
                 raise ConfigError(emsg)
             raise ConfigurationNotValid(f'Config commit retry counter ({count_max}) exceeded for {daemon} daemon!')
 
+        LOG.debug(f'commit_configuration: {name} frr-reload applied in '
+                  f'{time.monotonic() - start:.3f}s ({count} attempts)')
+
         # Save configuration to /run/frr/config/frr.conf
+        start = time.monotonic()
         save_configuration()
-
+        LOG.debug(f'commit_configuration: {name} saved in '
+                  f'{time.monotonic() - start:.3f}s')
+
+
+    @property
+    def config(self):
+        '''The current configuration as a list of lines, assign to replace'''
+        if self._lines is None:
+            lines = []
+            block = self._head.next
+            while block is not None:
+                lines.extend(block.lines)
+                block = block.next
+            self._lines = lines
+        return self._lines
+
+    @config.setter
+    def config(self, config):
+        self._head = _Block([], ())
+        self._index = {}
+        self._insert(self._head, config)
+        self._lines = config
+
+    def _insert(self, prev, lines):
+        '''Split lines into blocks and link them after block <prev>'''
+        split = []
+        for line in lines:
+            if split and (not line or line[0].isspace()):
+                split[-1].append(line)
+            else:
+                split.append([line])
+
+        nxt = prev.next
+        keys = _keys_between(prev.key, nxt.key if nxt else None, len(split))
+        blocks = []
+        for block_lines, key in zip(split, keys):
+            block = _Block(block_lines, key)
+            block.prev = prev
+            prev.next = block
+            prev = block
+            blocks.append(block)
+            self._index.setdefault(block_lines[0], []).append(block)
+        prev.next = nxt
+        if nxt is not None:
+            nxt.prev = prev
+        self._lines = None
+        return blocks
+
+    def _unlink(self, first, last):
+        '''Remove blocks first to last (inclusive) from the configuration'''
+        block = first
+        while True:
+            block.alive = False
+            if block is last:
+                break
+            block = block.next
+        first.prev.next = last.next
+        if last.next is not None:
+            last.next.prev = first.prev
+        self._lines = None
+
+    def _find_block(self, pattern, start):
+        '''Find the first block at or after block <start> starting with a line
+        matching <pattern>. Literal patterns are served from the index of
+        top-level lines; a match on an indented line splits its block.'''
+        if start is None:
+            return None
+
+        literal = _literal_pattern(pattern)
+        if literal is not None:
+            blocks = [b for b in self._index.get(literal, []) if b.alive]
+            self._index[literal] = blocks
+            blocks = [b for b in blocks if b.key >= start.key]
+            return min(blocks, key=lambda b: b.key) if blocks else None
+
+        regex = re.compile(pattern + '$')
+        top_level = _top_level_pattern(pattern)
+        block = start
+        while block is not None:
+            if regex.match(block.lines[0]):
+                return block
+            if not top_level:
+                for i, line in enumerate(block.lines[1:], start=1):
+                    if regex.match(line):
+                        tail = block.lines[i:]
+                        del block.lines[i:]
+                        return self._insert(block, tail)[0]
+            block = block.next
+        return None
+
+    @staticmethod
+    def _find_stop(block, pattern):
+        '''Find the first line after the first line of <block> matching pattern
+        return: (block, line index within block) or None'''
+        i = 1
+        while block is not None:
+            for j in range(i, len(block.lines)):
+                if re.match(pattern, block.lines[j]):
+                    return block, j
+            block, i = block.next, 0
+        return None
 
     def modify_section(self, start_pattern, replacement='!', stop_pattern=r'\S+', remove_stop_mark=False, count=0):
         if isinstance(replacement, str):
@@ -498,34 +955,42 @@ def modify_section(self, start_pattern, replacement='!', stop_pattern=r'\S+', re
         LOG.debug(f'modify_section: starting search for {repr(start_pattern)} until {repr(stop_pattern)}')
 
         _count = 0
-        _next_start = 0
+        _next_start = self._head.next
         while True:
             if count and count <= _count:
                 # Break out of the loop after specified amount of matches
-                LOG.debug(f'modify_section: reached limit ({_count}), exiting loop at line {_next_start}')
+                LOG.debug(f'modify_section: reached limit ({_count}), exiting loop')
                 break
             # While searching, always assume that the user wants to search for the exact pattern he entered
             # To be more specific the user needs a override, eg. a "pattern.*"
-            _w = _find_first_block(
-                self.config, start_pattern+'$', stop_pattern, start_at=_next_start)
+            start = self._find_block(start_pattern, _next_start)
+            _w = self._find_stop(start, stop_pattern) if start else None
             if not _w:
                 # Reached the end, no more elements to remove
                 LOG.debug(f'modify_section: No more config sections found, exiting')
                 break
-            start_element, end_element = _w
-            LOG.debug(f'modify_section:   found match between {start_element} and {end_element}')
-            for i, e in enumerate(self.config[start_element:end_element+1 if remove_stop_mark else end_element],
-                                  start=start_element):
-                LOG.debug(f'modify_section:   remove       {i:3} {e}')
-            del self.config[start_element:end_element +
-                            1 if remove_stop_mark else end_element]
-            if replacement:
-                # Append the replacement config at the current position
-                for i, e in enumerate(replacement, start=start_element):
-                    LOG.debug(f'modify_section:   add          {i:3} {e}')
-                self.config[start_element:start_element] = replacement
+            stop, stop_line = _w
+            LOG.debug(f'modify_section:   found match {repr(start.lines[0])} until {repr(stop.lines[stop_line])}')
+
+            rest = stop.lines[stop_line + 1 if remove_stop_mark else stop_line:]
+            block = start
+            while True:
+                end = len(block.lines) - len(rest) if block is stop else len(block.lines)
+                for e in block.lines[:end]:
+                    LOG.debug(f'modify_section:   remove       {e}')
+                if block is stop:
+                    break
+                block = block.next
+            prev = start.prev
+            self._unlink(start, stop)
+
+            for e in replacement:
+                LOG.debug(f'modify_section:   add          {e}')
+            added = self._insert(prev, replacement) if replacement else []
+            tail = self._insert(added[-1] if added else prev, rest) if rest else []
+
             _count += 1
-            _next_start = start_element + len(replacement)
+            _next_start = tail[0] if tail else (added[-1].next if added else prev.next)
 
         return _count
 
@@ -536,12 +1001,12 @@ def add_before(self, before_pattern, addition):
         elif not isinstance(addition, list):
             return ValueError("The replacement element needs to be a string or list type object")
 
-        start = _find_first_element(self.config, before_pattern)
-        if start < 0:
+        block = self._find_block(before_pattern, self._head.next)
+        if block is None:
             return False
-        for i, e in enumerate(addition, start=start):
-            LOG.debug(f'add_before:   add          {i:3} {e}')
-        self.config[start:start] = addition
+        for e in addition:
+            LOG.debug(f'add_before:   add          {e}')
+        self._insert(block.prev, addition)
         return True
 
     def __str__(self):
@@ -18,6 +18,8 @@
 from vyos.ifconfig.interface import Interface
 from vyos.ifconfig.operational import Operational
 from vyos.ifconfig.vrrp import VRRP
+from vyos.ifconfig.snapshot import InterfaceSnapshot
+from vyos.ifconfig.plan import ApplyPlan
 
 from vyos.ifconfig.bond import BondIf
 from vyos.ifconfig.bridge import BridgeIf
@@ -14,10 +14,14 @@
 # License along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import json
+import re
 
 from inspect import signature
 from inspect import _empty
 
+from vyos.ifconfig.plan import ApplyPlan
+from vyos.ifconfig.plan import planned_link
 from vyos.ifconfig.section import Section
 from vyos.utils.process import popen
 from vyos.utils.process import cmd
@@ -45,11 +49,28 @@ def __init__(self, **kargs):
     def _debug_msg (self, message):
         return debug.message(message, self.debug)
 
+    def _plan(self):
+        """
+        Return the active ApplyPlan if changes to this interface are recorded
+        into it instead of being applied immediately, None otherwise.
+        """
+        plan = ApplyPlan.active
+        if plan and 'netns' not in self.config and plan.knows(self.ifname):
+            return plan
+        return None
+
+    def _barrier(self):
+        # commands executed directly must see all changes recorded so far
+        plan = self._plan()
+        if plan:
+            plan.barrier(self.ifname)
+
     def _popen(self, command):
+        self._barrier()
         return popen(command, self.debug)
 
     def _cmd(self, command):
-        import re
+        self._barrier()
         if 'netns' in self.config:
             # This command must be executed from default netns 'ip link set dev X netns X'
             # exclude set netns cmd from netns to avoid:
@@ -68,6 +89,11 @@ def _get_command(self, config, name):
         Using the defined names, set data write to sysfs.
         """
         cmd = self._command_get[name]['shellcmd'].format(**config)
+        plan = self._plan()
+        if plan and re.match(r'ip -json (-detail )?link (show|list) dev \S+$', cmd):
+            # answered from the planned link data, formatted as the command output
+            link = json.dumps([plan.get_link(config['ifname'])])
+            return self._command_get[name].get('format', lambda _: _)(link)
         return self._command_get[name].get('format', lambda _: _)(self._cmd(cmd))
 
     def _values(self, name, validate, value):
@@ -100,6 +126,7 @@ def _set_command(self, config, name, value):
         """
         # the code can pass int as int
         value = str(value)
+        planned = value
 
         validate = self._command_set[name].get('validate', None)
         if validate:
@@ -119,6 +146,9 @@ def _set_command(self, config, name, value):
         config = {**config, **{'value': value}}
 
         cmd = self._command_set[name]['shellcmd'].format(**config)
+        plan = self._plan()
+        if plan and name in planned_link:
+            return plan.set_link(config['ifname'], name, planned, cmd)
         return self._command_set[name].get('format', lambda _: _)(self._cmd(cmd))
 
     _sysfs_get = {}
@@ -151,6 +181,9 @@ def _get_sysfs(self, config, name):
         filename = self._sysfs_get[name]['location'].format(**config)
         if not filename:
             return None
+        plan = self._plan()
+        if plan and plan.read_sysfs(filename) is not None:
+            return plan.read_sysfs(filename)
         return self._read_sysfs(filename)
 
     def _set_sysfs(self, config, name, value):
@@ -173,8 +206,13 @@ def _set_sysfs(self, config, name, value):
         if convert:
             value = convert(value)
 
-        commited = self._write_sysfs(
-            self._sysfs_set[name]['location'].format(**config), value)
+        filename = self._sysfs_set[name]['location'].format(**config)
+        plan = self._plan()
+        if plan:
+            plan.write_sysfs(filename, value)
+            return True
+
+        commited = self._write_sysfs(filename, value)
         if not commited:
             errmsg = self._sysfs_set.get('errormsg', '')
             if errmsg:
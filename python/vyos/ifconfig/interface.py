@@ -53,6 +53,7 @@
 from vyos.utils.assertion import assert_range
 
 from vyos.ifconfig.control import Control
+from vyos.ifconfig.plan import ApplyPlan
 from vyos.ifconfig.vrrp import VRRP
 from vyos.ifconfig.operational import Operational
 from vyos.ifconfig import Section
@@ -137,7 +138,7 @@ class Interface(Control):
             'shellcmd': 'ip link set dev {ifname} address {value}',
         },
         'mtu': {
-            'validate': assert_mtu,
+            'validate': lambda self, mtu: self._assert_mtu(mtu),
             'shellcmd': 'ip link set dev {ifname} mtu {value}',
         },
         'vrf': {
@@ -285,6 +286,8 @@ class Interface(Control):
 
     @classmethod
     def exists(cls, ifname: str, netns: str=None) -> bool:
+        if ApplyPlan.active and not netns:
+            return ApplyPlan.active.exists(ifname)
         cmd = f'ip link show dev {ifname}'
         if netns:
            cmd = f'ip netns exec {netns} {cmd}'
@@ -397,6 +400,9 @@ def _delete(self):
         # after interface removal no other commands should be allowed
         # to be called and instead should raise an Exception:
         cmd = 'ip link del dev {ifname}'.format(**self.config)
+        plan = self._plan()
+        if plan:
+            return plan.del_link(self.ifname, cmd)
         # for delete we can't get data from self.config{'netns'}
         netns = get_interface_namespace(self.ifname)
         if netns: cmd = f'ip netns exec {netns} {cmd}'
@@ -411,13 +417,19 @@ def _set_vrf_ct_zone(self, vrf):
         if 'netns' in self.config:
             return None
 
+        plan = self._plan()
         if vrf:
             # Get routing table ID for VRF
-            vrf_table_id = get_interface_config(vrf).get('linkinfo', {}).get(
+            vrf_config = plan.get_link(vrf) if plan else get_interface_config(vrf)
+            vrf_table_id = vrf_config.get('linkinfo', {}).get(
                 'info_data', {}).get('table')
             # Add map element with interface and zone ID
-            if vrf_table_id:
+            if vrf_table_id and plan:
+                plan.set_ct_zone(self.ifname, vrf_table_id)
+            elif vrf_table_id:
                 self._cmd(f'nft add element inet vrf_zones ct_iface_map {{ "{self.ifname}" : {vrf_table_id} }}')
+        elif plan:
+            plan.set_ct_zone(self.ifname)
         else:
             nft_del_element = f'delete element inet vrf_zones ct_iface_map {{ "{self.ifname}" }}'
             # Check if deleting is possible first to avoid raising errors
@@ -459,6 +471,11 @@ def get_mtu(self):
         """
         return int(self.get_interface('mtu'))
 
+    def _assert_mtu(self, mtu):
+        # validate against the planned link, which might not exist yet
+        plan = self._plan()
+        assert_mtu(mtu, self.ifname, plan.get_link(self.ifname) if plan else None)
+
     def set_mtu(self, mtu):
         """
         Get/set interface mtu in bytes.
@@ -557,7 +574,7 @@ def set_mac(self, mac):
     def del_netns(self, netns: str) -> bool:
         """ Remove interface from given network namespace """
         # If network namespace does not exist then there is nothing to delete
-        if not os.path.exists(f'/run/netns/{netns}'):
+        if not netns or not os.path.exists(f'/run/netns/{netns}'):
             return False
 
         # Check if interface exists in network namespace
@@ -635,14 +652,27 @@ def set_ipv6_cache_tmo(self, tmo):
             return None
         return self.set_interface('ipv6_cache_tmo', tmo)
 
-    def _cleanup_mss_rules(self, table, ifname):
-        commands = []
-        results = self._cmd(f'nft -a list chain {table} VYOS_TCP_MSS').split("\n")
-        for line in results:
-            if f'oifname "{ifname}"' in line:
-                handle_search = re.search('handle (\d+)', line)
-                if handle_search:
-                    self._cmd(f'nft delete rule {table} VYOS_TCP_MSS handle {handle_search[1]}')
+    def _set_nft_element(self, table, name, value=None, chain=None):
+        """
+        Set element of this interface in nftables verdict map, or remove it
+        if value is None. See ApplyPlan.set_element().
+        """
+        plan = self._plan()
+        if plan:
+            return plan.set_element(table, name, self.ifname, value, chain)
+        plan = ApplyPlan()
+        if plan.set_element(table, name, self.ifname, value, chain):
+            plan.apply()
+
+    def _tcp_mss_verdict(self, mss):
+        """ Return verdict and chain of MSS map element, see set_tcp_ipv4_mss() """
+        if mss == 'clamp-mss-to-pmtu':
+            return 'jump VYOS_TCP_MSS_PMTU', None
+        if int(mss) > 0:
+            low_mss = str(int(mss) + 1)
+            return f'jump VYOS_TCP_MSS_{mss}', (f'VYOS_TCP_MSS_{mss}',
+                [f'tcp option maxseg size {low_mss}-65535 tcp option maxseg size set {mss}'])
+        return None, None
 
     def set_tcp_ipv4_mss(self, mss):
         """
@@ -659,14 +689,10 @@ def set_tcp_ipv4_mss(self, mss):
         if 'netns' in self.config:
             return None
 
-        self._cleanup_mss_rules('raw', self.ifname)
-        nft_prefix = 'nft add rule raw VYOS_TCP_MSS'
-        base_cmd = f'oifname "{self.ifname}" tcp flags & (syn|rst) == syn'
-        if mss == 'clamp-mss-to-pmtu':
-            self._cmd(f"{nft_prefix} '{base_cmd} tcp option maxseg size set rt mtu'")
-        elif int(mss) > 0:
-            low_mss = str(int(mss) + 1)
-            self._cmd(f"{nft_prefix} '{base_cmd} tcp option maxseg size {low_mss}-65535 tcp option maxseg size set {mss}'")
+        # SYN packets are dispatched by the VYOS_TCP_MSS_IFACES map, to
+        # one chain per MSS value
+        verdict, chain = self._tcp_mss_verdict(mss)
+        return self._set_nft_element('raw', 'VYOS_TCP_MSS_IFACES', verdict, chain)
 
     def set_tcp_ipv6_mss(self, mss):
         """
@@ -683,14 +709,10 @@ def set_tcp_ipv6_mss(self, mss):
         if 'netns' in self.config:
             return None
 
-        self._cleanup_mss_rules('ip6 raw', self.ifname)
-        nft_prefix = 'nft add rule ip6 raw VYOS_TCP_MSS'
-        base_cmd = f'oifname "{self.ifname}" tcp flags & (syn|rst) == syn'
-        if mss == 'clamp-mss-to-pmtu':
-            self._cmd(f"{nft_prefix} '{base_cmd} tcp option maxseg size set rt mtu'")
-        elif int(mss) > 0:
-            low_mss = str(int(mss) + 1)
-            self._cmd(f"{nft_prefix} '{base_cmd} tcp option maxseg size {low_mss}-65535 tcp option maxseg size set {mss}'")
+        # SYN packets are dispatched by the VYOS_TCP_MSS_IFACES map, to
+        # one chain per MSS value
+        verdict, chain = self._tcp_mss_verdict(mss)
+        return self._set_nft_element('ip6 raw', 'VYOS_TCP_MSS_IFACES', verdict, chain)
 
     def set_arp_filter(self, arp_filter):
         """
@@ -787,14 +809,6 @@ def set_ipv4_directed_broadcast(self, forwarding):
             return None
         return self.set_interface('ipv4_directed_broadcast', forwarding)
 
-    def _cleanup_ipv4_source_validation_rules(self, ifname):
-        results = self._cmd(f'nft -a list chain ip raw vyos_rpfilter').split("\n")
-        for line in results:
-            if f'iifname "{ifname}"' in line:
-                handle_search = re.search('handle (\d+)', line)
-                if handle_search:
-                    self._cmd(f'nft delete rule ip raw vyos_rpfilter handle {handle_search[1]}')
-
     def set_ipv4_source_validation(self, mode):
         """
         Set IPv4 reverse path validation
@@ -807,22 +821,10 @@ def set_ipv4_source_validation(self, mode):
         if 'netns' in self.config:
             return None
 
-        self._cleanup_ipv4_source_validation_rules(self.ifname)
-        nft_prefix = f'nft insert rule ip raw vyos_rpfilter iifname "{self.ifname}"'
+        verdict = None
         if mode in ['strict', 'loose']:
-            self._cmd(f"{nft_prefix} counter return")
-        if mode == 'strict':
-            self._cmd(f"{nft_prefix} fib saddr . iif oif 0 counter drop")
-        elif mode == 'loose':
-            self._cmd(f"{nft_prefix} fib saddr oif 0 counter drop")
-
-    def _cleanup_ipv6_source_validation_rules(self, ifname):
-        results = self._cmd(f'nft -a list chain ip6 raw vyos_rpfilter').split("\n")
-        for line in results:
-            if f'iifname "{ifname}"' in line:
-                handle_search = re.search('handle (\d+)', line)
-                if handle_search:
-                    self._cmd(f'nft delete rule ip6 raw vyos_rpfilter handle {handle_search[1]}')
+            verdict = f'goto vyos_rpfilter_{mode}'
+        return self._set_nft_element('ip raw', 'vyos_rpfilter_ifaces', verdict)
 
     def set_ipv6_source_validation(self, mode):
         """
@@ -836,14 +838,10 @@ def set_ipv6_source_validation(self, mode):
         if 'netns' in self.config:
             return None
 
-        self._cleanup_ipv6_source_validation_rules(self.ifname)
-        nft_prefix = f'nft insert rule ip6 raw vyos_rpfilter iifname "{self.ifname}"'
+        verdict = None
         if mode in ['strict', 'loose']:
-            self._cmd(f"{nft_prefix} counter return")
-        if mode == 'strict':
-            self._cmd(f"{nft_prefix} fib saddr . iif oif 0 counter drop")
-        elif mode == 'loose':
-            self._cmd(f"{nft_prefix} fib saddr oif 0 counter drop")
+            verdict = f'goto vyos_rpfilter_{mode}'
+        return self._set_nft_element('ip6 raw', 'vyos_rpfilter_ifaces', verdict)
 
     def set_ipv6_accept_ra(self, accept_ra):
         """
@@ -1189,13 +1187,18 @@ def add_addr(self, addr):
 
         # get interface network namespace if specified
         netns = self.config.get('netns', None)
+        plan = self._plan()
 
         # add to interface
         if addr == 'dhcp':
             self.set_dhcp(True)
         elif addr == 'dhcpv6':
             self.set_dhcpv6(True)
-        elif not is_intf_addr_assigned(self.ifname, addr, netns=netns):
+        elif plan and not plan.is_addr_assigned(self.ifname, addr):
+            tmp = f'ip addr add {addr} dev {self.ifname}'
+            if is_ipv4(addr): tmp += ' brd +'
+            plan.add_addr(self.ifname, addr, tmp)
+        elif not plan and not is_intf_addr_assigned(self.ifname, addr, netns=netns):
             netns_cmd  = f'ip netns exec {netns}' if netns else ''
             tmp = f'{netns_cmd} ip addr add {addr} dev {self.ifname}'
             # Add broadcast address for IPv4
@@ -1239,13 +1242,16 @@ def del_addr(self, addr):
 
         # get interface network namespace if specified
         netns = self.config.get('netns', None)
+        plan = self._plan()
 
         # remove from interface
         if addr == 'dhcp':
             self.set_dhcp(False)
         elif addr == 'dhcpv6':
             self.set_dhcpv6(False)
-        elif is_intf_addr_assigned(self.ifname, addr, netns=netns):
+        elif plan and plan.is_addr_assigned(self.ifname, addr):
+            plan.del_addr(self.ifname, addr, f'ip addr del {addr} dev {self.ifname}')
+        elif not plan and is_intf_addr_assigned(self.ifname, addr, netns=netns):
             netns_cmd  = f'ip netns exec {netns}' if netns else ''
             self._cmd(f'{netns_cmd} ip addr del {addr} dev {self.ifname}')
         else:
@@ -1267,6 +1273,10 @@ def flush_addrs(self):
         self.set_dhcp(False)
         self.set_dhcpv6(False)
 
+        plan = self._plan()
+        if plan:
+            return plan.flush_addr(self.ifname, f'ip addr flush dev {self.ifname}')
+
         netns = get_interface_namespace(self.ifname)
         netns_cmd = f'ip netns exec {netns}' if netns else ''
         cmd = f'{netns_cmd} ip addr flush dev {self.ifname}'
@@ -1334,6 +1344,12 @@ def add_to_bridge(self, bridge_dict):
                     cmd = f'bridge vlan add dev {ifname} vid {native_vlan_id} pvid untagged master'
                     self._cmd(cmd)
 
+    def _is_service_active(self, service):
+        plan = self._plan()
+        if plan:
+            return plan.is_service_active(service)
+        return is_systemd_service_active(service)
+
     def set_dhcp(self, enable):
         """
         Enable/Disable DHCP client on a given interface.
@@ -1375,10 +1391,10 @@ def set_dhcp(self, enable):
             # the old lease is released a new one is acquired (T4203). We will
             # only restart DHCP client if it's option changed, or if it's not
             # running, but it should be running (e.g. on system startup)
-            if 'dhcp_options_changed' in self.config or not is_systemd_service_active(systemd_service):
+            if 'dhcp_options_changed' in self.config or not self._is_service_active(systemd_service):
                 return self._cmd(f'systemctl restart {systemd_service}')
         else:
-            if is_systemd_service_active(systemd_service):
+            if self._is_service_active(systemd_service):
                 self._cmd(f'systemctl stop {systemd_service}')
             # cleanup old config files
             for file in [dhclient_config_file, systemd_override_file, dhclient_lease_file]:
@@ -1418,7 +1434,7 @@ def set_dhcpv6(self, enable):
             # DHCPv6-PD for interfaces which are yet not up and running.
             return self._popen(f'systemctl restart {systemd_service}')
         else:
-            if is_systemd_service_active(systemd_service):
+            if self._is_service_active(systemd_service):
                 self._cmd(f'systemctl stop {systemd_service}')
             if os.path.isfile(config_file):
                 os.remove(config_file)
@@ -1451,6 +1467,12 @@ def set_mirror_redirect(self):
 
         # clear existing ingess - ignore errors (e.g. "Error: Cannot find specified
         # qdisc on specified device") - we simply cleanup all stuff here
+        plan = self._plan()
+        if plan and not mirror_config and 'redirect' not in self.config and \
+           not plan.has_qdisc(source_if, ['ffff:', '1:']):
+            # nothing to clean up or to apply
+            return None
+
         if not 'traffic_policy' in self.config:
             self._popen(f'tc qdisc del dev {source_if} parent ffff: 2>/dev/null');
             self._popen(f'tc qdisc del dev {source_if} parent 1: 2>/dev/null');
@@ -1513,8 +1535,21 @@ def update(self, config):
         """ General helper function which works on a dictionary retrived by
         get_config_dict(). It's main intention is to consolidate the scattered
         interface setup code and provide a single point of entry when workin
-        on any interface. """
+        on any interface.
+
+        Changes are recorded into an ApplyPlan, shared with the update() of
+        VLAN sub-interfaces, and applied in bulk when the outermost update()
+        returns. """
+        with ApplyPlan.update(self.ifname):
+            self._update(config)
+
+    def _get_interface_config(self, ifname):
+        plan = self._plan()
+        if plan and plan.knows(ifname):
+            return plan.get_link(ifname)
+        return get_interface_config(ifname)
 
+    def _update(self, config):
         if self.debug:
             import pprint
             pprint.pprint(config)
@@ -1587,13 +1622,13 @@ def update(self, config):
         # interface out of any bridge or bond - thus this is checked before.
         if 'is_bond_member' in config:
             bond_if = next(iter(config['is_bond_member']))
-            tmp = get_interface_config(config['ifname'])
+            tmp = self._get_interface_config(config['ifname'])
             if 'master' in tmp and tmp['master'] != bond_if:
                 self.set_vrf('')
 
         elif 'is_bridge_member' in config:
             bridge_if = next(iter(config['is_bridge_member']))
-            tmp = get_interface_config(config['ifname'])
+            tmp = self._get_interface_config(config['ifname'])
             if 'master' in tmp and tmp['master'] != bridge_if:
                 self.set_vrf('')
 
@@ -1767,7 +1802,7 @@ def update(self, config):
             # re-create the VIF-S interface.
             vif_s_ifname = f'{ifname}.{vif_s_id}'
             if self.exists(vif_s_ifname):
-                cur_cfg = get_interface_config(vif_s_ifname)
+                cur_cfg = self._get_interface_config(vif_s_ifname)
                 protocol = dict_search('linkinfo.info_data.protocol', cur_cfg).lower()
                 if protocol != vif_s_config['protocol']:
                     VLANIf(vif_s_ifname).remove()
@@ -1820,7 +1855,7 @@ def update(self, config):
             # not completely delete the old settings,
             # we still need to delete the VLAN encapsulation interface in order to
             # ensure that the changed settings are effective.
-            cur_cfg = get_interface_config(vif_ifname)
+            cur_cfg = self._get_interface_config(vif_ifname)
             qos_str = ''
             tmp2 = dict_search('linkinfo.info_data.ingress_qos', cur_cfg)
             if 'ingress_qos' in tmp and tmp2:
@@ -1872,7 +1907,20 @@ def _create(self):
         if 'egress_qos' in self.config:
             cmd += ' egress-qos-map {egress_qos}'
 
-        self._cmd(cmd.format(**self.config))
+        plan = ApplyPlan.active
+        source_interface = self.config['source_interface']
+        if plan and 'netns' not in self.config and plan.knows(source_interface):
+            # a new VLAN interface inherits MTU and MAC address of its parent
+            lower = plan.get_link(source_interface)
+            plan.add_link(self.ifname, cmd.format(**self.config), {
+                'ifname': self.ifname, 'link': source_interface, 'flags': [],
+                'mtu': lower.get('mtu'), 'min_mtu': 0, 'max_mtu': 65535,
+                'address': lower.get('address'),
+                'operstate': 'DOWN', 'linkinfo': {'info_kind': 'vlan', 'info_data': {
+                    'protocol': self.config.get('protocol', '802.1Q').upper(),
+                    'id': int(self.config['vlan_id'])}}})
+        else:
+            self._cmd(cmd.format(**self.config))
 
         # interface is always A/D down. It needs to be enabled explicitly
         self.set_admin_state('down')
@@ -1889,6 +1937,13 @@ def set_admin_state(self, state):
         """
         # A VLAN interface can only be placed in admin up state when
         # the lower interface is up, too
+        plan = self._plan()
+        lower = plan.get_link(self.ifname).get('link') if plan else None
+        if lower and plan.knows(lower):
+            if 'UP' not in plan.get_link(lower).get('flags', []):
+                return None
+            return super().set_admin_state(state)
+
         lower_interface = glob(f'/sys/class/net/{self.ifname}/lower*/flags')[0]
         with open(lower_interface, 'r') as f:
             flags = f.read()
@@ -0,0 +1,354 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import json
+
+from copy import deepcopy
+from ipaddress import ip_interface
+from time import perf_counter
+
+from vyos import debug
+from vyos.ifconfig.snapshot import InterfaceSnapshot
+from vyos.utils.file import write_file
+from vyos.utils.process import cmd
+from vyos.utils.process import rc_cmd
+
+# iproute2 link attributes which are tracked by the plan, see _set_link()
+planned_link = ['admin_state', 'alias', 'mac', 'mtu', 'vrf']
+
+def _set_link(link, name, value):
+    """ Update 'ip -json -detail link show' data as 'ip link set' would """
+    if name == 'admin_state':
+        flags = [flag for flag in link.get('flags', []) if flag != 'UP']
+        link['flags'] = flags + ['UP'] if value == 'up' else flags
+    elif name == 'alias':
+        link['ifalias'] = value
+    elif name == 'mac':
+        link['address'] = value
+    elif name == 'mtu':
+        link['mtu'] = int(value)
+    elif name == 'vrf':
+        linkinfo = link.setdefault('linkinfo', {})
+        if value:
+            link['master'] = value
+            linkinfo['info_slave_kind'] = 'vrf'
+        elif linkinfo.get('info_slave_kind') == 'vrf':
+            del link['master']
+            del linkinfo['info_slave_kind']
+
+def _get_link(link, name):
+    """ Return value of link attribute in the form it is set with """
+    if name == 'admin_state':
+        return 'up' if 'UP' in link.get('flags', []) else 'down'
+    if name == 'alias':
+        return link.get('ifalias', '')
+    if name == 'mac':
+        return link.get('address', '').lower()
+    if name == 'mtu':
+        return str(link.get('mtu', ''))
+    if name == 'vrf':
+        if link.get('linkinfo', {}).get('info_slave_kind') == 'vrf':
+            return link.get('master', '')
+        return ''
+
+def _write_sysfs(filename, value):
+    # sysfs entries might be gone, e.g. IPv6 settings for MTU < 1280
+    if os.path.isfile(filename):
+        write_file(filename, value)
+        debug.message(f"write '{value}' > '{filename}'", 'ifconfig')
+
+def _nft_value(value):
+    """ Return map element value from 'nft -j' output as in nft syntax """
+    if isinstance(value, dict):
+        # verdict, e.g. {"jump": {"target": "chain"}}
+        verdict, target = next(iter(value.items()))
+        return f"{verdict} {target['target']}" if target else verdict
+    return str(value)
+
+def _batch(command):
+    """ Return iproute2 command as 'ip -batch' line """
+    return re.sub(r'^ip\s+', '', command.strip())
+
+class ApplyPlan:
+    """
+    Changes to interfaces recorded while Interface.update() runs and applied
+    in bulk at the end of the outermost update() call.
+
+    The current state of all interfaces is read from a single
+    InterfaceSnapshot, which is kept up to date with the recorded changes,
+    so no-op writes are dropped instead of being executed. Recorded changes
+    are applied by one 'ip -batch' for links and addresses, one pass of
+    sysfs writes, one 'ip -batch' for the final administrative state of the
+    links and one 'nft -f' transaction for all per interface nftables map
+    elements (MSS clamping, source validation, VRF conntrack zones).
+
+    Interfaces in a network namespace, and interfaces a command was executed
+    for directly, are not handled by the plan.
+
+    DEBUG:
+    The time spent for each interface is printed when the 'ifconfig' debug
+    flag is set, see vyos.debug.
+    """
+    active = None
+
+    def __init__(self):
+        self.snapshot = InterfaceSnapshot()
+        # 'ip -batch' lines, sysfs writes by filename, deferred link states
+        self._ip = []
+        self._sysfs = {}
+        self._state = {}
+        # nft script lines, map elements by 'table map'
+        self._nft = []
+        self._maps = {}
+        # links as modified by the plan, links added and removed by it
+        self._link = {}
+        self._addr = {}
+        self._created = set()
+        self._removed = set()
+        self._stale = set()
+        self._services = {}
+        self._qdiscs = None
+        # per interface time spent in update()
+        self.timing = {}
+        self._stack = []
+
+    @classmethod
+    def update(cls, ifname):
+        """
+        Return context for the update() of interface ifname. The outermost
+        context starts a plan and applies it when left.
+        """
+        return _PlanUpdate(cls, ifname)
+
+    def begin(self, ifname):
+        self._stack.append([ifname, perf_counter(), 0.0])
+
+    def end(self):
+        ifname, start, nested = self._stack.pop()
+        elapsed = perf_counter() - start
+        self.timing[ifname] = self.timing.get(ifname, 0.0) + elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def knows(self, ifname) -> bool:
+        """ Check if changes to interface ifname are recorded into the plan """
+        if ifname in self._stale or ifname in self._removed:
+            return False
+        return ifname in self._created or bool(self.snapshot.get_link_data(ifname))
+
+    def exists(self, ifname) -> bool:
+        if ifname in self._removed:
+            return False
+        if self.knows(ifname):
+            return True
+        return os.path.exists(f'/sys/class/net/{ifname}')
+
+    def get_link(self, ifname) -> dict:
+        """ Return 'ip -json -detail link show' data of interface, as planned """
+        if ifname not in self._link:
+            self._link[ifname] = deepcopy(self.snapshot.get_link_data(ifname))
+        return self._link[ifname]
+
+    def get_addr(self, ifname) -> list:
+        """ Return addresses of interface, as planned """
+        if ifname not in self._addr:
+            self._addr[ifname] = self.snapshot.get_addr(ifname)
+        return self._addr[ifname]
+
+    def is_addr_assigned(self, ifname, addr) -> bool:
+        addr = ip_interface(addr.split('%')[0])
+        return any(ip_interface(a) == addr for a in self.get_addr(ifname))
+
+    def add_link(self, ifname, command, link):
+        """ Record creation of interface ifname with initial link data """
+        self._ip.append(_batch(command))
+        self._removed.discard(ifname)
+        self._created.add(ifname)
+        self._link[ifname] = link
+        self._addr[ifname] = []
+
+    def del_link(self, ifname, command):
+        """ Record removal of interface ifname """
+        self._ip.append(_batch(command))
+        self._state.pop(ifname, None)
+        self._created.discard(ifname)
+        self._removed.add(ifname)
+        self._link.pop(ifname, None)
+        self._addr.pop(ifname, None)
+
+    def set_link(self, ifname, name, value, command):
+        """
+        Record an 'ip link set' command changing attribute name of interface
+        ifname to value. Returns False if the value is unchanged.
+        """
+        link = self.get_link(ifname)
+        value = str(value)
+        if _get_link(link, name) == (value.lower() if name == 'mac' else value):
+            return False
+        _set_link(link, name, value)
+        if name == 'admin_state':
+            # links are brought up after all other changes have been applied
+            self._state.pop(ifname, None)
+            if value == 'up':
+                self._state[ifname] = _batch(command)
+                return True
+        self._ip.append(_batch(command))
+        return True
+
+    def add_addr(self, ifname, addr, command):
+        self._ip.append(_batch(command))
+        self.get_addr(ifname).append(addr)
+
+    def del_addr(self, ifname, addr, command):
+        self._ip.append(_batch(command))
+        addr = ip_interface(addr.split('%')[0])
+        self._addr[ifname] = [a for a in self.get_addr(ifname) if ip_interface(a) != addr]
+
+    def flush_addr(self, ifname, command):
+        if self.get_addr(ifname):
+            self._ip.append(_batch(command))
+            self._addr[ifname] = []
+
+    def read_sysfs(self, filename):
+        """ Return planned value of sysfs file, or None if there is none """
+        return self._sysfs.get(filename)
+
+    def write_sysfs(self, filename, value):
+        # re-insert so writes are applied in the order they were planned
+        self._sysfs.pop(filename, None)
+        self._sysfs[filename] = str(value)
+
+    def _map(self, table, name) -> dict:
+        key = f'{table} {name}'
+        if key not in self._maps:
+            self._maps[key] = {}
+            rc, out = rc_cmd(f'nft -j list map {key}')
+            if rc == 0:
+                for entry in json.loads(out)['nftables']:
+                    for elem, value in entry.get('map', {}).get('elem', []):
+                        self._maps[key][elem] = _nft_value(value)
+        return self._maps[key]
+
+    def set_element(self, table, name, key, value=None, chain=None):
+        """
+        Record setting element key of nftables map to value, or removing it
+        if value is None. chain is an optional (name, rules) tuple of a chain
+        the value refers to, which is (re)created first.
+        Returns False if the element is unchanged.
+        """
+        elements = self._map(table, name)
+        value = None if value is None else str(value)
+        if elements.get(key) == value:
+            return False
+        if chain:
+            chain_name, rules = chain
+            if f'{table} {chain_name}' not in self._maps:
+                self._maps[f'{table} {chain_name}'] = rules
+                self._nft += [f'add chain {table} {chain_name}', f'flush chain {table} {chain_name}']
+                self._nft += [f'add rule {table} {chain_name} {rule}' for rule in rules]
+        if key in elements:
+            self._nft.append(f'delete element {table} {name} {{ "{key}" }}')
+            del elements[key]
+        if value is not None:
+            self._nft.append(f'add element {table} {name} {{ "{key}" : {value} }}')
+            elements[key] = value
+        return True
+
+    def set_ct_zone(self, ifname, zone=None):
+        """ Record adding or removing interface to VRF conntrack zone map """
+        return self.set_element('inet vrf_zones', 'ct_iface_map', ifname, zone)
+
+    def is_service_active(self, service) -> bool:
+        """ Check if systemd service is active, for all units of template at once """
+        template = service.split('@')[0]
+        if template not in self._services:
+            tmp = cmd(f"systemctl list-units --plain --no-legend --state=active '{template}@*'")
+            self._services[template] = {line.split()[0] for line in tmp.splitlines() if line}
+        return service in self._services[template]
+
+    def has_qdisc(self, ifname, handles) -> bool:
+        """ Check if interface has a qdisc with one of the given handles """
+        if self._qdiscs is None:
+            self._qdiscs = {(q['dev'], q['handle']) for q in json.loads(cmd('tc -json qdisc show'))}
+        return any((ifname, handle) in self._qdiscs for handle in handles)
+
+    def barrier(self, ifname):
+        """
+        Apply all changes recorded so far, as a command is going to be
+        executed directly for interface ifname. Its state is no longer
+        known to the plan afterwards.
+        """
+        self.apply()
+        self._stale.add(ifname)
+
+    def changes(self) -> int:
+        return len(self._ip) + len(self._sysfs) + len(self._state) + len(self._nft)
+
+    def apply(self):
+        """ Apply all recorded changes """
+        if self._ip:
+            cmd('ip -batch -', 'ifconfig', input='\n'.join(self._ip) + '\n')
+        for filename, value in self._sysfs.items():
+            _write_sysfs(filename, value)
+        if self._state:
+            cmd('ip -batch -', 'ifconfig', input='\n'.join(self._state.values()) + '\n')
+        if self._nft:
+            cmd('nft -f -', 'ifconfig', input='\n'.join(self._nft) + '\n')
+
+        self._ip = []
+        self._sysfs = {}
+        self._state = {}
+        self._nft = []
+
+class _PlanUpdate:
+    def __init__(self, cls, ifname):
+        self.cls = cls
+        self.ifname = ifname
+        self.owner = False
+
+    def __enter__(self):
+        if self.cls.active is None:
+            self.cls.active = self.cls()
+            self.owner = True
+        self.cls.active.begin(self.ifname)
+        return self.cls.active
+
+    def __exit__(self, exc_type, exc_value, tb):
+        plan = self.cls.active
+        plan.end()
+        if not self.owner:
+            return
+        self.cls.active = None
+        if exc_type is not None:
+            # changes recorded before the error would have been applied
+            # already, failing to do so must not hide the original error
+            try:
+                plan.apply()
+            except Exception as e:
+                debug.message(f'changes recorded before the error not applied: {e}', 'ifconfig')
+            return
+
+        changes = plan.changes()
+        start = perf_counter()
+        plan.apply()
+        elapsed = perf_counter() - start
+
+        for ifname, seconds in plan.timing.items():
+            debug.message(f'{ifname}: planned in {seconds * 1000:.1f}ms', 'ifconfig')
+        debug.message(f'{len(plan.timing)} interface(s) planned in '
+                      f'{sum(plan.timing.values()):.3f}s, {changes} change(s) '
+                      f'applied in {elapsed:.3f}s', 'ifconfig')
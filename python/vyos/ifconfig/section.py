@@ -88,12 +88,12 @@ def klass(cls, name, vlan=True, vrrp=True):
         raise ValueError(f'No type found for interface name: {name}')
 
     @classmethod
-    def _intf_under_section (cls,section='',vlan=True):
+    def _intf_under_section (cls,section='',vlan=True,ifnames=None):
         """
         return a generator with the name of the configured interface
         which are under a section
         """
-        interfaces = netifaces.interfaces()
+        interfaces = netifaces.interfaces() if ifnames is None else ifnames
 
         for ifname in interfaces:
             ifsection = cls.section(ifname)
@@ -138,14 +138,15 @@ def key(ifname):
         return l
 
     @classmethod
-    def interfaces(cls, section='', vlan=True):
+    def interfaces(cls, section='', vlan=True, ifnames=None):
         """
         return a list of the name of the configured interface which are under a section
         if no section is provided, then it returns all configured interfaces.
         If vlan is True, also Vlan subinterfaces will be returned
+        If ifnames is provided, it is used instead of the interfaces of the system
         """
 
-        return cls._sort_interfaces(cls._intf_under_section(section, vlan))
+        return cls._sort_interfaces(cls._intf_under_section(section, vlan, ifnames))
 
     @classmethod
     def _intf_with_feature(cls, feature=''):
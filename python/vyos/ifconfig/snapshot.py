@@ -0,0 +1,138 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import json
+
+from vyos.utils.process import cmd
+
+# sysfs statistics names, as used by Operational, in 'ip -statistics' json
+_stats64 = {
+    'rx_bytes': ('rx', 'bytes'),
+    'rx_packets': ('rx', 'packets'),
+    'rx_errors': ('rx', 'errors'),
+    'rx_dropped': ('rx', 'dropped'),
+    'rx_over_errors': ('rx', 'over_errors'),
+    'multicast': ('rx', 'multicast'),
+    'tx_bytes': ('tx', 'bytes'),
+    'tx_packets': ('tx', 'packets'),
+    'tx_errors': ('tx', 'errors'),
+    'tx_dropped': ('tx', 'dropped'),
+    'tx_carrier_errors': ('tx', 'carrier_errors'),
+    'collisions': ('tx', 'collisions'),
+}
+
+class InterfaceSnapshot:
+    """
+    State of all interfaces of the system, each kind of data retrieved by a
+    single netlink dump on first use, instead of one 'ip' call or sysfs
+    read per interface and attribute.
+
+    The getters return the same values as the corresponding Interface and
+    Operational getters.
+
+    Example:
+    >>> from vyos.ifconfig import InterfaceSnapshot
+    >>> snapshot = InterfaceSnapshot()
+    >>> snapshot.get_mtu('eth0')
+    1500
+    """
+    def __init__(self):
+        self._addr = None
+        self._link = None
+        self._tunnel6 = None
+        self._text = None
+
+    @staticmethod
+    def _dump(command) -> dict:
+        return {entry['ifname']: entry for entry in json.loads(cmd(command))}
+
+    def _get_addr(self) -> dict:
+        if self._addr is None:
+            self._addr = self._dump('ip -json addr show')
+        return self._addr
+
+    def _get_link(self) -> dict:
+        if self._link is None:
+            self._link = self._dump('ip -json -detail -statistics link show')
+        return self._link
+
+    def interfaces(self) -> list:
+        """ Return names of all interfaces """
+        return list(self._get_link())
+
+    def get_addr_data(self, ifname) -> dict:
+        """ Return 'ip -json addr show' data of interface """
+        return self._get_addr().get(ifname, {})
+
+    def get_link_data(self, ifname) -> dict:
+        """ Return 'ip -json -detail -statistics link show' data of interface """
+        return self._get_link().get(ifname, {})
+
+    def get_tunnel6(self, ifname) -> dict:
+        """ Return 'ip -json -6 tun show' data of interface """
+        if self._tunnel6 is None:
+            self._tunnel6 = self._dump('ip -json -6 tun show')
+        return self._tunnel6.get(ifname, {})
+
+    def get_text(self, ifname) -> str:
+        """ Return 'ip addr show' output of interface, without index """
+        if self._text is None:
+            self._text = {}
+            block = []
+            for line in cmd('ip addr show').splitlines():
+                match = re.match(r'\d+:\s+([^:@\s]+)', line)
+                if match:
+                    block = [line[match.start(1):]]
+                    self._text[match.group(1)] = block
+                else:
+                    block.append(line)
+        return '\n'.join(self._text.get(ifname, []))
+
+    def get_admin_state(self, ifname) -> str:
+        flags = self.get_link_data(ifname).get('flags', [])
+        return 'up' if 'UP' in flags else 'down'
+
+    def get_oper_state(self, ifname) -> str:
+        # lower case, as in sysfs
+        return self.get_link_data(ifname).get('operstate', '').lower()
+
+    def get_alias(self, ifname) -> str:
+        return self.get_link_data(ifname).get('ifalias', '')
+
+    def get_mac(self, ifname):
+        return self.get_link_data(ifname).get('address')
+
+    def get_mtu(self, ifname):
+        mtu = self.get_link_data(ifname).get('mtu')
+        return int(mtu) if mtu is not None else None
+
+    def get_vrf(self, ifname):
+        link = self.get_link_data(ifname)
+        if link.get('linkinfo', {}).get('info_slave_kind') == 'vrf':
+            return link.get('master')
+        return None
+
+    def get_addr(self, ifname) -> list:
+        """ Return IPv4 and IPv6 addresses of interface, as Interface.get_addr() """
+        addr_info = self.get_addr_data(ifname).get('addr_info', [])
+        return [f"{a['local']}/{a['prefixlen']}" for family in ('inet', 'inet6')
+                for a in addr_info if a.get('family') == family]
+
+    def get_stats(self, ifname) -> dict:
+        """ Return interface counters, as Operational.get_stats() """
+        stats64 = self.get_link_data(ifname).get('stats64', {})
+        return {name: int(stats64.get(rtx, {}).get(key, 0))
+                for name, (rtx, key) in _stats64.items()}
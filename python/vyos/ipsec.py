@@ -15,6 +15,14 @@
 
 #Package to communicate with Strongswan VICI
 
+import select
+import socket
+
+vici_socket = '/var/run/charon.vici'
+
+# vici commands which only read state and may be sent again
+vici_read_only = ('list_sas', 'list_conns', 'list_certs', 'list_pools', 'stats', 'version')
+
 class ViciInitiateError(Exception):
     """
         VICI can't initiate a session.
@@ -26,29 +34,91 @@ class ViciCommandError(Exception):
     """
     pass
 
-def get_vici_sas():
-    from vici import Session as vici_session
+class ViciSession:
+    """
+    Lazily opened vici session shared by all helpers of this module, so
+    that repeated and bulk requests are sent over a single socket. A session
+    closed by charon (e.g. after a restart) is re-opened before a request
+    is sent. If the connection breaks during a request, only read-only
+    commands are retried: charon may already have acted on anything else.
+    """
+    def __init__(self, path: str = vici_socket):
+        self._path = path
+        self._sock = None
+        self._session = None
 
+    def _open(self):
+        from vici import Session as vici_session
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._path)
+            self._session = vici_session(sock)
+        except Exception:
+            sock.close()
+            raise ViciInitiateError("IPsec not initialized")
+        self._sock = sock
+        return self._session
+
+    def _closed(self) -> bool:
+        # no data is pending between requests, a readable socket has been
+        # closed by charon
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._session = None
+
+    def request(self, command: str, *args) -> list:
+        """
+        Run vici command and return its complete output as list. A full
+        iteration on the output is required by vici, without it the command
+        may not be executed completely.
+        """
+        from vici.exception import CommandException
+        from vici.exception import SessionException
+
+        for retry in (command in vici_read_only, False):
+            if self._session is not None and self._closed():
+                self.close()
+            session = self._session or self._open()
+            try:
+                return list(getattr(session, command)(*args))
+            except (OSError, SessionException):
+                # the socket broke, all state of the old session is lost
+                self.close()
+                if not retry:
+                    raise
+            except CommandException:
+                # command failed, the session itself is still usable
+                raise
+            except Exception:
+                # the reply may not have been read completely
+                self.close()
+                raise
+
+_vici_session = ViciSession()
+
+def vici_session() -> ViciSession:
+    """Return the shared vici session of this process"""
+    return _vici_session
+
+def get_vici_sas():
     try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
-    try:
-        sas = list(session.list_sas())
-        return sas
+        return vici_session().request('list_sas')
+    except ViciInitiateError:
+        raise
     except Exception:
         raise ViciCommandError(f'Failed to get SAs')
 
 def get_vici_connections():
-    from vici import Session as vici_session
-
     try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
-    try:
-        connections = list(session.list_conns())
-        return connections
+        return vici_session().request('list_conns')
+    except ViciInitiateError:
+        raise
     except Exception:
         raise ViciCommandError(f'Failed to get connections')
 
@@ -65,20 +135,15 @@ def get_vici_sas_by_name(ike_name: str, tunnel: str) -> list:
     :return: list of Ordinary Dicts with SASs
     :rtype: list
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
     vici_dict = {}
     if ike_name:
         vici_dict['ike'] = ike_name
     if tunnel:
         vici_dict['child'] = tunnel
     try:
-        sas = list(session.list_sas(vici_dict))
-        return sas
+        return vici_session().request('list_sas', vici_dict)
+    except ViciInitiateError:
+        raise
     except Exception:
         raise ViciCommandError(f'Failed to get SAs')
 
@@ -89,26 +154,26 @@ def terminate_vici_ikeid_list(ike_id_list: list) -> None:
     :param ike_id_list: list of IKE SA id
     :type ike_id_list: list
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
     try:
         for ikeid in ike_id_list:
-            session_generator = session.terminate(
-                {'ike-id': ikeid, 'timeout': '-1'})
-            # a dummy `for` loop is required because of requirements
-            # from vici. Without a full iteration on the output, the
-            # command to vici may not be executed completely
-            for _ in session_generator:
-                pass
+            vici_session().request('terminate',
+                                   {'ike-id': ikeid, 'timeout': '-1'})
+    except ViciInitiateError:
+        raise
     except Exception:
         raise ViciCommandError(
             f'Failed to terminate SA for IKE ids {ike_id_list}')
 
 
+def _terminate_dict(ike_name: str, child_name: str) -> dict:
+    vici_dict: dict = {}
+    if ike_name:
+        vici_dict['ike'] = ike_name
+    if child_name:
+        vici_dict['child'] = child_name
+    return vici_dict
+
+
 def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
     """
     Terminate IKE SAs by name if CHILD SA name is None.
@@ -118,24 +183,11 @@ def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
     :param child_name: CHILD SA name
     :type child_name: str
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
     try:
-        vici_dict: dict= {}
-        if ike_name:
-            vici_dict['ike'] = ike_name
-        if child_name:
-            vici_dict['child'] = child_name
-        session_generator = session.terminate(vici_dict)
-        # a dummy `for` loop is required because of requirements
-        # from vici. Without a full iteration on the output, the
-        # command to vici may not be executed completely
-        for _ in session_generator:
-            pass
+        vici_session().request('terminate',
+                               _terminate_dict(ike_name, child_name))
+    except ViciInitiateError:
+        raise
     except Exception:
         if child_name:
             raise ViciCommandError(
@@ -145,6 +197,17 @@ def terminate_vici_by_name(ike_name: str, child_name: str) -> None:
                 f'Failed to terminate SA for IKE {ike_name}')
 
 
+def _initiate_dict(ike_sa_name: str, child_sa_name: str, src_addr: str,
+                   dst_addr: str) -> dict:
+    return {
+        'ike': ike_sa_name,
+        'child': child_sa_name,
+        'timeout': '-1',
+        'my-host': src_addr,
+        'other-host': dst_addr
+    }
+
+
 def vici_initiate(ike_sa_name: str, child_sa_name: str, src_addr: str,
                   dst_addr: str) -> bool:
     """Initiate IKE SA connection with specific peer
@@ -158,26 +221,39 @@ def vici_initiate(ike_sa_name: str, child_sa_name: str, src_addr: str,
     Returns:
         bool: a result of initiation command
     """
-    from vici import Session as vici_session
-
-    try:
-        session = vici_session()
-    except Exception:
-        raise ViciInitiateError("IPsec not initialized")
-
     try:
-        session_generator = session.initiate({
-            'ike': ike_sa_name,
-            'child': child_sa_name,
-            'timeout': '-1',
-            'my-host': src_addr,
-            'other-host': dst_addr
-        })
-        # a dummy `for` loop is required because of requirements
-        # from vici. Without a full iteration on the output, the
-        # command to vici may not be executed completely
-        for _ in session_generator:
-            pass
+        vici_session().request('initiate',
+                               _initiate_dict(ike_sa_name, child_sa_name,
+                                              src_addr, dst_addr))
         return True
+    except ViciInitiateError:
+        raise
     except Exception:
-        raise ViciCommandError(f'Failed to initiate SA for IKE {ike_sa_name}')
\ No newline at end of file
+        raise ViciCommandError(f'Failed to initiate SA for IKE {ike_sa_name}')
+
+
+def vici_initiate_list(initiate_list: list) -> bool:
+    """Initiate IKE SA connections with a list of peers over the shared
+    session. All requests are sent even if some of them fail.
+
+    Args:
+        initiate_list (list): list of (IKE SA name, child SA name,
+                              source address, remote address) tuples
+
+    Returns:
+        bool: True if all connections were initiated
+    """
+    failed = []
+    for ike_sa_name, child_sa_name, src_addr, dst_addr in initiate_list:
+        try:
+            vici_session().request('initiate',
+                                   _initiate_dict(ike_sa_name, child_sa_name,
+                                                  src_addr, dst_addr))
+        except ViciInitiateError:
+            raise
+        except Exception:
+            failed.append(f'{ike_sa_name} ({dst_addr})')
+    if failed:
+        raise ViciCommandError(
+            f'Failed to initiate SA for IKE {", ".join(failed)}')
+    return True
@@ -56,6 +56,11 @@
 }
 
 kea_ctrl_socket = '/run/kea/dhcp{inet}-ctrl-socket'
+kea_ctrl_socket_bufsize = 65536
+kea_lease_page_limit = 5000
+
+# Kea control channel result codes
+kea_result_success = 0
 
 def kea_parse_options(config):
     options = []
@@ -295,6 +300,33 @@ def kea6_parse_subnet(subnet, config):
 
     return out
 
+def _read_json_reply(sock):
+    """
+    Read one JSON document from sock. Kea closes the connection once the
+    reply is sent, but a complete document is returned as soon as it has
+    been received. Braces are counted per chunk to avoid decoding partial
+    replies over and over.
+    """
+    chunks = []
+    depth = 0
+    while True:
+        data = sock.recv(kea_ctrl_socket_bufsize)
+        if not data:
+            break
+        chunks.append(data)
+        depth += data.count(b'{') - data.count(b'}')
+        if depth <= 0 and data.rstrip().endswith(b'}'):
+            try:
+                return json.loads(b''.join(chunks))
+            except ValueError:
+                # braces within strings, keep reading
+                continue
+
+    if not chunks:
+        return None
+
+    return json.loads(b''.join(chunks))
+
 def _ctrl_socket_command(inet, command, args=None):
     path = kea_ctrl_socket.format(inet=inet)
 
@@ -311,24 +343,40 @@ def _ctrl_socket_command(inet, command, args=None):
         if args:
             payload['arguments'] = args
 
-        sock.send(bytes(json.dumps(payload), 'utf-8'))
-        result = b''
-        while True:
-            data = sock.recv(4096)
-            result += data
-            if len(data) < 4096:
-                break
-
-        return json.loads(result.decode('utf-8'))
+        sock.sendall(bytes(json.dumps(payload), 'utf-8'))
+        return _read_json_reply(sock)
 
-def kea_get_leases(inet):
-    leases = _ctrl_socket_command(inet, f'lease{inet}-get-all')
+def kea_get_leases(inet, subnets=None):
+    args = {'subnets': subnets} if subnets else None
+    leases = _ctrl_socket_command(inet, f'lease{inet}-get-all', args)
 
     if not leases or 'result' not in leases or leases['result'] != 0:
         return []
 
     return leases['arguments']['leases']
 
+def kea_iter_leases(inet, limit=kea_lease_page_limit):
+    """
+    Iterate over all leases of the Kea server using lease{4,6}-get-page,
+    so no single control socket reply has to hold the whole lease database.
+    The iteration ends on the first empty page (result 3) or error.
+    """
+    start = 'start'
+    while True:
+        args = {'from': start, 'limit': limit}
+        page = _ctrl_socket_command(inet, f'lease{inet}-get-page', args)
+
+        if not page or page.get('result') != kea_result_success:
+            return
+
+        leases = page['arguments']['leases']
+        yield from leases
+
+        if len(leases) < limit:
+            return
+
+        start = leases[-1]['ip-address']
+
 def kea_delete_lease(inet, ip_address):
     args = {'ip-address': ip_address}
 
@@ -347,18 +395,23 @@ def kea_get_active_config(inet):
 
     return config
 
-def kea_get_pool_from_subnet_id(config, inet, subnet_id):
+def kea_get_subnet_pool_map(config, inet):
+    """
+    Map subnet IDs of the active Kea config to the shared-network (pool) name
+    they belong to, so leases can be resolved without rescanning the config
+    """
     shared_networks = dict_search_args(config, 'arguments', f'Dhcp{inet}', 'shared-networks')
 
+    pool_map = {}
     if not shared_networks:
-        return None
+        return pool_map
 
     for network in shared_networks:
         if f'subnet{inet}' not in network:
             continue
 
         for subnet in network[f'subnet{inet}']:
-            if 'id' in subnet and int(subnet['id']) == int(subnet_id):
-                return network['name']
+            if 'id' in subnet:
+                pool_map.setdefault(int(subnet['id']), network['name'])
 
-    return None
+    return pool_map
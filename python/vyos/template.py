@@ -591,6 +591,33 @@ def nft_rule(rule_conf, fw_hook, fw_name, rule_id, ip_name='ip'):
     from vyos.firewall import parse_rule
     return parse_rule(rule_conf, fw_hook, fw_name, rule_id, ip_name)
 
+@register_filter('nft_rules')
+def nft_rules(rules, fw_hook, fw_name, ip_name='ip', optimize=False):
+    """
+    Render all enabled rules of a chain as nft_rule, see vyos.firewall.RuleCache.
+    Adjacent rules are merged if optimize is set, see vyos.firewall.optimize_rules
+    """
+    from vyos.firewall import optimize_rules
+    from vyos.firewall import parse_optimized_rule
+    from vyos.firewall import parse_rule
+    from vyos.firewall import rule_cache
+    rules = {rule_id: rule_conf for rule_id, rule_conf in rules.items() if 'disable' not in rule_conf}
+    if optimize:
+        # rules are merged across the chain, so it is cached as a whole
+        def render(_, rules):
+            rules = optimize_rules(rules, fw_hook, fw_name, ip_name)
+            return '\n'.join(parse_optimized_rule(rule_conf, fw_hook, fw_name, rule_id, ip_name)
+                             for rule_id, rule_conf in rules.items())
+        return rule_cache.rules(('nft_optimized', fw_hook, fw_name, ip_name), {'chain': rules}, render)[0]
+    render = lambda rule_id, rule_conf: parse_rule(rule_conf, fw_hook, fw_name, rule_id, ip_name)
+    return '\n'.join(rule_cache.rules(('nft_rule', fw_hook, fw_name, ip_name), rules, render))
+
+@register_filter('nft_recent_sets')
+def nft_recent_sets(rules, fw_hook, fw_name):
+    """ Return names of the sets used by the enabled rules of a chain with 'recent' """
+    return [f'{fw_hook}_{fw_name}_{rule_id}' for rule_id, rule_conf in rules.items()
+            if 'recent' in rule_conf and 'disable' not in rule_conf]
+
 @register_filter('nft_default_rule')
 def nft_default_rule(fw_conf, fw_name, family):
     output = ['counter']
@@ -672,6 +699,15 @@ def nat_rule(rule_conf, rule_id, nat_type, ipv6=False):
     from vyos.nat import parse_nat_rule
     return parse_nat_rule(rule_conf, rule_id, nat_type, ipv6)
 
+@register_filter('nat_rules')
+def nat_rules(rules, nat_type, ipv6=False):
+    """ Render all enabled rules of a chain as nat_rule, see vyos.firewall.RuleCache """
+    from vyos.firewall import rule_cache
+    from vyos.nat import parse_nat_rule
+    rules = {rule_id: rule_conf for rule_id, rule_conf in rules.items() if 'disable' not in rule_conf}
+    render = lambda rule_id, rule_conf: parse_nat_rule(rule_conf, rule_id, nat_type, ipv6)
+    return '\n'.join(rule_cache.rules(('nat_rule', nat_type, ipv6), rules, render))
+
 @register_filter('nat_static_rule')
 def nat_static_rule(rule_conf, rule_id, nat_type):
     from vyos.nat import parse_nat_static_rule
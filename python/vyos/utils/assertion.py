@@ -35,14 +35,15 @@ def assert_positive(n, smaller=0):
     if int(n) < smaller:
         raise ValueError(f'{n} is smaller than {smaller}')
 
-def assert_mtu(mtu, ifname):
+def assert_mtu(mtu, ifname, parsed=None):
     assert_number(mtu)
 
-    import json
-    from vyos.utils.process import cmd
-    out = cmd(f'ip -j -d link show dev {ifname}')
-    # [{"ifindex":2,"ifname":"eth0","flags":["BROADCAST","MULTICAST","UP","LOWER_UP"],"mtu":1500,"qdisc":"pfifo_fast","operstate":"UP","linkmode":"DEFAULT","group":"default","txqlen":1000,"link_type":"ether","address":"08:00:27:d9:5b:04","broadcast":"ff:ff:ff:ff:ff:ff","promiscuity":0,"min_mtu":46,"max_mtu":16110,"inet6_addr_gen_mode":"none","num_tx_queues":1,"num_rx_queues":1,"gso_max_size":65536,"gso_max_segs":65535}]
-    parsed = json.loads(out)[0]
+    if parsed is None:
+        import json
+        from vyos.utils.process import cmd
+        out = cmd(f'ip -j -d link show dev {ifname}')
+        # [{"ifindex":2,"ifname":"eth0","flags":["BROADCAST","MULTICAST","UP","LOWER_UP"],"mtu":1500,"qdisc":"pfifo_fast","operstate":"UP","linkmode":"DEFAULT","group":"default","txqlen":1000,"link_type":"ether","address":"08:00:27:d9:5b:04","broadcast":"ff:ff:ff:ff:ff:ff","promiscuity":0,"min_mtu":46,"max_mtu":16110,"inet6_addr_gen_mode":"none","num_tx_queues":1,"num_rx_queues":1,"gso_max_size":65536,"gso_max_segs":65535}]
+        parsed = json.loads(out)[0]
     min_mtu = int(parsed.get('min_mtu', '0'))
     # cur_mtu = parsed.get('mtu',0),
     max_mtu = int(parsed.get('max_mtu', '0'))
@@ -13,18 +13,18 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 from typing import Optional, Union, TYPE_CHECKING
 from vyos.xml_ref import definition
 
 if TYPE_CHECKING:
     from vyos.config import ConfigDict
 
-def load_reference(cache=[]):
-    if cache:
-        return cache[0]
-
-    xml = definition.Xml()
+_here = os.path.dirname(__file__)
+ref_cache = os.path.join(_here, 'cache.py')
+ref_cache_bin = os.path.join(_here, 'cache.bin')
 
+def load_reference_dict() -> dict:
     try:
         from vyos.xml_ref.cache import reference
     except Exception:
@@ -33,11 +33,36 @@ def load_reference(cache=[]):
     if not reference:
         raise ValueError('empty xml reference cache !!')
 
-    xml.define(reference)
+    return reference
+
+def load_reference_index():
+    """Return binary index of the reference cache if present and current"""
+    from vyos.xml_ref.binary_cache import BinaryReference
+    try:
+        if os.stat(ref_cache_bin).st_mtime < os.stat(ref_cache).st_mtime:
+            return None
+        return BinaryReference(ref_cache_bin)
+    except (OSError, ValueError):
+        return None
+
+def load_reference(cache=[]):
+    if cache:
+        return cache[0]
+
+    index = load_reference_index()
+    if index is not None:
+        xml = definition.XmlIndex(index, load_reference_dict)
+    else:
+        xml = definition.Xml()
+        xml.define(load_reference_dict())
+
     cache.append(xml)
 
     return xml
 
+def cache_info() -> dict:
+    return load_reference().cache_info()
+
 def is_tag(path: list) -> bool:
     return load_reference().is_tag(path)
 
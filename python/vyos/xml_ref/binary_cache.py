@@ -0,0 +1,201 @@
+# Copyright 2024 VyOS maintainers and contributors <maintainers@vyos.io>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact binary index of the XML reference tree.
+
+The reference dict (as found in vyos.xml_ref.cache) is flattened into a
+node table with interned strings, so that node lookups can be served from
+an mmap of the file without importing and allocating the whole dict.
+
+Layout (little endian):
+
+    header:  magic, version, node count, string count,
+             offset of node table, offset of string offsets,
+             offset of string blob, string index of component version (JSON)
+    nodes:   name, default_value, owner, priority, first child, child count,
+             flags -- strings as indices into the string table, 0xffffffff
+             for None; the children of a node are stored contiguously and
+             sorted by name; node 0 is the root
+    strings: offsets (count + 1) followed by the UTF-8 blob
+
+This module is used by the cache generation scripts as well, so it must
+only depend on the standard library.
+"""
+
+import os
+import json
+import mmap
+import struct
+from typing import Optional
+
+MAGIC = b'VYXR'
+VERSION = 1
+
+HEADER = struct.Struct('<4sIIIIIII')
+NODE = struct.Struct('<IIIIIIB')
+OFFSET = struct.Struct('<I')
+
+NONE = 0xffffffff
+
+F_NODE_DATA = 0x01
+F_TAG = 0x02
+F_LEAF = 0x04
+F_MULTI = 0x08
+F_VALUELESS = 0x10
+
+_reserved = ('node_data', 'component_version')
+
+def _flags(node_data: Optional[dict]) -> int:
+    if node_data is None:
+        return 0
+    flags = F_NODE_DATA
+    node_type = node_data.get('node_type')
+    if node_type == 'tag':
+        flags |= F_TAG
+    elif node_type == 'leaf':
+        flags |= F_LEAF
+    if node_data.get('multi'):
+        flags |= F_MULTI
+    if node_data.get('valueless'):
+        flags |= F_VALUELESS
+    return flags
+
+def write_index(reference: dict, path: str):
+    """Flatten reference dict and write binary index to path"""
+    strings: dict = {}
+    def intern(s: Optional[str]) -> int:
+        if s is None:
+            return NONE
+        return strings.setdefault(s, len(strings))
+
+    # breadth first, so that children are contiguous
+    nodes = []
+    queue = [('', reference)]
+    next_child = 1
+    while queue:
+        level = []
+        for name, d in queue:
+            children = sorted((k for k in d if k not in _reserved),
+                              key=lambda k: k.encode())
+            node_data = d.get('node_data')
+            data = node_data or {}
+            nodes.append((intern(name),
+                          intern(data.get('default_value')),
+                          intern(data.get('owner')),
+                          intern(data.get('priority')),
+                          next_child if children else 0,
+                          len(children),
+                          _flags(node_data)))
+            next_child += len(children)
+            level.extend((k, d[k]) for k in children)
+        queue = level
+
+    version = json.dumps(reference.get('component_version', {}))
+    version_idx = intern(version)
+
+    blob = bytearray()
+    offsets = []
+    for s in strings:
+        offsets.append(len(blob))
+        blob += s.encode()
+    offsets.append(len(blob))
+
+    node_off = HEADER.size
+    str_off = node_off + NODE.size * len(nodes)
+    blob_off = str_off + OFFSET.size * len(offsets)
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(nodes), len(strings),
+                            node_off, str_off, blob_off, version_idx))
+        for n in nodes:
+            f.write(NODE.pack(*n))
+        for o in offsets:
+            f.write(OFFSET.pack(o))
+        f.write(blob)
+    os.replace(tmp, path)
+
+class BinaryReference:
+    """Read-only, lazily decoded view of a binary index file"""
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._node_count, self._str_count, self._node_off,
+         self._str_off, self._blob_off, self._version_idx) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a binary XML reference index')
+        self._strings: dict = {}
+
+    def _raw(self, idx: int) -> bytes:
+        start, end = struct.unpack_from('<II', self._mm,
+                                        self._str_off + OFFSET.size * idx)
+        return self._mm[self._blob_off + start:self._blob_off + end]
+
+    def string(self, idx: int) -> Optional[str]:
+        if idx == NONE:
+            return None
+        s = self._strings.get(idx)
+        if s is None:
+            s = self._raw(idx).decode()
+            self._strings[idx] = s
+        return s
+
+    def node(self, idx: int) -> tuple:
+        return NODE.unpack_from(self._mm, self._node_off + NODE.size * idx)
+
+    def child(self, idx: int, name: str) -> Optional[int]:
+        """Return node index of child 'name' of node idx, or None"""
+        _, _, _, _, first, count, _ = self.node(idx)
+        key = name.encode()
+        lo, hi = first, first + count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = self._raw(self.node(mid)[0])
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def flags(self, idx: int) -> int:
+        return self.node(idx)[6]
+
+    def node_data(self, idx: int, name: str):
+        (_, default, owner, priority, _, _, flags) = self.node(idx)
+        if not flags & F_NODE_DATA:
+            raise ValueError("non-existent node data")
+        if name == 'node_type':
+            if flags & F_TAG:
+                return 'tag'
+            if flags & F_LEAF:
+                return 'leaf'
+            return 'node'
+        if name == 'multi':
+            return bool(flags & F_MULTI)
+        if name == 'valueless':
+            return bool(flags & F_VALUELESS)
+        if name == 'default_value':
+            return self.string(default)
+        if name == 'owner':
+            return self.string(owner)
+        if name == 'priority':
+            return self.string(priority)
+        raise ValueError("non-existent data field")
+
+    def component_version(self) -> dict:
+        return json.loads(self.string(self._version_idx))
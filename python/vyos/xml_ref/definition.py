@@ -62,9 +62,19 @@ def from_source(d: dict, path: list) -> bool:
 class Xml:
     def __init__(self):
         self.ref = {}
+        self._paths = None
+        self._hits = 0
+        self._misses = 0
 
     def define(self, ref: dict):
         self.ref = ref
+        self._paths = None
+        self._hits = 0
+        self._misses = 0
+
+    def cache_info(self) -> dict:
+        """Hit/miss counters of the path resolution cache, for profiling"""
+        return {'hits': self._hits, 'misses': self._misses, 'currsize': self._misses}
 
     def _get_ref_node_data(self, node: dict, data: str) -> Union[bool, str]:
         res = node.get('node_data', {})
@@ -75,31 +85,45 @@ def _get_ref_node_data(self, node: dict, data: str) -> Union[bool, str]:
 
         return res.get(data)
 
-    def _get_ref_path(self, path: list) -> dict:
-        ref_path = path.copy()
-        d = self.ref
-        while ref_path and d:
-            d = d.get(ref_path[0], {})
-            ref_path.pop(0)
-            if self._is_tag_node(d) and ref_path:
-                ref_path.pop(0)
+    def _resolve(self, path: list) -> tuple:
+        # Returns (node, expect_value, is_value, children): the reference node
+        # of path, whether the next path element is a tag node value, and
+        # whether the last path element was one. Resolved paths are kept as
+        # a tree of the reference paths, all values of a tag node share the
+        # child keyed None, so the cache is bounded by the size of the
+        # reference, not by the number of tag node values in a config.
+        entry = self._paths
+        if entry is None:
+            entry = self._paths = (self.ref, False, False, {})
+        for key in path:
+            node, expect_value, _, children = entry
+            if expect_value:
+                key = None
+            child = children.get(key)
+            if child is None:
+                if expect_value:
+                    child = (node, False, True, {})
+                else:
+                    d = node.get(key, {})
+                    child = (d, self._is_tag_node(d), False, {})
+                children[key] = child
+                self._misses += 1
+            else:
+                self._hits += 1
+            entry = child
+        return entry
 
-        return d
+    def _get_ref_path(self, path: list) -> dict:
+        return self._resolve(path)[0]
 
     def _is_tag_node(self, node: dict) -> bool:
         res = self._get_ref_node_data(node, 'node_type')
         return res == 'tag'
 
     def is_tag(self, path: list) -> bool:
-        ref_path = path.copy()
-        d = self.ref
-        while ref_path and d:
-            d = d.get(ref_path[0], {})
-            ref_path.pop(0)
-            if self._is_tag_node(d) and ref_path:
-                if len(ref_path) == 1:
-                    return False
-                ref_path.pop(0)
+        d, _, is_value, _ = self._resolve(path)
+        if is_value:
+            return False
 
         return self._is_tag_node(d)
 
@@ -327,3 +351,92 @@ def relative_defaults(self, path: list, conf: dict, get_first_key=False,
                 res = {}
 
         return res
+
+class XmlIndex(Xml):
+    """
+    Xml reference backed by a binary index (see vyos.xml_ref.binary_cache).
+
+    Node queries are answered from the mmap'ed index; the reference dict is
+    only loaded (by calling 'loader') when a method needing the full tree,
+    such as multi_to_list or get_defaults, is first used.
+    """
+    def __init__(self, index, loader):
+        super().__init__()
+        self._index = index
+        self._loader = loader
+        self._ref = None
+
+    @property
+    def ref(self) -> dict:
+        if self._ref is None:
+            self._ref = self._loader()
+        return self._ref
+
+    @ref.setter
+    def ref(self, ref: dict):
+        self._ref = ref
+
+    def _get_index_path(self, path: list) -> Optional[int]:
+        ref_path = path.copy()
+        n = 0
+        while ref_path and n is not None:
+            n = self._index.child(n, ref_path.pop(0))
+            if n is not None and self._index.node_data(n, 'node_type') == 'tag' and ref_path:
+                ref_path.pop(0)
+        return n
+
+    def _index_data(self, n: Optional[int], data: str):
+        if n is None:
+            raise ValueError("non-existent node data")
+        return self._index.node_data(n, data)
+
+    def is_tag(self, path: list) -> bool:
+        ref_path = path.copy()
+        n = 0
+        while ref_path and n is not None:
+            n = self._index.child(n, ref_path.pop(0))
+            if n is not None and self._index.node_data(n, 'node_type') == 'tag' and ref_path:
+                if len(ref_path) == 1:
+                    return False
+                ref_path.pop(0)
+
+        return self._index_data(n, 'node_type') == 'tag'
+
+    def is_multi(self, path: list) -> bool:
+        return self._index_data(self._get_index_path(path), 'multi')
+
+    def is_valueless(self, path: list) -> bool:
+        return self._index_data(self._get_index_path(path), 'valueless')
+
+    def is_leaf(self, path: list) -> bool:
+        return self._index_data(self._get_index_path(path), 'node_type') == 'leaf'
+
+    def _least_upper_data(self, path: list, name: str) -> str:
+        ref_path = path.copy()
+        n = 0
+        data = ''
+        while ref_path and n is not None:
+            n = self._index.child(n, ref_path.pop(0))
+            node_type = self._index_data(n, 'node_type')
+            if node_type in ('tag', 'leaf') and ref_path:
+                ref_path.pop(0)
+            res = self._index_data(n, name)
+            if res is not None:
+                data = res
+
+        return data
+
+    def component_version(self) -> dict:
+        d = {}
+        for k, v in self._index.component_version().items():
+            d[k] = int(v)
+        return d
+
+    def default_value(self, path: list) -> Optional[Union[str, list]]:
+        n = self._get_index_path(path)
+        default = self._index_data(n, 'default_value')
+        if default is None:
+            return None
+        if self._index_data(n, 'multi') or self._index_data(n, 'node_type') == 'tag':
+            return default.split()
+        return default
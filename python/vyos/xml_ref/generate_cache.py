@@ -32,6 +32,7 @@
 xml_tmp = join('/tmp', xml_cache_json)
 pkg_cache = abspath(join(_here, 'pkg_cache'))
 ref_cache = abspath(join(_here, 'cache.py'))
+ref_cache_bin = abspath(join(_here, 'cache.bin'))
 
 node_data_fields = ("node_type", "multi", "valueless", "default_value",
                     "owner", "priority")
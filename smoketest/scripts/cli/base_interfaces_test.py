@@ -809,11 +809,10 @@ def test_interface_ip_options(self):
 
             for interface in self._interfaces:
                 if cli_defined(self._base_path + ['ip'], 'adjust-mss'):
-                    base_options = f'oifname "{interface}"'
-                    out = cmd('sudo nft list chain raw VYOS_TCP_MSS')
-                    for line in out.splitlines():
-                        if line.startswith(base_options):
-                            self.assertIn(f'tcp option maxseg size set {mss}', line)
+                    out = cmd('sudo nft list map raw VYOS_TCP_MSS_IFACES')
+                    self.assertIn(f'"{interface}" : jump VYOS_TCP_MSS_{mss}', out)
+                    out = cmd(f'sudo nft list chain raw VYOS_TCP_MSS_{mss}')
+                    self.assertIn(f'tcp option maxseg size set {mss}', out)
 
                 if cli_defined(self._base_path + ['ip'], 'arp-cache-timeout'):
                     tmp = read_file(f'/proc/sys/net/ipv4/neigh/{interface}/base_reachable_time_ms')
@@ -854,12 +853,8 @@ def test_interface_ip_options(self):
                     self.assertEqual('1', tmp)
 
                 if cli_defined(self._base_path + ['ip'], 'source-validation'):
-                    base_options = f'iifname "{interface}"'
-                    out = cmd('sudo nft list chain ip raw vyos_rpfilter')
-                    for line in out.splitlines():
-                        if line.startswith(base_options):
-                            self.assertIn('fib saddr oif 0', line)
-                            self.assertIn('drop', line)
+                    out = cmd('sudo nft list map ip raw vyos_rpfilter_ifaces')
+                    self.assertIn(f'"{interface}" : goto vyos_rpfilter_loose', out)
 
         def test_interface_ipv6_options(self):
             if not self._test_ipv6:
@@ -896,11 +891,10 @@ def test_interface_ipv6_options(self):
             for interface in self._interfaces:
                 proc_base = f'/proc/sys/net/ipv6/conf/{interface}'
                 if cli_defined(self._base_path + ['ipv6'], 'adjust-mss'):
-                    base_options = f'oifname "{interface}"'
-                    out = cmd('sudo nft list chain ip6 raw VYOS_TCP_MSS')
-                    for line in out.splitlines():
-                        if line.startswith(base_options):
-                            self.assertIn(f'tcp option maxseg size set {mss}', line)
+                    out = cmd('sudo nft list map ip6 raw VYOS_TCP_MSS_IFACES')
+                    self.assertIn(f'"{interface}" : jump VYOS_TCP_MSS_{mss}', out)
+                    out = cmd(f'sudo nft list chain ip6 raw VYOS_TCP_MSS_{mss}')
+                    self.assertIn(f'tcp option maxseg size set {mss}', out)
 
                 if cli_defined(self._base_path + ['ipv6'], 'accept-dad'):
                     tmp = read_file(f'{proc_base}/accept_dad')
@@ -915,12 +909,8 @@ def test_interface_ipv6_options(self):
                     self.assertEqual('0', tmp)
 
                 if cli_defined(self._base_path + ['ipv6'], 'source-validation'):
-                    base_options = f'iifname "{interface}"'
-                    out = cmd('sudo nft list chain ip6 raw vyos_rpfilter')
-                    for line in out.splitlines():
-                        if line.startswith(base_options):
-                            self.assertIn('fib saddr . iif oif 0', line)
-                            self.assertIn('drop', line)
+                    out = cmd('sudo nft list map ip6 raw vyos_rpfilter_ifaces')
+                    self.assertIn(f'"{interface}" : goto vyos_rpfilter_{source_validation}', out)
 
         def test_dhcpv6_client_options(self):
             if not self._test_ipv6_dhcpc6:
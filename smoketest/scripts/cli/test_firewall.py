@@ -402,6 +402,29 @@ def test_ipv4_mask(self):
 
         self.verify_nftables(nftables_search, 'ip vyos_filter')
 
+    def test_ipv4_optimize(self):
+        name = 'smoketest-optimize'
+
+        self.cli_set(['firewall', 'global-options', 'ruleset-optimize'])
+        self.cli_set(['firewall', 'ipv4', 'name', name, 'default-action', 'drop'])
+
+        for rule, address, action in [('10', '192.0.2.1', 'accept'), ('20', '192.0.2.2', 'accept'),
+                                      ('30', '192.0.2.3', 'drop')]:
+            self.cli_set(['firewall', 'ipv4', 'name', name, 'rule', rule, 'action', action])
+            self.cli_set(['firewall', 'ipv4', 'name', name, 'rule', rule, 'protocol', 'tcp'])
+            self.cli_set(['firewall', 'ipv4', 'name', name, 'rule', rule, 'source', 'address', address])
+            self.cli_set(['firewall', 'ipv4', 'name', name, 'rule', rule, 'destination', 'port', '22'])
+
+        self.cli_commit()
+
+        nftables_search = [
+            ['tcp dport 22', 'ip saddr { 192.0.2.1, 192.0.2.2, 192.0.2.3 }',
+             'ip saddr vmap { 192.0.2.1 : accept, 192.0.2.2 : accept, 192.0.2.3 : drop }',
+             f'comment "ipv4-NAM-{name}-10,20,30"']
+        ]
+
+        self.verify_nftables(nftables_search, 'ip vyos_filter')
+
     def test_ipv4_dynamic_groups(self):
         group01 = 'knock01'
         group02 = 'allowed'
@@ -28,9 +28,13 @@
 from vyos.ethtool import Ethtool
 from vyos.firewall import fqdn_config_parse
 from vyos.firewall import geoip_update
+from vyos.firewall import nft_ruleset_delta
+from vyos.firewall import rule_cache
 from vyos.template import render
 from vyos.utils.dict import dict_search_args
 from vyos.utils.dict import dict_search_recursive
+from vyos.utils.file import read_file
+from vyos.utils.file import write_file
 from vyos.utils.process import call
 from vyos.utils.process import cmd
 from vyos.utils.process import rc_cmd
@@ -40,6 +44,9 @@
 airbag.enable()
 
 nftables_conf = '/run/nftables.conf'
+# last ruleset loaded successfully, and changes to it
+nftables_applied_conf = '/run/nftables-applied.conf'
+nftables_delta_conf = '/run/nftables-delta.conf'
 sysctl_file = r'/run/sysctl/10-vyos-firewall.conf'
 
 valid_groups = [
@@ -454,13 +461,33 @@ def generate(firewall):
                     local_zone_conf['from_local'][zone] = zone_conf['from'][local_zone]
 
     render(nftables_conf, 'firewall/nftables.j2', firewall)
+    rule_cache.save()
     render(sysctl_file, 'firewall/sysctl-firewall.conf.j2', firewall)
     return None
 
+def apply_ruleset(firewall):
+    # Only load changes to the previous ruleset, if possible
+    delta = None
+    if os.path.exists(nftables_applied_conf) and 'first_install' not in firewall:
+        delta = nft_ruleset_delta(read_file(nftables_applied_conf), read_file(nftables_conf))
+
+    install_result = 1
+    if delta == '':
+        install_result = 0
+    elif delta is not None:
+        write_file(nftables_delta_conf, delta)
+        install_result, output = rc_cmd(f'nft --file {nftables_delta_conf}')
+
+    # Fall back to reloading the complete ruleset
+    if install_result != 0:
+        install_result, output = rc_cmd(f'nft --file {nftables_conf}')
+        if install_result == 1:
+            raise ConfigError(f'Failed to apply firewall: {output}')
+
+    write_file(nftables_applied_conf, read_file(nftables_conf))
+
 def apply(firewall):
-    install_result, output = rc_cmd(f'nft --file {nftables_conf}')
-    if install_result == 1:
-        raise ConfigError(f'Failed to apply firewall: {output}')
+    apply_ruleset(firewall)
 
     # Apply firewall global-options sysctl settings
     cmd(f'sysctl -f {sysctl_file}')
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from re import escape
 from sys import exit
 
 from vyos.config import Config
@@ -285,7 +286,7 @@ def apply(bond):
 
     # The route-map used for the FIB (zebra) is part of the zebra daemon
     frr_cfg.load_configuration(zebra_daemon)
-    frr_cfg.modify_section(f'^interface {ifname}', stop_pattern='^exit', remove_stop_mark=True)
+    frr_cfg.modify_section(f'^interface {escape(ifname)}', stop_pattern='^exit', remove_stop_mark=True)
     if 'frr_zebra_config' in bond:
         frr_cfg.add_before(frr.default_add_before, bond['frr_zebra_config'])
     frr_cfg.commit_configuration(zebra_daemon)
@@ -16,6 +16,7 @@
 
 import os
 
+from re import escape
 from sys import exit
 
 from vyos.base import Warning
@@ -419,7 +420,7 @@ def apply(ethernet):
 
     # The route-map used for the FIB (zebra) is part of the zebra daemon
     frr_cfg.load_configuration(zebra_daemon)
-    frr_cfg.modify_section(f'^interface {ifname}', stop_pattern='^exit', remove_stop_mark=True)
+    frr_cfg.modify_section(f'^interface {escape(ifname)}', stop_pattern='^exit', remove_stop_mark=True)
     if 'frr_zebra_config' in ethernet:
         frr_cfg.add_before(frr.default_add_before, ethernet['frr_zebra_config'])
     frr_cfg.commit_configuration(zebra_daemon)
@@ -21,6 +21,7 @@
 from vyos.base import Warning
 from vyos.config import Config
 from vyos.configdep import set_dependents, call_dependents
+from vyos.firewall import rule_cache
 from vyos.template import render
 from vyos.template import is_ip_network
 from vyos.utils.kernel import check_kmod
@@ -227,6 +228,7 @@ def generate(nat):
 
     render(nftables_nat_config, 'firewall/nftables-nat.j2', nat)
     render(nftables_static_nat_conf, 'firewall/nftables-static-nat.j2', nat)
+    rule_cache.save()
 
     # dry-run newly generated configuration
     tmp = run(f'nft --check --file {nftables_nat_config}')
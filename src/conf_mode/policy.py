@@ -295,7 +295,7 @@ def apply(policy):
                            remove_stop_mark=True)
     if 'new_frr_config' in policy:
         frr_cfg.add_before(frr.default_add_before, policy['new_frr_config'])
-    frr_cfg.commit_configuration(bgp_daemon)
+    frr_cfg.commit_configuration(bgp_daemon, incremental=True)
 
     # The route-map used for the FIB (zebra) is part of the zebra daemon
     frr_cfg.load_configuration(zebra_daemon)
@@ -307,7 +307,7 @@ def apply(policy):
                            remove_stop_mark=True)
     if 'new_frr_config' in policy:
         frr_cfg.add_before(frr.default_add_before, policy['new_frr_config'])
-    frr_cfg.commit_configuration(zebra_daemon)
+    frr_cfg.commit_configuration(zebra_daemon, incremental=True)
 
     return None
 
@@ -21,6 +21,7 @@
 
 from vyos.base import Warning
 from vyos.config import Config
+from vyos.firewall import rule_cache
 from vyos.template import render
 from vyos.utils.dict import dict_search_args
 from vyos.utils.process import cmd
@@ -142,6 +143,7 @@ def generate(policy):
         policy['first_install'] = True
 
     render(nftables_conf, 'firewall/nftables-policy.j2', policy)
+    rule_cache.save()
     return None
 
 def apply_table_marks(policy):
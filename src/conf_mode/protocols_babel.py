@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from re import escape
 from sys import exit
 
 from vyos.config import Config
@@ -140,7 +141,7 @@ def apply(babel):
         if key not in babel:
             continue
         for interface in babel[key]:
-            frr_cfg.modify_section(f'^interface {interface}', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.modify_section(f'^interface {escape(interface)}', stop_pattern='^exit', remove_stop_mark=True)
 
     if 'new_frr_config' in babel:
         frr_cfg.add_before(frr.default_add_before, babel['new_frr_config'])
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from re import escape
 from sys import exit
 from sys import argv
 
@@ -635,7 +636,7 @@ def apply(bgp):
         if key not in bgp:
             continue
         for interface in bgp[key]:
-            frr_cfg.modify_section(f'^interface {interface}', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.modify_section(f'^interface {escape(interface)}', stop_pattern='^exit', remove_stop_mark=True)
 
     frr_cfg.modify_section(f'^router bgp \d+{vrf}', stop_pattern='^exit', remove_stop_mark=True)
     if 'frr_bgpd_config' in bgp:
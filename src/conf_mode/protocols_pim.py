@@ -19,6 +19,7 @@
 from ipaddress import IPv4Address
 from ipaddress import IPv4Network
 from signal import SIGTERM
+from re import escape
 from sys import exit
 
 from vyos.config import Config
@@ -154,7 +155,7 @@ def apply(pim):
         if key not in pim:
             continue
         for interface in pim[key]:
-            frr_cfg.modify_section(f'^interface {interface}', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.modify_section(f'^interface {escape(interface)}', stop_pattern='^exit', remove_stop_mark=True)
 
     if 'frr_pimd_config' in pim:
         frr_cfg.add_before(frr.default_add_before, pim['frr_pimd_config'])
@@ -16,6 +16,7 @@
 
 from ipaddress import IPv6Address
 from ipaddress import IPv6Network
+from re import escape
 from sys import exit
 
 from vyos.config import Config
@@ -115,7 +116,7 @@ def apply(pim6):
         if key not in pim6:
             continue
         for interface in pim6[key]:
-            frr_cfg.modify_section(f'^interface {interface}', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.modify_section(f'^interface {escape(interface)}', stop_pattern='^exit', remove_stop_mark=True)
 
     if 'new_frr_config' in pim6:
         frr_cfg.add_before(frr.default_add_before, pim6['new_frr_config'])
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from re import escape
 from sys import exit
 
 from vyos.config import Config
@@ -120,7 +121,7 @@ def apply(rip):
         if key not in rip:
             continue
         for interface in rip[key]:
-            frr_cfg.modify_section(f'^interface {interface}', stop_pattern='^exit', remove_stop_mark=True)
+            frr_cfg.modify_section(f'^interface {escape(interface)}', stop_pattern='^exit', remove_stop_mark=True)
 
     if 'new_frr_config' in rip:
         frr_cfg.add_before(frr.default_add_before, rip['new_frr_config'])
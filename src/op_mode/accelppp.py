@@ -21,7 +21,6 @@
 import vyos.opmode
 
 from vyos.configquery import ConfigTreeQuery
-from vyos.utils.process import rc_cmd
 
 
 accel_dict = {
@@ -75,13 +74,13 @@ def _get_raw_statistics(accel_output, pattern, protocol):
 
 
 def _get_raw_sessions(port):
-    cmd_options = 'show sessions ifname,username,ip,ip6,ip6-dp,type,rate-limit,' \
-                  'state,uptime-raw,calling-sid,called-sid,sid,comp,rx-bytes-raw,' \
-                  'tx-bytes-raw,rx-pkts,tx-pkts'
-    output = vyos.accel_ppp.accel_cmd(port, cmd_options)
-    parsed_data: list[dict[str, str]] = vyos.accel_ppp.accel_out_parse(
-        output.splitlines())
-    return parsed_data
+    columns = ['ifname', 'username', 'ip', 'ip6', 'ip6-dp', 'type', 'rate-limit',
+               'state', 'uptime-raw', 'calling-sid', 'called-sid', 'sid', 'comp',
+               'rx-bytes-raw', 'tx-bytes-raw', 'rx-pkts', 'tx-pkts']
+    try:
+        return list(vyos.accel_ppp.accel_sessions(port, columns))
+    except OSError as e:
+        raise vyos.opmode.DataUnavailable(f'Cannot fetch sessions from accel-ppp: {e}')
 
 
 def _verify(func):
@@ -122,7 +121,7 @@ def show_statistics(raw: bool, protocol: str):
     """
     pattern = f'{protocol}:'
     port = accel_dict[protocol]['port']
-    rc, output = rc_cmd(f'/usr/bin/accel-cmd -p {port} show stat')
+    output = vyos.accel_ppp.accel_cmd(port, 'show stat')
 
     if raw:
         return _get_raw_statistics(output, pattern, protocol)
@@ -81,32 +81,27 @@
 ArgFamilyModifier = typing.Literal['unicast', 'labeled_unicast', 'multicast', 'vpn', 'flowspec']
 
 def show_summary(raw: bool):
-    from vyos.utils.process import cmd
+    from vyos.frr import execute
+    from vyos.frr import execute_json
 
     if raw:
-        from json import loads
-
-        output = cmd(f"vtysh -c 'show bgp summary json'").strip()
-
         # FRR 8.5 correctly returns an empty object when BGP is not running,
         # we don't need to do anything special here
-        return loads(output)
+        return execute_json('show bgp summary', daemon='bgpd')
     else:
-        output = cmd(f"vtysh -c 'show bgp summary'")
+        output = execute('show bgp summary', daemon='bgpd')
         return output
 
 def show_neighbors(raw: bool):
-    from vyos.utils.process import cmd
+    from vyos.frr import execute
+    from vyos.frr import execute_json
     from vyos.utils.dict import dict_to_list
 
     if raw:
-        from json import loads
-
-        output = cmd(f"vtysh -c 'show bgp neighbors json'").strip()
-        d = loads(output)
+        d = execute_json('show bgp neighbors', daemon='bgpd')
         return dict_to_list(d, save_key_to="neighbor")
     else:
-        output = cmd(f"vtysh -c 'show bgp neighbors'")
+        output = execute('show bgp neighbors', daemon='bgpd')
         return output
 
 def show(raw: bool,
@@ -129,8 +124,8 @@ def show(raw: bool,
         frr_command = frr_command_template.render(kwargs)
         frr_command = re.sub(r'\s+', ' ', frr_command)
 
-        from vyos.utils.process import cmd
-        output = cmd(f"vtysh -c '{frr_command}'")
+        from vyos.frr import execute
+        output = execute(frr_command.strip(), daemon='bgpd')
 
         if raw:
             from json import loads
@@ -45,7 +45,7 @@ def show_commit_file(raw: bool, rev: int):
 
     return config_file
 
-def show_commit_log(raw: bool):
+def show_commit_log(raw: bool, path: typing.Optional[str]):
     config_mgmt = ConfigMgmt()
 
     msg = ''
@@ -53,7 +53,9 @@ def show_commit_log(raw: bool):
         msg = ('commit-revisions is not configured;\n'
                'commit log is empty or stale:\n\n')
 
-    data = config_mgmt.get_raw_log_data()
+    if path is not None:
+        path = path.split()
+    data = config_mgmt.get_raw_log_data(path=path)
     if raw:
         return data
 
@@ -18,6 +18,7 @@
 import sys
 import typing
 
+from collections import Counter
 from datetime import datetime
 from glob import glob
 from ipaddress import ip_address
@@ -30,7 +31,8 @@
 
 from vyos.kea import kea_get_active_config
 from vyos.kea import kea_get_leases
-from vyos.kea import kea_get_pool_from_subnet_id
+from vyos.kea import kea_iter_leases
+from vyos.kea import kea_get_subnet_pool_map
 from vyos.kea import kea_delete_lease
 from vyos.utils.process import is_systemd_service_running
 from vyos.utils.process import call
@@ -62,16 +64,76 @@ def _format_hex_string(in_str):
     return out_str
 
 
-def _find_list_of_dict_index(lst, key='ip', value='') -> int:
+lease_state_long = {0: 'active', 1: 'rejected', 2: 'expired'}
+
+
+def _get_lease_data(lease, family, pool_map, now):
+    """
+    Convert a single Kea lease into the op-mode lease representation
+    :return dict
+    """
+    lifetime = lease['valid-lft']
+    expiry = (lease['cltt'] + lifetime)
+
+    start_timestamp = datetime.utcfromtimestamp(expiry - lifetime)
+    expire_timestamp = datetime.utcfromtimestamp(expiry) if expiry else None
+
+    data_lease = {}
+    data_lease['ip'] = lease['ip-address']
+    data_lease['state'] = lease_state_long[lease['state']]
+    data_lease['pool'] = pool_map.get(lease['subnet-id'], '-')
+    data_lease['end'] = expire_timestamp.timestamp() if expire_timestamp else None
+    data_lease['origin'] = 'local' # TODO: Determine remote in HA
+
+    if family == 'inet':
+        data_lease['mac'] = lease['hw-address']
+        data_lease['start'] = start_timestamp.timestamp()
+        data_lease['hostname'] = lease['hostname']
+
+    if family == 'inet6':
+        data_lease['last_communication'] = start_timestamp.timestamp()
+        data_lease['duid'] = _format_hex_string(lease['duid'])
+        data_lease['type'] = lease['type']
+
+        if lease['type'] == 'IA_PD':
+            prefix_len = lease['prefix-len']
+            data_lease['ip'] += f'/{prefix_len}'
+
+    data_lease['remaining'] = '-'
+
+    if lifetime > 0:
+        data_lease['remaining'] = expire_timestamp - now
+
+        if data_lease['remaining'].days >= 0:
+            # substraction gives us a timedelta object which can't be formatted with strftime
+            # so we use str(), split gets rid of the microseconds
+            data_lease['remaining'] = str(data_lease["remaining"]).split('.')[0]
+
+    return data_lease
+
+
+def _filter_leases(leases, family='inet', pool_map=None, pool=None, state=None):
     """
-    Find the index entry of list of dict matching the dict value
-    Exampe:
-        % lst = [{'ip': '192.0.2.1'}, {'ip': '192.0.2.2'}]
-        % _find_list_of_dict_index(lst, key='ip', value='192.0.2.2')
-        % 1
+    Convert and filter Kea leases in a single pass, leases are yielded as
+    they are processed
     """
-    idx = next((index for (index, d) in enumerate(lst) if d[key] == value), None)
-    return idx
+    pool_map = pool_map or {}
+    pool = pool or []
+    now = datetime.utcnow()
+    for lease in leases:
+        # filter on the raw lease first to skip the conversion of leases
+        # which are not shown anyway
+        lease_state = lease_state_long[lease['state']]
+        if state and state != 'all' and lease_state not in state:
+            continue
+        if pool_map.get(lease['subnet-id']) not in pool:
+            continue
+
+        data_lease = _get_lease_data(lease, family, pool_map, now)
+
+        # Do not add old leases
+        if data_lease['remaining'] != '' and data_lease['pool'] in pool and data_lease['state'] != 'free':
+            yield data_lease
 
 
 def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], origin=None) -> list:
@@ -80,10 +142,6 @@ def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], orig
     :return list
     """
     inet_suffix = '6' if family == 'inet6' else '4'
-    try:
-        leases = kea_get_leases(inet_suffix)
-    except:
-        raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server lease information')
 
     if pool is None:
         pool = _get_dhcp_pools(family=family)
@@ -95,60 +153,34 @@ def _get_raw_server_leases(family='inet', pool=None, sorted=None, state=[], orig
     except:
         raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server configuration')
 
-    data = []
-    for lease in leases:
-        lifetime = lease['valid-lft']
-        expiry = (lease['cltt'] + lifetime)
-
-        lease['start_timestamp'] = datetime.utcfromtimestamp(expiry - lifetime)
-        lease['expire_timestamp'] = datetime.utcfromtimestamp(expiry) if expiry else None
-
-        data_lease = {}
-        data_lease['ip'] = lease['ip-address']
-        lease_state_long = {0: 'active', 1: 'rejected', 2: 'expired'}
-        data_lease['state'] = lease_state_long[lease['state']]
-        data_lease['pool'] = kea_get_pool_from_subnet_id(active_config, inet_suffix, lease['subnet-id']) if active_config else '-'
-        data_lease['end'] = lease['expire_timestamp'].timestamp() if lease['expire_timestamp'] else None
-        data_lease['origin'] = 'local' # TODO: Determine remote in HA
+    # Leases can not be assigned to a pool without the active config
+    if not active_config:
+        return []
 
-        if family == 'inet':
-            data_lease['mac'] = lease['hw-address']
-            data_lease['start'] = lease['start_timestamp'].timestamp()
-            data_lease['hostname'] = lease['hostname']
+    # Resolve subnet IDs once and let Kea only return leases of the
+    # requested pools
+    pool_map = kea_get_subnet_pool_map(active_config, inet_suffix)
+    subnets = [subnet_id for subnet_id, name in pool_map.items() if name in pool]
+    if not subnets:
+        return []
 
-        if family == 'inet6':
-            data_lease['last_communication'] = lease['start_timestamp'].timestamp()
-            data_lease['duid'] = _format_hex_string(lease['duid'])
-            data_lease['type'] = lease['type']
-
-            if lease['type'] == 'IA_PD':
-                prefix_len = lease['prefix-len']
-                data_lease['ip'] += f'/{prefix_len}'
-
-        data_lease['remaining'] = '-'
-
-        if lease['valid-lft'] > 0:
-            data_lease['remaining'] = lease['expire_timestamp'] - datetime.utcnow()
-
-            if data_lease['remaining'].days >= 0:
-                # substraction gives us a timedelta object which can't be formatted with strftime
-                # so we use str(), split gets rid of the microseconds
-                data_lease['remaining'] = str(data_lease["remaining"]).split('.')[0]
+    # deduplicate, the most recent lease for an address wins
+    data = {}
+    try:
+        # All pools are requested: page through the lease database instead
+        # of fetching it in one reply
+        if len(subnets) == len(pool_map):
+            leases = kea_iter_leases(inet_suffix)
+        else:
+            leases = kea_get_leases(inet_suffix, subnets=subnets)
 
-        # Do not add old leases
-        if data_lease['remaining'] != '' and data_lease['pool'] in pool and data_lease['state'] != 'free':
-            if not state or state == 'all' or data_lease['state'] in state:
-                data.append(data_lease)
-
-        # deduplicate
-        checked = []
-        for entry in data:
-            addr = entry.get('ip')
-            if addr not in checked:
-                checked.append(addr)
-            else:
-                idx = _find_list_of_dict_index(data, key='ip', value=addr)
-                data.pop(idx)
+        for data_lease in _filter_leases(leases, family=family, pool_map=pool_map,
+                                         pool=pool, state=state):
+            data.pop(data_lease['ip'], None)
+            data[data_lease['ip']] = data_lease
+    except (OSError, ValueError):
+        raise vyos.opmode.DataUnavailable('Cannot fetch DHCP server lease information')
+    data = list(data.values())
 
     if sorted:
         if sorted == 'ip':
@@ -205,37 +237,43 @@ def _get_dhcp_pools(family='inet') -> list:
     return pools
 
 
-def _get_pool_size(pool, family='inet'):
-    v = 'v6' if family == 'inet6' else ''
-    base = f'service dhcp{v}-server shared-network-name {pool}'
+def _get_pool_size(pool_config):
+    """
+    Number of addresses in all ranges of a shared-network config dict
+    """
     size = 0
-    subnets = config.list_nodes(f'{base} subnet')
-    for subnet in subnets:
-        ranges = config.list_nodes(f'{base} subnet {subnet} range')
-        for range in ranges:
-            if family == 'inet6':
-                start = config.value(f'{base} subnet {subnet} range {range} start')
-                stop = config.value(f'{base} subnet {subnet} range {range} stop')
-            else:
-                start = config.value(f'{base} subnet {subnet} range {range} start')
-                stop = config.value(f'{base} subnet {subnet} range {range} stop')
+    for subnet_config in pool_config.get('subnet', {}).values():
+        for range_config in subnet_config.get('range', {}).values():
+            start = range_config.get('start')
+            stop = range_config.get('stop')
+            if not start or not stop:
+                continue
             # Add +1 because both range boundaries are inclusive
             size += int(ip_address(stop)) - int(ip_address(start)) + 1
     return size
 
 
 def _get_raw_pool_statistics(family='inet', pool=None):
+    v = 'v6' if family == 'inet6' else ''
+    pools_config = config.get_config_dict(['service', f'dhcp{v}-server', 'shared-network-name'],
+                                          get_first_key=True, no_tag_node_value_mangle=True)
+
+    # one lease snapshot for all requested pools, counted per pool in a
+    # single pass
+    lease_data = _get_raw_server_leases(family=family, pool=pool)
+    lease_count = Counter(lease['pool'] for lease in lease_data)
+
     if pool is None:
-        pool = _get_dhcp_pools(family=family)
+        pool = list(pools_config)
     else:
         pool = [pool]
 
-    v = 'v6' if family == 'inet6' else ''
     stats = []
     for p in pool:
-        subnet = config.list_nodes(f'service dhcp{v}-server shared-network-name {p} subnet')
-        size = _get_pool_size(family=family, pool=p)
-        leases = len(_get_raw_server_leases(family=family, pool=p))
+        pool_config = pools_config.get(p, {})
+        subnet = list(pool_config.get('subnet', {}))
+        size = _get_pool_size(pool_config)
+        leases = lease_count[p]
         use_percentage = round(leases / size * 100) if size != 0 else 0
         pool_stats = {'pool': p, 'size': size, 'leases': leases,
                       'available': (size - leases), 'use_percentage': use_percentage, 'subnet': subnet}
@@ -48,6 +48,122 @@ def get_config_node(conf, node=None, family=None, hook=None, priority=None):
 
     return node_config
 
+# nftables expressions shown without their 'meta' keyword
+_nft_meta_bare = ['iif', 'iifname', 'oif', 'oifname']
+# statements shown in other columns than the rule conditions
+_nft_hidden = ['counter', 'log', 'accept', 'drop', 'reject', 'return', 'continue', 'queue']
+
+def _nft_verdict(verdict):
+    kind, value = next(iter(verdict.items()))
+    return f"{kind} {value['target']}" if value else kind
+
+def _nft_expr(expr):
+    """ Return expression of 'nft -j' output in nft syntax """
+    if isinstance(expr, list):
+        # flags, e.g. ct state
+        return ','.join(map(_nft_expr, expr))
+    if not isinstance(expr, dict):
+        return str(expr)
+    kind, value = next(iter(expr.items()))
+    if kind == 'payload':
+        return f"{value['protocol']} {value['field']}"
+    if kind == 'meta' and value['key'] in _nft_meta_bare:
+        return value['key']
+    if kind in ['meta', 'ct', 'rt', 'socket']:
+        return f"{kind} {value['key']}"
+    if kind == 'set':
+        return f"{{ {', '.join(map(_nft_expr, value if isinstance(value, list) else [value]))} }}"
+    if kind == 'prefix':
+        return f"{_nft_expr(value['addr'])}/{value['len']}"
+    if kind == 'range':
+        return '-'.join(map(_nft_expr, value))
+    if kind == 'concat':
+        return ' . '.join(map(_nft_expr, value))
+    if kind == 'elem':
+        return _nft_expr(value['val'])
+    if kind in ['&', '|', '^']:
+        return f' {kind} '.join(map(_nft_expr, value))
+    if kind == 'fib':
+        return f"fib {' . '.join(value['flags'])} {value['result']}"
+    return json.dumps(expr)
+
+def _nft_statement(statement):
+    """ Return statement of 'nft -j' output in nft syntax """
+    kind, value = next(iter(statement.items()))
+    if kind == 'match':
+        operator = '' if value['op'] in ['==', 'in'] else f"{value['op']} "
+        return f"{_nft_expr(value['left'])} {operator}{_nft_expr(value['right'])}"
+    if kind in ['jump', 'goto']:
+        return _nft_verdict(statement)
+    if kind == 'vmap':
+        data = value['data']
+        if isinstance(data, dict) and 'set' in data:
+            data = ', '.join(f'{_nft_expr(key)} : {_nft_verdict(verdict)}' for key, verdict in data['set'])
+            data = f'{{ {data} }}'
+        return f"{_nft_expr(value['key'])} vmap {_nft_expr(data)}"
+    if kind == 'limit':
+        over = 'over ' if value.get('inv') else ''
+        burst = f" burst {value['burst']} {value.get('burst_unit', 'packets')}" if value.get('burst') else ''
+        return f"limit rate {over}{value['rate']}/{value['per']}{burst}"
+    if kind == 'mangle':
+        return f"{_nft_expr(value['key'])} set {_nft_expr(value['value'])}"
+    if kind == 'set':
+        return f"{value['op']} {value['set']} {{ {_nft_expr(value['elem'])} }}"
+    return f'{kind} {json.dumps(value)}' if value else kind
+
+class RulesetSnapshot:
+    """
+    nftables ruleset of the system, retrieved by a single 'nft -j list
+    ruleset' on first use, instead of one nft call per chain and set.
+    Rules are indexed by table and chain.
+    """
+    def __init__(self):
+        self._chains = None
+        self._sets = None
+
+    def _load(self):
+        self._chains = {}
+        self._sets = {}
+        try:
+            objects = json.loads(cmd('nft -j list ruleset'))['nftables']
+        except:
+            objects = []
+        for obj in objects:
+            if 'rule' in obj:
+                rule = obj['rule']
+                self._chains.setdefault((rule['family'], rule['table'], rule['chain']), []).append(rule)
+            elif 'set' in obj:
+                nft_set = obj['set']
+                self._sets[(nft_set['family'], nft_set['table'], nft_set['name'])] = nft_set
+
+    def rules(self, family, table, chain) -> list:
+        """ Return rules of chain as in 'nft -j' output """
+        if self._chains is None:
+            self._load()
+        return self._chains.get((family, table, chain), [])
+
+    def set_elements(self, family, table, name) -> list:
+        """ Return elements of set as in 'nft -j' output """
+        if self._sets is None:
+            self._load()
+        return self._sets.get((family, table, name), {}).get('elem', [])
+
+# one snapshot per invocation
+ruleset = RulesetSnapshot()
+
+def get_nftables_rule_details(rule):
+    """ Return counters and conditions of rule as in 'nft -j' output """
+    out = {}
+    conditions = []
+    for statement in rule.get('expr', []):
+        if 'counter' in statement and isinstance(statement['counter'], dict):
+            out['packets'] = statement['counter']['packets']
+            out['bytes'] = statement['counter']['bytes']
+        elif not any(kind in statement for kind in _nft_hidden):
+            conditions.append(_nft_statement(statement))
+    out['conditions'] = ' '.join(conditions)
+    return out
+
 def get_nftables_details(family, hook, priority):
     if family == 'ipv6':
         suffix = 'ip6'
@@ -63,31 +179,21 @@ def get_nftables_details(family, hook, priority):
         aux=''
 
     if hook == 'name' or hook == 'ipv6-name':
-        command = f'nft list chain {suffix} vyos_filter {name_prefix}{priority}'
+        chain = f'{name_prefix}{priority}'
     else:
         up_hook = hook.upper()
-        command = f'nft list chain {suffix} vyos_filter VYOS_{aux}{up_hook}_{priority}'
-
-    try:
-        results = cmd(command)
-    except:
-        return {}
+        chain = f'VYOS_{aux}{up_hook}_{priority}'
 
     out = {}
-    for line in results.split('\n'):
-        comment_search = re.search(rf'{priority}[\- ](\d+|default-action)', line)
+    for rule in ruleset.rules(suffix, 'vyos_filter', chain):
+        # rules merged by the ruleset optimizer share a comment and counter
+        comment_search = re.search(rf'{priority}[\- ](\d+(?:,\d+)*|default-action)', rule.get('comment') or '')
         if not comment_search:
             continue
 
-        rule = {}
-        rule_id = comment_search[1]
-        counter_search = re.search(r'counter packets (\d+) bytes (\d+)', line)
-        if counter_search:
-            rule['packets'] = counter_search[1]
-            rule['bytes'] = counter_search[2]
-
-        rule['conditions'] = re.sub(r'(\b(counter packets \d+ bytes \d+|drop|reject|return|log)\b|comment "[\w\-]+")', '', line).strip()
-        out[rule_id] = rule
+        details = get_nftables_rule_details(rule)
+        for rule_id in comment_search[1].split(','):
+            out[rule_id] = details
     return out
 
 def get_nftables_state_details(family):
@@ -101,50 +207,23 @@ def get_nftables_state_details(family):
         # no state policy for bridge
         return {}
 
-    command = f'nft list chain {suffix} vyos_filter VYOS_STATE_{name_suffix}'
-    try:
-        results = cmd(command)
-    except:
-        return {}
-
     out = {}
-    for line in results.split('\n'):
-        rule = {}
+    for rule in ruleset.rules(suffix, 'vyos_filter', f'VYOS_STATE_{name_suffix}'):
+        details = get_nftables_rule_details(rule)
         for state in ['established', 'related', 'invalid']:
-            if state in line:
-                counter_search = re.search(r'counter packets (\d+) bytes (\d+)', line)
-                if counter_search:
-                    rule['packets'] = counter_search[1]
-                    rule['bytes'] = counter_search[2]
-                rule['conditions'] = re.sub(r'(\b(counter packets \d+ bytes \d+|drop|reject|return|log)\b|comment "[\w\-]+")', '', line).strip()
-                out[state] = rule
+            if state in details['conditions']:
+                out[state] = details
     return out
 
 def get_nftables_group_members(family, table, name):
     prefix = 'ip6' if family == 'ipv6' else 'ip'
     out = []
 
-    try:
-        results_str = cmd(f'nft -j list set {prefix} {table} {name}')
-        results = json.loads(results_str)
-    except:
-        return out
-
-    if 'nftables' not in results:
-        return out
-
-    for obj in results['nftables']:
-        if 'set' not in obj:
-            continue
-
-        set_obj = obj['set']
-
-        if 'elem' in set_obj:
-            for elem in set_obj['elem']:
-                if isinstance(elem, str):
-                    out.append(elem)
-                elif isinstance(elem, dict) and 'elem' in elem:
-                    out.append(elem['elem'])
+    for elem in ruleset.set_elements(prefix, table, name):
+        if isinstance(elem, str):
+            out.append(elem)
+        elif isinstance(elem, dict) and 'elem' in elem:
+            out.append(elem['elem'])
 
     return out
 
@@ -19,7 +19,6 @@
 import re
 import sys
 import glob
-import json
 import typing
 from datetime import datetime
 from tabulate import tabulate
@@ -27,9 +26,10 @@
 import vyos.opmode
 from vyos.ifconfig import Section
 from vyos.ifconfig import Interface
+from vyos.ifconfig import InterfaceSnapshot
+from vyos.ifconfig import Operational
 from vyos.ifconfig import VRRP
 from vyos.utils.process import cmd
-from vyos.utils.process import rc_cmd
 from vyos.utils.process import call
 
 def catch_broken_pipe(func):
@@ -58,31 +58,42 @@ def filtered_interfaces(ifnames: typing.Union[str, list],
 
     return an instance of the Interface class
     """
+    for ifname in filtered_ifnames(ifnames, iftypes, vif, vrrp):
+        # As we are only "reading" from the interface - we must use the
+        # generic base class which exposes all the data via a common API
+        yield Interface(ifname, create=False, debug=False)
+
+def filtered_ifnames(ifnames: typing.Union[str, list],
+                     iftypes: typing.Union[str, list],
+                     vif: bool, vrrp: bool,
+                     snapshot: InterfaceSnapshot=None) -> str:
+    """
+    as filtered_interfaces, but return the interface names; the interfaces
+    of snapshot are considered, if provided
+    """
     if isinstance(ifnames, str):
         ifnames = [ifnames] if ifnames else []
     if isinstance(iftypes, list):
         for iftype in iftypes:
-            yield from filtered_interfaces(ifnames, iftype, vif, vrrp)
+            yield from filtered_ifnames(ifnames, iftype, vif, vrrp, snapshot)
+        return
+
+    vrrp_interfaces = VRRP.active_interfaces() if vrrp else []
+    system_ifnames = snapshot.interfaces() if snapshot is not None else None
 
-    for ifname in Section.interfaces(iftypes):
+    for ifname in Section.interfaces(iftypes, ifnames=system_ifnames):
         # Bail out early if interface name not part of our search list
         if ifnames and ifname not in ifnames:
             continue
 
-        # As we are only "reading" from the interface - we must use the
-        # generic base class which exposes all the data via a common API
-        interface = Interface(ifname, create=False, debug=False)
-
         # VLAN interfaces have a '.' in their name by convention
         if vif and not '.' in ifname:
             continue
 
-        if vrrp:
-            vrrp_interfaces = VRRP.active_interfaces()
-            if ifname not in vrrp_interfaces:
-                continue
+        if vrrp and ifname not in vrrp_interfaces:
+            continue
 
-        yield interface
+        yield ifname
 
 def _split_text(text, used=0):
     """
@@ -186,30 +197,23 @@ def _get_raw_data(ifname: typing.Optional[str],
     if iftype is None:
         iftype = ''
     ret =[]
-    for interface in filtered_interfaces(ifname, iftype, vif, vrrp):
-        res_intf = {}
-        cache = interface.operational.load_counters()
+    snapshot = InterfaceSnapshot()
+    for name in filtered_ifnames(ifname, iftype, vif, vrrp, snapshot):
+        cache = Operational(name).load_counters()
 
-        out = cmd(f'ip -json addr show {interface.ifname}')
-        res_intf_l = json.loads(out)
-        res_intf = res_intf_l[0]
+        res_intf = snapshot.get_addr_data(name)
 
         if res_intf['link_type'] == 'tunnel6':
-            # Note that 'ip -6 tun show {interface.ifname}' is not json
-            # aware, so find in list
-            out = cmd('ip -json -6 tun show')
-            tunnel = json.loads(out)
-            res_intf['tunnel6'] = _find_intf_by_ifname(tunnel,
-                                                       interface.ifname)
+            res_intf['tunnel6'] = snapshot.get_tunnel6(name)
             if 'ip6_tnl_f_use_orig_tclass' in res_intf['tunnel6']:
                 res_intf['tunnel6']['tclass'] = 'inherit'
                 del res_intf['tunnel6']['ip6_tnl_f_use_orig_tclass']
 
         res_intf['counters_last_clear'] = int(cache.get('timestamp', 0))
 
-        res_intf['description'] = interface.get_alias()
+        res_intf['description'] = snapshot.get_alias(name)
 
-        stats = interface.operational.get_stats()
+        stats = snapshot.get_stats(name)
         for k in list(stats):
             stats[k] = _get_counter_val(cache[k], stats[k])
 
@@ -240,17 +244,18 @@ def is_interface_has_mac(interface_name):
         interface_no_mac = ('tun', 'wg')
         return not any(interface_name.startswith(prefix) for prefix in interface_no_mac)
 
-    for interface in filtered_interfaces(ifname, iftype, vif, vrrp):
+    snapshot = InterfaceSnapshot()
+    for name in filtered_ifnames(ifname, iftype, vif, vrrp, snapshot):
         res_intf = {}
 
-        res_intf['ifname'] = interface.ifname
-        res_intf['oper_state'] = interface.operational.get_state()
-        res_intf['admin_state'] = interface.get_admin_state()
-        res_intf['addr'] = [_ for _ in interface.get_addr() if not _.startswith('fe80::')]
-        res_intf['description'] = interface.get_alias()
-        res_intf['mtu'] = interface.get_mtu()
-        res_intf['mac'] = interface.get_mac() if is_interface_has_mac(interface.ifname) else 'n/a'
-        res_intf['vrf'] = interface.get_vrf()
+        res_intf['ifname'] = name
+        res_intf['oper_state'] = snapshot.get_oper_state(name)
+        res_intf['admin_state'] = snapshot.get_admin_state(name)
+        res_intf['addr'] = [_ for _ in snapshot.get_addr(name) if not _.startswith('fe80::')]
+        res_intf['description'] = snapshot.get_alias(name)
+        res_intf['mtu'] = snapshot.get_mtu(name)
+        res_intf['mac'] = snapshot.get_mac(name) if is_interface_has_mac(name) else 'n/a'
+        res_intf['vrf'] = snapshot.get_vrf(name)
 
         ret.append(res_intf)
 
@@ -272,17 +277,18 @@ def _get_counter_data(ifname: typing.Optional[str],
     if iftype is None:
         iftype = ''
     ret = []
-    for interface in filtered_interfaces(ifname, iftype, vif, vrrp):
+    snapshot = InterfaceSnapshot()
+    for name in filtered_ifnames(ifname, iftype, vif, vrrp, snapshot):
         res_intf = {}
 
-        oper = interface.operational.get_state()
+        oper = snapshot.get_oper_state(name)
 
         if oper not in ('up','unknown'):
             continue
 
-        stats = interface.operational.get_stats()
-        cache = interface.operational.load_counters()
-        res_intf['ifname'] = interface.ifname
+        stats = snapshot.get_stats(name)
+        cache = Operational(name).load_counters()
+        res_intf['ifname'] = name
         res_intf['rx_packets'] = _get_counter_val(cache['rx_packets'], stats['rx_packets'])
         res_intf['rx_bytes'] = _get_counter_val(cache['rx_bytes'], stats['rx_bytes'])
         res_intf['tx_packets'] = _get_counter_val(cache['tx_packets'], stats['tx_packets'])
@@ -299,15 +305,15 @@ def _get_counter_data(ifname: typing.Optional[str],
 @catch_broken_pipe
 def _format_show_data(data: list):
     unhandled = []
+    snapshot = InterfaceSnapshot()
     for intf in data:
         if 'unhandled' in intf:
             unhandled.append(intf)
             continue
-        # instead of reformatting data, call non-json output:
-        rc, out = rc_cmd(f"ip addr show {intf['ifname']}")
-        if rc != 0:
+        # instead of reformatting data, use non-json output:
+        out = snapshot.get_text(intf['ifname'])
+        if not out:
             continue
-        out = re.sub('^\d+:\s+','',out)
         # add additional data already collected
         if 'tunnel6' in intf:
             t6_d = intf['tunnel6']
@@ -153,121 +153,123 @@ def _get_convert_data_connections():
     except (vyos.ipsec.ViciInitiateError) as err:
         raise vyos.opmode.UnconfiguredSubsystem(err)
 
-def _get_parent_sa_proposal(connection_name: str, data: list) -> dict:
+def _get_sa_index(data: list) -> dict:
+    """Index current SAs by IKE SA name and CHILD SA name
+
+    Args:
+        data (list): List of current SAs from vici
+
+    Returns:
+        dict: IKE SA name mapped to the first IKE SA of that name, the
+              state of all IKE SAs of that name and the CHILD SAs of the
+              first IKE SA grouped by CHILD SA name
+              {'peer': {'sa': {...}, 'up': True,
+                        'children': {'peer-tunnel-0': [{...}, ...]}}}
+    """
+    index = {}
+    for sa in data or []:
+        for connection, connection_conf in sa.items():
+            entry = index.get(connection)
+            if entry is None:
+                children = {}
+                for child_sa in connection_conf.get('child-sas', {}).values():
+                    children.setdefault(child_sa.get('name'), []).append(child_sa)
+                entry = {'sa': connection_conf, 'up': False, 'children': children}
+                index[connection] = entry
+            if connection_conf['state'].lower() == 'established':
+                entry['up'] = True
+    return index
+
+
+def _get_parent_sa_proposal(connection_name: str, sa_index: dict) -> dict:
     """Get parent SA proposals by connection name
     if connections not in the 'down' state
 
     Args:
         connection_name (str): Connection name
-        data (list): List of current SAs from vici
+        sa_index (dict): Current SAs from vici indexed by _get_sa_index()
 
     Returns:
         str: Parent SA connection proposal
              AES_CBC/256/HMAC_SHA2_256_128/MODP_1024
     """
-    if not data:
-        return {}
-    for sa in data:
-        # check if parent SA exist
-        if connection_name not in sa.keys():
-            continue
-        if 'encr-alg' in sa[connection_name]:
-            encr_alg = sa.get(connection_name, '').get('encr-alg')
-            cipher = encr_alg.split('_')[0]
-            mode = encr_alg.split('_')[1]
-            encr_keysize = sa.get(connection_name, '').get('encr-keysize')
-            integ_alg = sa.get(connection_name, '').get('integ-alg')
-            # prf_alg = sa.get(connection_name, '').get('prf-alg')
-            dh_group = sa.get(connection_name, '').get('dh-group')
-            proposal = {
-                'cipher': cipher,
-                'mode': mode,
-                'key_size': encr_keysize,
-                'hash': integ_alg,
-                'dh': dh_group
-            }
-            return proposal
-        return {}
-
-
-def _get_parent_sa_state(connection_name: str, data: list) -> str:
+    if connection_name not in sa_index:
+        return None
+    sa = sa_index[connection_name]['sa']
+    if 'encr-alg' in sa:
+        encr_alg = sa.get('encr-alg')
+        cipher = encr_alg.split('_')[0]
+        mode = encr_alg.split('_')[1]
+        encr_keysize = sa.get('encr-keysize')
+        integ_alg = sa.get('integ-alg')
+        # prf_alg = sa.get('prf-alg')
+        dh_group = sa.get('dh-group')
+        proposal = {
+            'cipher': cipher,
+            'mode': mode,
+            'key_size': encr_keysize,
+            'hash': integ_alg,
+            'dh': dh_group
+        }
+        return proposal
+    return {}
+
+
+def _get_parent_sa_state(connection_name: str, sa_index: dict) -> str:
     """Get parent SA state by connection name
 
     Args:
         connection_name (str): Connection name
-        data (list): List of current SAs from vici
+        sa_index (dict): Current SAs from vici indexed by _get_sa_index()
 
     Returns:
         Parent SA connection state
     """
-    ike_state = 'down'
-    if not data:
-        return ike_state
-    for sa in data:
-        # check if parent SA exist
-        for connection, connection_conf in sa.items():
-            if connection_name != connection:
-                continue
-            if connection_conf['state'].lower() == 'established':
-                ike_state = 'up'
-    return ike_state
+    if connection_name in sa_index and sa_index[connection_name]['up']:
+        return 'up'
+    return 'down'
 
 
 def _get_child_sa_state(connection_name: str, tunnel_name: str,
-                        data: list) -> str:
+                        sa_index: dict) -> str:
     """Get child SA state by connection and tunnel name
 
     Args:
         connection_name (str): Connection name
         tunnel_name (str): Tunnel name
-        data (list): List of current SAs from vici
+        sa_index (dict): Current SAs from vici indexed by _get_sa_index()
 
     Returns:
         str: `up` if child SA state is 'installed' otherwise `down`
     """
-    child_sa = 'down'
-    if not data:
-        return child_sa
-    for sa in data:
-        # check if parent SA exist
-        if connection_name not in sa.keys():
-            continue
-        child_sas = sa[connection_name]['child-sas']
-        # Get all child SA states
-        # there can be multiple SAs per tunnel
-        child_sa_states = [
-            v['state'] for k, v in child_sas.items() if
-            v['name'] == tunnel_name
-        ]
-        return 'up' if 'INSTALLED' in child_sa_states else child_sa
+    if connection_name not in sa_index:
+        return 'down'
+    # there can be multiple SAs per tunnel
+    child_sas = sa_index[connection_name]['children'].get(tunnel_name, [])
+    if any(child_sa['state'] == 'INSTALLED' for child_sa in child_sas):
+        return 'up'
+    return 'down'
 
 
 def _get_child_sa_info(connection_name: str, tunnel_name: str,
-                       data: list) -> dict:
+                       sa_index: dict) -> dict:
     """Get child SA installed info by connection and tunnel name
 
     Args:
         connection_name (str): Connection name
         tunnel_name (str): Tunnel name
-        data (list): List of current SAs from vici
+        sa_index (dict): Current SAs from vici indexed by _get_sa_index()
 
     Returns:
         dict: Info of the child SA in the dictionary format
     """
-    for sa in data:
-        # check if parent SA exist
-        if connection_name not in sa.keys():
-            continue
-        child_sas = sa[connection_name]['child-sas']
-        # Get all child SA data
-        # Skip temp SA name (first key), get only SA values as dict
-        # {'OFFICE-B-tunnel-0-46': {'name': 'OFFICE-B-tunnel-0'}...}
-        # i.e get all data after 'OFFICE-B-tunnel-0-46'
-        child_sa_info = [
-            v for k, v in child_sas.items() if 'name' in v and
-            v['name'] == tunnel_name and v['state'] == 'INSTALLED'
-        ]
-        return child_sa_info[-1] if child_sa_info else {}
+    if connection_name not in sa_index:
+        return None
+    child_sas = sa_index[connection_name]['children'].get(tunnel_name, [])
+    child_sa_info = [
+        child_sa for child_sa in child_sas if child_sa['state'] == 'INSTALLED'
+    ]
+    return child_sa_info[-1] if child_sa_info else {}
 
 
 def _get_child_sa_proposal(child_sa_data: dict) -> dict:
@@ -299,28 +301,30 @@ def _get_raw_data_connections(list_connections: list, list_sas: list) -> list:
     Returns:
         list: List and status of IKE/IPsec connections/tunnels
     """
+    # index SAs once instead of scanning them for every connection and tunnel
+    sa_index = _get_sa_index(list_sas)
     base_dict = []
     for connections in list_connections:
         base_list = {}
         for connection, conn_conf in connections.items():
             base_list['ike_connection_name'] = connection
             base_list['ike_connection_state'] = _get_parent_sa_state(
-                connection, list_sas)
+                connection, sa_index)
             base_list['ike_remote_address'] = conn_conf['remote_addrs']
             base_list['ike_proposal'] = _get_parent_sa_proposal(
-                connection, list_sas)
+                connection, sa_index)
             base_list['local_id'] = conn_conf.get('local-1', '').get('id')
             base_list['remote_id'] = conn_conf.get('remote-1', '').get('id')
             base_list['version'] = conn_conf.get('version', 'IKE')
             base_list['children'] = []
             children = conn_conf['children']
             for tunnel, tun_options in children.items():
-                state = _get_child_sa_state(connection, tunnel, list_sas)
+                state = _get_child_sa_state(connection, tunnel, sa_index)
                 local_ts = tun_options.get('local-ts')
                 remote_ts = tun_options.get('remote-ts')
                 dpd_action = tun_options.get('dpd_action')
                 close_action = tun_options.get('close_action')
-                sa_info = _get_child_sa_info(connection, tunnel, list_sas)
+                sa_info = _get_child_sa_info(connection, tunnel, sa_index)
                 esp_proposal = _get_child_sa_proposal(sa_info)
                 base_list['children'].append({
                     'name': tunnel,
@@ -530,11 +534,10 @@ def reset_profile_dst(profile: str, tunnel: str, nbma_dst: str):
                 [x[ike_sa_name]['uniqueid'] for x in sa_nbma_list if
                  ike_sa_name in x]))
             # initiate IKE SAs
-            for ike in sa_nbma_list:
-                if ike_sa_name in ike:
-                    vyos.ipsec.vici_initiate(ike_sa_name, 'dmvpn',
-                                             ike[ike_sa_name]['local-host'],
-                                             ike[ike_sa_name]['remote-host'])
+            vyos.ipsec.vici_initiate_list(list(
+                [(ike_sa_name, 'dmvpn', x[ike_sa_name]['local-host'],
+                  x[ike_sa_name]['remote-host']) for x in sa_nbma_list if
+                 ike_sa_name in x]))
             print(
                 f'Profile {profile} tunnel {tunnel} remote-host {nbma_dst} reset result: success')
         except (vyos.ipsec.ViciInitiateError) as err:
@@ -555,14 +558,25 @@ def reset_profile_all(profile: str, tunnel: str):
                     f'SA(s) for profile {profile} tunnel {tunnel} not found, aborting')
             # terminate IKE SAs
             vyos.ipsec.terminate_vici_by_name(ike_sa_name, None)
-            # initiate IKE SAs
+            # initiate IKE SAs, the result is reported per peer
+            failed = []
             for ike in sa_list:
-                if ike_sa_name in ike:
+                if ike_sa_name not in ike:
+                    continue
+                remote_host = ike[ike_sa_name]['remote-host']
+                try:
                     vyos.ipsec.vici_initiate(ike_sa_name, 'dmvpn',
                                              ike[ike_sa_name]['local-host'],
-                                             ike[ike_sa_name]['remote-host'])
+                                             remote_host)
+                    result = 'success'
+                except vyos.ipsec.ViciCommandError:
+                    failed.append(remote_host)
+                    result = 'failed'
                 print(
-                    f'Profile {profile} tunnel {tunnel} remote-host {ike[ike_sa_name]["remote-host"]} reset result: success')
+                    f'Profile {profile} tunnel {tunnel} remote-host {remote_host} reset result: {result}')
+            if failed:
+                raise vyos.ipsec.ViciCommandError(
+                    f'Failed to initiate SA for IKE {ike_sa_name} ({", ".join(failed)})')
             print(f'Profile {profile} tunnel {tunnel} reset result: success')
         except (vyos.ipsec.ViciInitiateError) as err:
             raise vyos.opmode.UnconfiguredSubsystem(err)
@@ -57,7 +57,8 @@
 ArgFamily = typing.Literal['inet', 'inet6']
 
 def show_summary(raw: bool, family: ArgFamily, table: typing.Optional[int], vrf: typing.Optional[str]):
-    from vyos.utils.process import cmd
+    from vyos.frr import execute
+    from vyos.frr import execute_json
 
     if family == 'inet':
         family_cmd = 'ip'
@@ -81,18 +82,13 @@ def show_summary(raw: bool, family: ArgFamily, table: typing.Optional[int], vrf:
         vrf_cmd = ""
 
     if raw:
-        from json import loads
-
-        output = cmd(f"vtysh -c 'show {family_cmd} route {vrf_cmd} summary {table_cmd} json'").strip()
-
         # If there are no routes in a table, its "JSON" output is an empty string,
-        # as of FRR 8.4.1
-        if output:
-            return loads(output)
-        else:
-            return {}
+        # as of FRR 8.4.1, which execute_json() returns as an empty dict
+        return execute_json(f'show {family_cmd} route {vrf_cmd} summary {table_cmd}',
+                            daemon='zebra')
     else:
-        output = cmd(f"vtysh -c 'show {family_cmd} route {vrf_cmd} summary {table_cmd}'")
+        output = execute(f'show {family_cmd} route {vrf_cmd} summary {table_cmd}',
+                         daemon='zebra')
         return output
 
 def show(raw: bool,
@@ -119,8 +115,8 @@ def show(raw: bool,
         frr_command = frr_command_template.render(kwargs)
         frr_command = re.sub(r'\s+', ' ', frr_command)
 
-        from vyos.utils.process import cmd
-        output = cmd(f"vtysh -c '{frr_command}'")
+        from vyos.frr import execute
+        output = execute(frr_command.strip(), daemon='zebra')
 
         if raw:
             from json import loads
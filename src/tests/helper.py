@@ -13,10 +13,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import sys
+import importlib.machinery
 import importlib.util
 
 def prepare_module(file_path='', module_name=''):
-    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    # explicit loader, service scripts have no .py suffix
+    loader = importlib.machinery.SourceFileLoader(module_name, file_path)
+    spec = importlib.util.spec_from_file_location(module_name, file_path, loader=loader)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
     sys.modules[module_name] = module
@@ -0,0 +1,97 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import threading
+
+from unittest import TestCase
+
+from vyos.accel_ppp import accel_cmd
+from vyos.accel_ppp import accel_out_parse
+from vyos.accel_ppp import accel_sessions
+
+session_output = '''\
+ ifname | username |     ip     | state  | rx-bytes-raw
+--------+----------+------------+--------+--------------
+ ppp0   | user0    | 100.64.0.2 | active | 1024
+ ppp1   |          | 100.64.0.3 | start  | 0'''
+
+def session_table(columns, count):
+    rows = [' ' + ' | '.join(columns), '+'.join('-' * (len(c) + 2) for c in columns)]
+    for i in range(count):
+        values = {'ifname': f'ppp{i}', 'username': f'user{i}', 'ip': f'100.64.{i >> 8 & 0xff}.{i & 0xff}',
+                  'state': 'active', 'rx-bytes-raw': str(i * 1000)}
+        rows.append(' ' + ' | '.join(values.get(c, '') for c in columns))
+    return '\r\n'.join(rows) + '\r\n'
+
+class FakeAccelCli(threading.Thread):
+    # line based command interface like the accel-ppp cli tcp module
+    def __init__(self, sessions):
+        super().__init__(daemon=True)
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        self.sessions = sessions
+        self.commands = []
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn, conn.makefile('rb') as stream:
+                for line in stream:
+                    command = line.decode().strip()
+                    if command == 'exit':
+                        break
+                    self.commands.append(command)
+                    conn.sendall(self.reply(command).encode())
+
+    def reply(self, command):
+        if command.startswith('show sessions '):
+            columns = command.split()[2].split(',')
+            return session_table(columns, self.sessions)
+        if command == 'show stat':
+            return 'uptime: 0.00:42:00\r\ncpu: 0%\r\n'
+        return 'invalid command\r\n'
+
+class TestAccelPPP(TestCase):
+    def setUp(self):
+        self.cli = FakeAccelCli(40000)
+        self.cli.start()
+
+    def tearDown(self):
+        self.cli.server.close()
+
+    def test_parse(self):
+        self.assertEqual(accel_out_parse(session_output.splitlines()), [
+            {'ifname': 'ppp0', 'username': 'user0', 'ip': '100.64.0.2',
+             'state': 'active', 'rx-bytes-raw': '1024'},
+            {'ifname': 'ppp1', 'username': '', 'ip': '100.64.0.3',
+             'state': 'start', 'rx-bytes-raw': '0'}])
+        self.assertEqual(accel_out_parse([]), [])
+
+    def test_cmd(self):
+        self.assertEqual(accel_cmd(self.cli.port, 'show stat'),
+                         'uptime: 0.00:42:00\ncpu: 0%')
+
+    def test_sessions(self):
+        columns = ['ifname', 'ip', 'rx-bytes-raw']
+        sessions = accel_sessions(self.cli.port, columns)
+        first = next(sessions)
+        count = 1 + sum(1 for _ in sessions)
+
+        self.assertEqual(self.cli.commands, ['show sessions ifname,ip,rx-bytes-raw'])
+        self.assertEqual(first, {'ifname': 'ppp0', 'ip': '100.64.0.0', 'rx-bytes-raw': '0'})
+        self.assertEqual(count, 40000)
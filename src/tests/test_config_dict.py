@@ -0,0 +1,100 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from vyos.config import Config
+from vyos.configsource import ConfigSourceString
+from vyos.utils.dict import get_sub_dict
+
+rule_count = 100
+
+def synthetic_config() -> str:
+    rules = ''.join(f'''
+                rule {i} {{
+                    action accept
+                    destination {{
+                        port {1024 + i % 60000}
+                    }}
+                    protocol tcp
+                }}''' for i in range(1, rule_count + 1))
+    return f'''
+firewall {{
+    ipv4 {{
+        name LARGE {{
+            default-action drop{rules}
+        }}
+    }}
+}}
+service {{
+    ntp {{
+        server time1.vyos.net {{
+        }}
+        server time2.vyos.net {{
+        }}
+    }}
+}}
+system {{
+    host-name vyos
+}}
+'''
+
+class TestConfigDict(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.config_string = synthetic_config()
+
+    def _config(self):
+        source = ConfigSourceString(running_config_text=self.config_string,
+                                    session_config_text=self.config_string)
+        return Config(config_source=source)
+
+    def test_subtree_matches_root(self):
+        config = self._config()
+        root = config.get_cached_root_dict()
+        for path in (['service', 'ntp'], ['system', 'host-name'],
+                     ['firewall', 'ipv4', 'name', 'LARGE', 'rule', '42'],
+                     ['service', 'non-existent']):
+            for get_first_key in (False, True):
+                expected = get_sub_dict(root, path, get_first_key=get_first_key)
+                fresh = self._config()
+                self.assertEqual(fresh.get_config_dict(path,
+                                                       get_first_key=get_first_key,
+                                                       no_multi_convert=True),
+                                 expected)
+
+    def test_cached_root_dict_copied(self):
+        root = self._config().get_cached_root_dict()
+        servers = {'time1.vyos.net': {}, 'time2.vyos.net': {}}
+        # root dict reused by vyos-configd for two commits
+        for _ in range(2):
+            config = self._config()
+            config.set_cached_root_dict(root)
+            ntp = config.get_config_dict(['service', 'ntp'], get_first_key=True,
+                                         no_multi_convert=True)
+            self.assertEqual(ntp['server'], servers)
+            ntp['server']['time1.vyos.net']['prefer'] = {}
+            del ntp['server']['time2.vyos.net']
+        self.assertEqual(root['service']['ntp']['server'], servers)
+
+    def test_subtree_only(self):
+        path = ['service', 'ntp']
+        config = self._config()
+        ntp = config.get_config_dict(path, get_first_key=True, no_multi_convert=True)
+        self.assertEqual(list(ntp['server']), ['time1.vyos.net', 'time2.vyos.net'])
+        # the firewall rules are not converted, the subtree is cached per path
+        self.assertFalse(config.has_cached_root_dict())
+        self.assertEqual(list(config._subtree_dict_cache), [(False, tuple(path))])
+        config.get_config_dict(path, get_first_key=True, no_multi_convert=True)
+        self.assertEqual(len(config._subtree_dict_cache), 1)
@@ -0,0 +1,249 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import gzip
+import random
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.config_mgmt
+import vyos.config_revision
+
+from vyos.config_mgmt import ConfigMgmt
+
+from vyos.config_revision import RevisionStore
+from vyos.config_revision import RevisionStoreError
+from vyos.config_revision import apply_line_delta
+from vyos.config_revision import change_summary
+from vyos.config_revision import line_delta
+from vyos.config_revision import record_size
+
+def synthetic_config(rules, seed=0):
+    rnd = random.Random(seed)
+    lines = ['firewall {\n', '    ipv4 {\n', '        name LARGE {\n']
+    for i in range(1, rules + 1):
+        lines += [f'            rule {i} {{\n',
+                  f'                action {rnd.choice(["accept", "drop"])}\n',
+                  f'                source {{\n',
+                  f'                    address 10.{i >> 8 & 0xff}.{i & 0xff}.0/24\n',
+                  f'                }}\n',
+                  f'            }}\n']
+    lines += ['        }\n', '    }\n', '}\n']
+    return lines
+
+def commit(lines, rnd):
+    # change, add or delete a few rules
+    lines = list(lines)
+    for _ in range(rnd.randint(1, 5)):
+        i = rnd.randrange(3, len(lines) - 3, 6)
+        op = rnd.choice(['change', 'add', 'delete'])
+        if op == 'change':
+            lines[i + 1] = f'                action {rnd.choice(["reject", "continue"])}\n'
+        elif op == 'add':
+            lines[i:i] = ['            rule 0 {\n', '                log\n', '            }\n']
+        else:
+            del lines[i:i + 6]
+    return lines
+
+def entry(n):
+    return f'|{1700000000 + n}|vyos|cli|commit {n}|\n'
+
+def summary(n):
+    # commits alternately change bgp and the firewall
+    if n % 2:
+        return [[['protocols', 'bgp', '65000'], n, 0]]
+    return [[['firewall', 'ipv4', 'name'], 0, n]]
+
+added = {'protocols': {'bgp': {'65000': {'neighbor': {'192.0.2.1': {'remote-as': '65001'},
+                                                      '192.0.2.2': {'remote-as': '65002',
+                                                                    'shutdown': {}}}}}},
+         'system': {'host-name': 'router', 'name-server': ['192.0.2.1', '192.0.2.2']}}
+removed = {'system': {'host-name': 'vyos'}}
+
+class TestRevisionStore(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmpdir.name, 'objects'))
+        self.store = RevisionStore(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def commits(self, count, rules=300):
+        rnd = random.Random(count)
+        lines = synthetic_config(rules)
+        history = []
+        for n in range(count):
+            text = ''.join(lines)
+            self.store.append(text, entry(n), summary(n))
+            history.insert(0, text)
+            lines = commit(lines, rnd)
+        return history
+
+    def test_line_delta(self):
+        rnd = random.Random(1)
+        base = synthetic_config(100)
+        lines = base
+        for _ in range(50):
+            lines = commit(lines, rnd)
+            self.assertEqual(apply_line_delta(base, line_delta(base, lines)),
+                             ''.join(lines))
+        self.assertEqual(line_delta(base, base), [[0, len(base)]])
+        self.assertEqual(apply_line_delta(base, line_delta(base, [])), '')
+        self.assertEqual(apply_line_delta([], line_delta([], base)), ''.join(base))
+
+    def test_change_summary(self):
+        self.assertEqual(change_summary(added, removed), [
+            [['protocols', 'bgp', '65000'], 3, 0],
+            [['system', 'host-name'], 1, 1],
+            [['system', 'name-server'], 2, 0]])
+        self.assertEqual(change_summary(added, {}, depth=1), [
+            [['protocols'], 3, 0], [['system'], 3, 0]])
+        self.assertEqual(change_summary({}, {}), [])
+
+    def test_summaries(self):
+        self.commits(30)
+        self.store.append(self.store.get(0), entry(30))
+        self.assertEqual(self.store.summary(0), None)
+        self.assertEqual(self.store.summary(1), summary(29))
+        self.assertEqual(self.store.summaries()[1:], [summary(n) for n in reversed(range(30))])
+        self.assertEqual(self.store.touched(['protocols', 'bgp']),
+                         [0] + [rev for rev in range(1, 31) if rev % 2])
+        self.assertEqual(self.store.touched(['protocols', 'bgp', '65000', 'neighbor']),
+                         self.store.touched(['protocols', 'bgp']))
+        self.assertEqual(self.store.touched(['protocols', 'ospf']), [0])
+
+        self.assertTrue(self.store.is_revised(['firewall'], 2, 4))
+        self.assertFalse(self.store.is_revised(['protocols'], 2, 3))
+        self.assertTrue(self.store.is_revised(['protocols'], 4, 3))
+        # unknown changes, but identical configs
+        self.assertFalse(self.store.is_revised(['protocols'], 0, 1))
+        self.assertIsNone(self.store.is_revised(['protocols'], 0, 2))
+
+    def test_revisions(self):
+        history = self.commits(50)
+        self.assertEqual(len(self.store), 50)
+        for rev, text in enumerate(history):
+            self.assertEqual(self.store.get(rev), text)
+        self.assertEqual(self.store.log_entries(), [entry(n) for n in reversed(range(50))])
+        self.assertEqual(self.store.log_entry(0), entry(49))
+        with self.assertRaises(RevisionStoreError):
+            self.store.get(50)
+
+        # a full snapshot every snapshot_interval revisions, deltas otherwise
+        snapshots = self.store._read_records(0, 50)
+        self.assertEqual([r.kind for r in snapshots].count('F'),
+                         -(-50 // vyos.config_revision.snapshot_interval))
+
+    def test_truncate(self):
+        history = self.commits(100)
+        for n in range(20):
+            self.store.append(history[0], entry(100 + n), summary(100 + n))
+            self.store.truncate(40)
+            self.assertEqual(len(self.store), 40)
+        self.assertEqual(self.store.get(39), history[19])
+        self.assertEqual(self.store.log_entries()[-1], entry(80))
+        self.assertEqual(self.store.summaries()[-1], summary(80))
+        self.assertEqual(self.store.summary(0), summary(119))
+        # expired records and unreferenced objects are removed
+        self.assertLess(os.path.getsize(self.store.index_file),
+                        (40 + vyos.config_revision.snapshot_interval) * record_size)
+        used = {r.object for r in self.store._read_records(0, self.store._records())}
+        used |= {r.base for r in self.store._read_records(0, self.store._records())}
+        self.assertEqual(set(os.listdir(self.store.object_dir)), used)
+
+    def test_interrupted_append(self):
+        history = self.commits(3)
+        with open(self.store.index_file, 'ab') as f:
+            f.write(b'D 0123')
+        self.assertEqual(len(self.store), 3)
+        self.store.append('system {\n}\n', entry(3))
+        self.assertEqual(self.store.get(0), 'system {\n}\n')
+        self.assertEqual(self.store.get(1), history[0])
+
+    def test_corrupted(self):
+        self.commits(3)
+        record = self.store._record(0)
+        with gzip.open(self.store._object_path(record.object), 'wb') as f:
+            f.write(b'[[0,1]]')
+        with self.assertRaises(RevisionStoreError):
+            self.store.get(0)
+
+    def test_storage(self):
+        rnd = random.Random(2)
+        lines = synthetic_config(50000)
+        size = 0
+        for n in range(40):
+            text = ''.join(lines)
+            size += len(gzip.compress(text.encode(), compresslevel=6))
+            self.store.append(text, entry(n))
+            if n == 1:
+                second = text
+            lines = commit(lines, rnd)
+        stored = sum(os.path.getsize(os.path.join(self.store.object_dir, name))
+                     for name in os.listdir(self.store.object_dir))
+        self.assertLess(stored, size // 5)
+        self.assertEqual(self.store.get(38), second)
+
+class TestMigrateArchive(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.archive_dir = self.tmpdir.name
+        self.commit_log = os.path.join(self.archive_dir, 'commits')
+        os.makedirs(os.path.join(self.archive_dir, 'revisions', 'objects'))
+
+        self.cm = ConfigMgmt.__new__(ConfigMgmt)
+        self.cm.revisions = RevisionStore(os.path.join(self.archive_dir, 'revisions'))
+        self.cm.max_revisions = 100
+        self.cm._get_change_summary = lambda config: None
+
+        self.patches = [patch.object(vyos.config_mgmt, 'archive_dir', self.archive_dir),
+                        patch.object(vyos.config_mgmt, 'commit_log_file', self.commit_log)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmpdir.cleanup()
+
+    def archive(self, count):
+        with open(self.commit_log, 'w') as f:
+            f.writelines(entry(n) for n in range(count))
+        for n in range(count):
+            with gzip.open(self.archive_path(n), 'wt') as f:
+                f.write(''.join(synthetic_config(10 + n)))
+
+    def archive_path(self, n):
+        return os.path.join(self.archive_dir, f'config.boot.{n}.gz')
+
+    def test_migrate(self):
+        self.archive(3)
+        self.cm._migrate_archive()
+        self.assertEqual(len(self.cm.revisions), 3)
+        self.assertEqual(self.cm.revisions.get(1), ''.join(synthetic_config(11)))
+        self.assertEqual(os.listdir(self.archive_dir), ['revisions'])
+
+    def test_migrate_failed(self):
+        self.archive(3)
+        with open(self.archive_path(1), 'wb') as f:
+            f.write(b'not gzip')
+        self.cm._migrate_archive()
+        self.assertEqual(len(self.cm.revisions), 2)
+        # the unreadable archive and the commit log are kept
+        self.assertEqual(sorted(os.listdir(self.archive_dir)),
+                         ['commits', 'config.boot.1.gz', 'revisions'])
@@ -0,0 +1,120 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from vyos.configsession import ConfigSession
+from vyos.configsession import ConfigSessionError
+from vyos.configsession import LOAD_CONFIG
+from vyos.configsession import SHOW_CONFIG
+from vyos.configsession import _apply_op
+from vyos.configsession import _path_state
+from vyos.configtree import ConfigTree
+from vyos.configtree import ConfigTreeError
+
+session_config = '''
+system {
+    host-name vyos
+    name-server 192.0.2.1
+}
+'''
+
+class TestConfigSessionOps(TestCase):
+    def setUp(self):
+        self.tree = ConfigTree(session_config)
+
+    def test_set(self):
+        for i in range(1, 101):
+            base = ['firewall', 'ipv4', 'name', 'LARGE', 'rule', str(i)]
+            _apply_op(self.tree, 'set', base + ['action', 'accept'])
+            _apply_op(self.tree, 'set', base + ['log'])
+        _apply_op(self.tree, 'set', ['system', 'host-name', 'router'])
+        _apply_op(self.tree, 'set', ['system', 'name-server', '192.0.2.2'])
+        _apply_op(self.tree, 'set', ['system', 'name-server', '192.0.2.2'])
+
+        self.assertEqual(self.tree.return_value(['system', 'host-name']), 'router')
+        self.assertEqual(self.tree.return_values(['system', 'name-server']),
+                         ['192.0.2.1', '192.0.2.2'])
+        self.assertTrue(self.tree.is_tag(['firewall', 'ipv4', 'name']))
+        self.assertTrue(self.tree.is_tag(['firewall', 'ipv4', 'name', 'LARGE', 'rule']))
+        self.assertTrue(_path_state(self.tree, ['firewall', 'ipv4', 'name', 'LARGE',
+                                                'rule', '42', 'action', 'accept']))
+        self.assertIn('rule 42 {', self.tree.to_string())
+
+    def test_delete(self):
+        _apply_op(self.tree, 'delete', ['system', 'name-server', '192.0.2.1'])
+        self.assertFalse(self.tree.exists(['system', 'name-server']))
+        _apply_op(self.tree, 'delete', ['system', 'host-name'])
+        self.assertFalse(self.tree.exists(['system', 'host-name']))
+        with self.assertRaises(ConfigTreeError):
+            _apply_op(self.tree, 'delete', ['system', 'domain-name'])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            _apply_op(self.tree, 'set', ['system', 'non-existent', 'foo'])
+        with self.assertRaises(ValueError):
+            _apply_op(self.tree, 'set', ['system', 'host-name'])
+        with self.assertRaises(ValueError):
+            _apply_op(self.tree, 'rename', ['system', 'host-name', 'foo'])
+
+class FakeSession(ConfigSession):
+    """ ConfigSession with the session config kept in memory """
+    def __init__(self, config):
+        self.active = config
+        self.working = config
+        self.commands = []
+
+    def __del__(self):
+        pass
+
+    def _ConfigSession__run_command(self, cmd_list):
+        self.commands.append(cmd_list)
+        if cmd_list == SHOW_CONFIG + ['--show-working-only']:
+            return self.working
+        if cmd_list == SHOW_CONFIG:
+            if self.working == self.active:
+                return self.working
+            # as cli-shell-api shows uncommitted changes
+            return '+' + self.working.replace('\n', '\n+')
+        if cmd_list[:-1] == LOAD_CONFIG:
+            with open(cmd_list[-1]) as f:
+                self.working = f.read()
+            return ''
+        raise ValueError(cmd_list)
+
+class TestConfigSessionApply(TestCase):
+    def test_apply_ops(self):
+        session = FakeSession(session_config)
+        base = ['firewall', 'ipv4', 'name', 'LARGE', 'rule']
+        session.apply_ops([('set', base + [str(i), 'action', 'accept']) + (None,)
+                           for i in range(1, 11)])
+        # the session has uncommitted changes now
+        session.apply_ops([('delete', ['system', 'name-server', '192.0.2.1'], None),
+                           ('set', ['system', 'host-name'], 'router')])
+
+        tree = ConfigTree(session.working)
+        self.assertEqual(tree.list_nodes(base), [str(i) for i in range(1, 11)])
+        self.assertEqual(tree.return_value(['system', 'host-name']), 'router')
+        self.assertFalse(tree.exists(['system', 'name-server']))
+        self.assertEqual([c[1] for c in session.commands],
+                         ['showConfig', 'loadFile', 'showConfig'] * 2)
+
+    def test_apply_ops_errors(self):
+        session = FakeSession(session_config)
+        with self.assertRaises(ConfigSessionError) as e:
+            session.apply_ops([('set', ['system', 'host-name'], 'router'),
+                               ('delete', ['system', 'domain-name'], None)])
+        self.assertIn('delete [system domain-name]', str(e.exception))
+        # nothing is loaded if an op can not be applied
+        self.assertEqual(session.working, session_config)
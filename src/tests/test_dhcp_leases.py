@@ -0,0 +1,137 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+
+from time import time
+from unittest import TestCase
+
+from vyos.kea import kea_get_subnet_pool_map
+
+sys.path.append(os.path.dirname(__file__))
+from helper import prepare_module
+
+op_mode_dir = os.path.join(os.path.dirname(__file__), '..', 'op_mode')
+prepare_module(os.path.join(op_mode_dir, 'dhcp.py'), 'op_mode_dhcp')
+import op_mode_dhcp as dhcp
+
+pool_count = 200
+subnets_per_pool = 4
+
+def synthetic_active_config():
+    networks = []
+    for p in range(pool_count):
+        subnets = [{'id': p * subnets_per_pool + s + 1,
+                    'subnet': f'10.{p}.{s * 64}.0/18'}
+                   for s in range(subnets_per_pool)]
+        networks.append({'name': f'POOL-{p}', 'subnet4': subnets})
+    return {'result': 0, 'arguments': {'Dhcp4': {'shared-networks': networks}}}
+
+def synthetic_leases(count, duplicates=0):
+    now = int(time())
+    leases = []
+    for i in range(count + duplicates):
+        n = i % count
+        subnet_id = n % (pool_count * subnets_per_pool) + 1
+        leases.append({'ip-address': f'100.{n >> 16 & 0xff}.{n >> 8 & 0xff}.{n & 0xff}',
+                       'hw-address': f'00:53:00:{n >> 16 & 0xff:02x}:{n >> 8 & 0xff:02x}:{n & 0xff:02x}',
+                       'hostname': f'host-{n}' if i < count else f'renewed-{n}',
+                       'subnet-id': subnet_id, 'state': n % 3 and 2 or 0,
+                       'cltt': now - 60, 'valid-lft': 3600})
+    return leases
+
+def synthetic_pools_config():
+    return {f'POOL-{p}': {'subnet': {f'10.{p}.{s * 64}.0/18': {
+                'range': {'0': {'start': f'10.{p}.{s * 64}.10', 'stop': f'10.{p}.{s * 64 + 63}.254'}}}
+            for s in range(subnets_per_pool)}}
+            for p in range(pool_count)}
+
+class FakeConfig:
+    def __init__(self, pools_config):
+        self.pools_config = pools_config
+        self.queries = 0
+
+    def get_config_dict(self, path, **kwargs):
+        self.queries += 1
+        return self.pools_config
+
+class TestDhcpServerLeases(TestCase):
+    def setUp(self):
+        self.active_config = synthetic_active_config()
+        self.requested_subnets = []
+        pools = [f'POOL-{p}' for p in range(pool_count)]
+
+        def get_leases(inet, subnets=None):
+            self.requested_subnets.append(subnets)
+            if subnets is None:
+                return self.leases
+            return [l for l in self.leases if l['subnet-id'] in subnets]
+
+        dhcp.kea_get_leases = get_leases
+        dhcp.kea_iter_leases = lambda inet: iter(self.leases)
+        self.config_requests = 0
+        def get_active_config(inet):
+            self.config_requests += 1
+            return self.active_config
+
+        dhcp.kea_get_active_config = get_active_config
+        dhcp._get_dhcp_pools = lambda family='inet': pools
+
+    def test_subnet_pool_map(self):
+        pool_map = kea_get_subnet_pool_map(self.active_config, '4')
+        self.assertEqual(len(pool_map), pool_count * subnets_per_pool)
+        self.assertEqual(pool_map[1], 'POOL-0')
+        self.assertEqual(pool_map[subnets_per_pool + 1], 'POOL-1')
+        self.assertEqual(kea_get_subnet_pool_map({'result': 0}, '4'), {})
+
+    def test_leases(self):
+        self.leases = synthetic_leases(1000, duplicates=100)
+        data = dhcp._get_raw_server_leases(family='inet', sorted='ip')
+        self.assertEqual(len(data), 1000)
+        # all pools are requested, leases are paged instead
+        self.assertEqual(self.requested_subnets, [])
+        self.assertEqual(len({lease['ip'] for lease in data}), 1000)
+        # the most recent lease for an address wins
+        self.assertEqual(data[0]['ip'], '100.0.0.0')
+        self.assertEqual(data[0]['hostname'], 'renewed-0')
+        self.assertEqual(data[0]['pool'], 'POOL-0')
+        self.assertEqual(data[0]['state'], 'active')
+
+    def test_leases_filter(self):
+        self.leases = synthetic_leases(1000)
+        data = dhcp._get_raw_server_leases(family='inet', pool='POOL-1', state='active')
+        # only the subnets of the requested pool are queried
+        self.assertEqual(self.requested_subnets,
+                         [list(range(subnets_per_pool + 1, 2 * subnets_per_pool + 1))])
+        self.assertTrue(data)
+        for lease in data:
+            self.assertEqual(lease['pool'], 'POOL-1')
+            self.assertEqual(lease['state'], 'active')
+
+    def test_pool_statistics(self):
+        self.leases = synthetic_leases(8000)
+        dhcp.config = FakeConfig(synthetic_pools_config())
+        stats = dhcp._get_raw_pool_statistics(family='inet')
+        self.assertEqual(self.config_requests, 1)
+        self.assertEqual(dhcp.config.queries, 1)
+        self.assertEqual(len(stats), pool_count)
+        self.assertEqual(sum(pool['leases'] for pool in stats), 8000)
+        self.assertEqual(stats[0], {'pool': 'POOL-0', 'size': 4 * 16373, 'leases': 40,
+                                    'available': 4 * 16373 - 40, 'use_percentage': 0,
+                                    'subnet': [f'10.0.{s * 64}.0/18' for s in range(4)]})
+
+        stats = dhcp._get_raw_pool_statistics(family='inet', pool='POOL-1')
+        self.assertEqual([pool['pool'] for pool in stats], ['POOL-1'])
+        self.assertEqual(stats[0]['leases'], 40)
@@ -0,0 +1,634 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import os
+import re
+
+from ipaddress import ip_address
+from ipaddress import ip_network
+from random import Random
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from vyos.firewall import _nft_elements
+from vyos.firewall import _nft_header
+from vyos.firewall import _nft_set_parts
+from vyos.firewall import RuleCache
+from vyos.firewall import geoip_compile
+from vyos.firewall import geoip_elements
+from vyos.firewall import geoip_load_ranges
+from vyos.firewall import geoip_update
+from vyos.firewall import nft_ruleset_delta
+from vyos.firewall import optimize_rules
+from vyos.firewall import parse_optimized_rule
+from vyos.firewall import parse_nft_ruleset
+from vyos.template import render_to_string
+
+templates = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'templates')
+
+def firewall_config():
+    return {'ipv4': {'forward': {'filter': {'default_action': 'accept', 'rule': {
+                         '5': {'action': 'jump', 'jump_target': 'WAN'}}}},
+                     'name': {'WAN': {'default_action': 'drop', 'rule': {
+                         '10': {'action': 'accept', 'protocol': 'tcp',
+                                'source': {'address': '10.0.0.0/8'},
+                                'destination': {'port': '22'}},
+                         '20': {'action': 'accept', 'recent': {'count': '10', 'time': 'minute'},
+                                'source': {'group': {'address_group': 'SERVERS'}}}}},
+                              'OLD': {'default_action': 'reject'}}},
+            'group': {'address_group': {'SERVERS': {'address': ['192.0.2.1', '192.0.2.5']}},
+                      'mac_group': {'HOSTS': {'mac_address': ['00:53:00:00:00:01',
+                                                              '00:53:00:00:00:02']}}},
+            'ip_fqdn': {}, 'ip6_fqdn': {}, 'geoip_updated': False, 'global_options': {}}
+
+def render(firewall):
+    return render_to_string('firewall/nftables.j2', firewall, location=templates)
+
+def normalize(objects):
+    out = {}
+    for (kind, name), body in objects.items():
+        if kind in ['set', 'map']:
+            head, elements = _nft_set_parts(body)
+            body = (head, sorted(elements))
+        out[(kind, name)] = body
+    return out
+
+def load(tables, script):
+    """ Apply nft script to tables, as parse_nft_ruleset() objects, as nft would """
+    for item in parse_nft_ruleset(script):
+        if item[0] == 'table':
+            if item[1] not in tables:
+                continue
+            objects = tables[item[1]]
+            for key, body in item[2].items():
+                if key[0] == 'table':
+                    continue
+                if key not in objects:
+                    objects[key] = list(body)
+                elif key[0] == 'chain':
+                    objects[key] += [line for line in body if line not in _nft_header('chain', body)]
+                else:
+                    head, elements = _nft_set_parts(objects[key])
+                    elements += _nft_set_parts(body)[1]
+                    objects[key] = [head, f'elements = {{ {", ".join(elements)} }}']
+            continue
+
+        match = re.fullmatch(r'(flush|delete) (chain|set|map) (\S+ \S+) (\S+)', item[1])
+        if match and match[3] in tables:
+            op, kind, table, name = match.groups()
+            objects = tables[table]
+            if op == 'delete':
+                del objects[(kind, name)]
+            elif kind == 'chain':
+                objects[(kind, name)] = _nft_header(kind, objects[(kind, name)])
+            else:
+                objects[(kind, name)] = [_nft_set_parts(objects[(kind, name)])[0]]
+            continue
+
+        match = re.fullmatch(r'(add|delete) element (\S+ \S+) (\S+) \{ (.*)', item[1])
+        if match and match[2] in tables:
+            op, table, name, text = match.groups()
+            changed = _nft_elements(text)[0]
+            head, elements = _nft_set_parts(tables[table][('set', name)])
+            if op == 'add':
+                elements += changed
+            else:
+                elements = [e for e in elements if e.split(' : ')[0] not in changed]
+            tables[table][('set', name)] = [head, f'elements = {{ {", ".join(elements)} }}']
+
+def managed_tables(text):
+    return {item[1]: item[2] for item in parse_nft_ruleset(text) if item[0] == 'table'
+            and f'delete table {item[1]}' in text}
+
+def synthetic_ruleset(chains, rules, change=None):
+    """ nft script as rendered for a firewall with chains * rules rules """
+    lines = ['table raw {', '    chain vyos_global_rpfilter {', '        return', '    }', '}',
+             'delete table ip vyos_filter', 'table ip vyos_filter {',
+             '    chain VYOS_FORWARD_filter {',
+             '        type filter hook forward priority filter; policy accept;']
+    lines += [f'        counter jump NAME_C{c} comment "ipv4-FWD-filter-{c}"' for c in range(chains)]
+    lines += ['    }']
+    for c in range(chains):
+        lines.append(f'    chain NAME_C{c} {{')
+        for r in range(rules):
+            port = 1 + (r if (c, r) != change else 65535 - r)
+            lines.append(f'        meta l4proto tcp ip saddr 10.{c}.{r >> 8}.{r & 0xff} tcp dport {{{port}}} '
+                         f'ip daddr @A_G{c} counter accept comment "ipv4-NAM-C{c}-{r}"')
+        lines += [f'        counter drop comment "C{c} default-action drop"', '    }']
+        lines += [f'    set A_G{c} {{', '        type ipv4_addr', '        flags interval',
+                  '        auto-merge', f'        elements = {{ 192.0.2.{c % 250} }}', '    }']
+    lines += ['}']
+    return '\n'.join(lines) + '\n'
+
+class TestRulesetDelta(TestCase):
+    def assertDelta(self, old, new):
+        delta = nft_ruleset_delta(old, new)
+        self.assertIsNotNone(delta)
+        tables = managed_tables(old)
+        load(tables, delta)
+        self.assertEqual({t: normalize(o) for t, o in tables.items()},
+                         {t: normalize(o) for t, o in managed_tables(new).items()})
+        return delta
+
+    def test_parse(self):
+        items = parse_nft_ruleset(render(firewall_config()))
+        self.assertEqual([item[1] for item in items if item[0] == 'statement'], [
+            'flush chain raw vyos_global_rpfilter', 'flush chain ip6 raw vyos_global_rpfilter',
+            'delete table ip vyos_filter', 'delete table ip6 vyos_filter',
+            'delete table bridge vyos_filter'])
+        objects = [item[2] for item in items if item[0] == 'table' and item[1] == 'ip vyos_filter'][0]
+        self.assertEqual(list(objects), [('table', ''), ('chain', 'VYOS_FORWARD_filter'),
+                                         ('chain', 'VYOS_FRAG_MARK'), ('chain', 'NAME_WAN'),
+                                         ('chain', 'NAME_OLD'), ('set', 'RECENT_NAM_WAN_20'),
+                                         ('set', 'A_SERVERS'), ('set', 'M_HOSTS')])
+        self.assertEqual(objects[('chain', 'NAME_OLD')], ['counter reject comment "OLD default-action reject"'])
+        self.assertEqual(_nft_set_parts(objects[('set', 'M_HOSTS')]),
+                         ('type ether_addr', ['00:53:00:00:00:01', '00:53:00:00:00:02']))
+
+    def test_delta(self):
+        config = firewall_config()
+        old = render(config)
+        self.assertEqual(nft_ruleset_delta(old, old), '')
+
+        config['ipv4']['name']['WAN']['rule']['10']['destination']['port'] = '2222'
+        del config['ipv4']['name']['OLD']
+        config['ipv4']['name']['LAN'] = {'default_action': 'accept'}
+        config['ipv4']['forward']['filter']['rule']['6'] = {'action': 'jump', 'jump_target': 'LAN'}
+        config['group']['address_group']['SERVERS']['address'].append('192.0.2.6')
+        config['group']['mac_group']['HOSTS']['mac_address'] = ['00:53:00:00:00:02', '00:53:00:00:00:03']
+        delta = self.assertDelta(old, render(config)).splitlines()
+
+        # unchanged chains, global rpfilter and dynamic sets are not touched
+        self.assertFalse([line for line in delta if 'VYOS_FRAG_MARK' in line or 'set RECENT' in line
+                          or 'rpfilter' in line])
+        self.assertEqual([line for line in delta if not line.startswith(' ')], [
+            'flush chain ip vyos_filter VYOS_FORWARD_filter',
+            'flush chain ip vyos_filter NAME_WAN',
+            'flush set ip vyos_filter A_SERVERS',
+            'delete element ip vyos_filter M_HOSTS { 00:53:00:00:00:01 }',
+            'flush chain ip vyos_filter NAME_OLD',
+            'table ip vyos_filter {', '}',
+            'add element ip vyos_filter M_HOSTS { 00:53:00:00:00:03 }',
+            'delete chain ip vyos_filter NAME_OLD',
+            'delete element ip6 vyos_filter M_HOSTS { 00:53:00:00:00:01 }',
+            'add element ip6 vyos_filter M_HOSTS { 00:53:00:00:00:03 }',
+            'delete element bridge vyos_filter M_HOSTS { 00:53:00:00:00:01 }',
+            'add element bridge vyos_filter M_HOSTS { 00:53:00:00:00:03 }'])
+
+        config['global_options']['source_validation'] = 'strict'
+        delta = self.assertDelta(old, render(config))
+        self.assertTrue(delta.startswith('flush chain raw vyos_global_rpfilter\n'))
+
+    def test_full_reload(self):
+        old = render(firewall_config())
+        # set declaration changed
+        self.assertIsNone(nft_ruleset_delta(old, old.replace('type ether_addr', 'type ipv4_addr')))
+        # first install, tables are not deleted
+        self.assertIsNone(nft_ruleset_delta(old.replace('delete table', '# delete table'), old))
+        self.assertIsNone(nft_ruleset_delta(old, old.replace('delete table', '# delete table')))
+
+    def test_large(self):
+        chains = 100
+        rules = 500
+        old = synthetic_ruleset(chains, rules)
+        new = synthetic_ruleset(chains, rules, change=(50, 10))
+
+        delta = nft_ruleset_delta(old, new)
+        # only the changed chain is reloaded
+        self.assertLessEqual(len(delta.splitlines()), rules + 10)
+        self.assertDelta(old, new)
+
+def large_config(rules, change=None):
+    config = firewall_config()
+    config['group']['port_group'] = {'WEB': {'port': ['80', '443']}}
+    config['ipv4']['name']['LARGE'] = {'default_action': 'drop', 'rule': {}}
+    for i in range(1, rules + 1):
+        port = '443' if i == change else str(1024 + i % 1000)
+        config['ipv4']['name']['LARGE']['rule'][str(i)] = {
+            'action': 'accept', 'protocol': 'tcp_udp', 'state': ['established', 'new'],
+            'source': {'address': f'10.{i >> 16 & 0xff}.{i >> 8 & 0xff}.{i & 0xff}',
+                       'port': '1024-65535'},
+            'destination': {'port': port, 'group': {'port_group': 'WEB'}},
+            'time': {'starttime': '08:00:00', 'stoptime': '18:00:00', 'weekdays': 'Mon,Fri'},
+            'limit': {'rate': '10/second', 'burst': '5'},
+            'log': {}, 'log_options': {'level': 'info'}}
+    return config
+
+class NoCache:
+    def rules(self, key, rules, render):
+        return [render(rule_id, rule_conf) for rule_id, rule_conf in rules.items()]
+
+class TestRuleCache(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'cache')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def render(self, config, cache=None):
+        # one commit, by default in a new process
+        if cache is None:
+            cache = RuleCache(self.filename)
+        with patch('vyos.firewall.rule_cache', cache):
+            text = render(config)
+        stats = (cache.hits, cache.misses)
+        cache.save()
+        return text, stats
+
+    def cached_chains(self):
+        cache = RuleCache(self.filename)
+        cache._load()
+        return cache._chains
+
+    def test_cache(self):
+        config = large_config(100)
+        text, (hits, rules) = self.render(config)
+        self.assertEqual(hits, 0)
+        self.assertGreater(rules, 100)
+        cached, stats = self.render(config)
+        self.assertEqual(cached, text)
+        self.assertEqual(stats, (rules, 0))
+
+        # only the changed rule of a chain is rendered again
+        text, stats = self.render(large_config(100, change=50))
+        self.assertIn('dport {443}', text)
+        self.assertEqual(stats, (rules - 1, 1))
+        with patch('vyos.firewall.rule_cache', NoCache()):
+            self.assertEqual(text, render(large_config(100, change=50)))
+
+        # chains not rendered any more expire
+        config = firewall_config()
+        for _ in range(RuleCache.expire):
+            self.render(config)
+        self.assertNotIn('nft_rule NAM LARGE ip', self.cached_chains())
+        self.assertIn('nft_rule FWD filter ip', self.cached_chains())
+
+    def test_long_lived(self):
+        # commits in the same process, as run by vyos-configd
+        cache = RuleCache(self.filename)
+        _, (_, rules) = self.render(large_config(100), cache)
+        _, stats = self.render(large_config(100, change=50), cache)
+        self.assertEqual(stats, (rules - 1, 1))
+
+        config = firewall_config()
+        _, (hits, misses) = self.render(config, cache)
+        for _ in range(RuleCache.expire):
+            _, stats = self.render(config, cache)
+            self.assertEqual(stats, (hits + misses, 0))
+        self.assertNotIn('nft_rule NAM LARGE ip', cache._chains)
+        self.assertIn('nft_rule FWD filter ip', cache._chains)
+        self.assertEqual(set(self.cached_chains()), set(cache._chains))
+
+    def test_version(self):
+        config = large_config(10)
+        self.render(config)
+        with patch.object(RuleCache, '_version', staticmethod(lambda: (0, 0))):
+            _, (hits, _) = self.render(config)
+        self.assertEqual(hits, 0)
+
+    def test_large(self):
+        rules = 50000
+        config = large_config(rules)
+        self.render(config)
+        config = large_config(rules, change=1000)
+        text, stats = self.render(config)
+        self.assertEqual(stats[1], 1)
+        with patch('vyos.firewall.rule_cache', NoCache()):
+            self.assertEqual(text, render(config))
+
+def nft_interval(selector, value):
+    # set element or value of an address or port match as integer interval
+    if selector.endswith('port'):
+        first, _, last = value.partition('-')
+        return int(first), int(last or first)
+    if '-' in value:
+        first, last = value.split('-')
+        return int(ip_address(first)), int(ip_address(last))
+    network = ip_network(value, strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+def nft_match(packet, selectors, value):
+    # match of packet by concatenated selectors, value is a set or a single value
+    keys = []
+    for selector in selectors:
+        proto, field = selector.split()
+        if proto in ['tcp', 'udp'] and packet['protocol'] != proto:
+            return False
+        keys.append(packet[field])
+    elements = re.split(r',\s*', value[1:-1].strip()) if value[0] == '{' else [value]
+    for element in elements:
+        if all(first <= key <= last for key, (first, last) in
+               zip(keys, (nft_interval(s, v) for s, v in zip(selectors, element.split(' . '))))):
+            return element
+    return None
+
+def nft_evaluate(rules, packet):
+    """
+    Evaluate the subset of nft rule syntax rendered for random_rules() for
+    packet, returns trace of (rule ids counted, verdict) up to the first
+    terminal verdict
+    """
+    trace = []
+    for rule in rules:
+        tokens = re.findall(r'\{[^}]*\}|"[^"]*"|\S+', rule)
+        ids = re.search(r'comment "\S+-(\S+)"$', rule)[1].split(',')
+        matched = True
+        verdict = None
+        while tokens and matched:
+            token = tokens.pop(0)
+            if token == 'ct':
+                tokens.pop(0)
+                matched = packet['state'] in tokens.pop(0)[1:-1].split(',')
+            elif token == 'meta':
+                tokens.pop(0)
+                matched = packet['protocol'] in re.findall(r'\w+', tokens.pop(0))
+            elif token in ['ip', 'ip6', 'tcp', 'udp', 'th']:
+                selectors = [f'{token} {tokens.pop(0)}']
+                while tokens[0] == '.':
+                    tokens.pop(0)
+                    selectors.append(f'{tokens.pop(0)} {tokens.pop(0)}')
+                if tokens[0] == 'vmap':
+                    tokens.pop(0)
+                    values = dict(item.split(' : ') for item in tokens.pop(0)[1:-1].strip().split(', '))
+                    element = nft_match(packet, selectors, '{' + ', '.join(values) + '}')
+                    matched = element is not None
+                    verdict = values.get(element)
+                elif tokens[0] == '!=':
+                    tokens.pop(0)
+                    matched = nft_match(packet, selectors, tokens.pop(0)) is None
+                else:
+                    matched = nft_match(packet, selectors, tokens.pop(0)) is not None
+            elif token == 'log':
+                tokens[:2] = []
+            elif token == 'counter':
+                trace.append(ids)
+            elif token in ['accept', 'drop', 'reject', 'continue', 'return']:
+                verdict = token
+            elif token == 'jump':
+                verdict = f'jump {tokens.pop(0)}'
+            elif token == 'comment':
+                tokens.pop(0)
+            else:
+                raise ValueError(f'unknown token {token} in "{rule}"')
+        if matched and verdict:
+            trace.append(verdict)
+            if verdict != 'continue':
+                break
+    return trace
+
+def random_value(rng, family, node):
+    if node == 'port':
+        first = rng.randint(1, 30)
+        return rng.choice([str(first), f'{first}-{first + rng.randint(1, 4)}',
+                           f'{first},{first + 10}', f'!{first}'])
+    net = rng.randint(0, 3)
+    host = rng.randint(0, 15)
+    prefix = '2001:db8:{}::'.format(net) if family == 'ip6' else f'10.0.{net}.'
+    length = 125 if family == 'ip6' else 29
+    return rng.choice([f'{prefix}{host}', f'{prefix}{host}', f'{prefix}{host & ~7}/{length}',
+                       f'{prefix}{host}-{prefix}{host + 3}', f'{prefix}{host}/{length}',
+                       f'!{prefix}{host}'])
+
+def random_rules(rng, family, count):
+    # blocks of rules only differing in some of their addresses, ports and actions
+    rules = {}
+    rule_id = 0
+    while len(rules) < count:
+        base = {'action': rng.choice(['accept', 'drop', 'reject', 'continue', 'return', 'jump']),
+                'protocol': rng.choice(['tcp', 'tcp', 'udp', 'tcp_udp'])}
+        if rng.random() < 0.2:
+            base['state'] = rng.choice([['established'], ['new', 'related']])
+        if rng.random() < 0.1:
+            base['log'] = {}
+        fields = rng.sample([('source', 'address'), ('destination', 'address'),
+                             ('source', 'port'), ('destination', 'port')], rng.randint(0, 3))
+        actions = rng.random() < 0.3
+        for _ in range(rng.randint(1, 12)):
+            rule_id += rng.choice([1, 1, 10])
+            rule_conf = dict(base)
+            for side, node in fields:
+                rule_conf.setdefault(side, {})[node] = random_value(rng, family, node)
+            if actions:
+                rule_conf['action'] = rng.choice(['accept', 'drop', 'jump'])
+            if rule_conf['action'] == 'jump':
+                rule_conf['jump_target'] = rng.choice(['A', 'B'])
+            rules[str(rule_id)] = rule_conf
+    return rules
+
+def random_packet(rng, family):
+    net = rng.randint(0, 4)
+    prefix = '2001:db8:{}::'.format(net) if family == 'ip6' else f'10.0.{net}.'
+    return {'protocol': rng.choice(['tcp', 'udp']),
+            'state': rng.choice(['established', 'new', 'related']),
+            'saddr': int(ip_address(f'{prefix}{rng.randint(0, 20)}')),
+            'daddr': int(ip_address(f'{prefix}{rng.randint(0, 20)}')),
+            'sport': rng.randint(1, 40), 'dport': rng.randint(1, 40)}
+
+def render_rules(rules, family, optimize):
+    if optimize:
+        rules = optimize_rules(rules, 'NAM', 'TEST', family)
+    return [parse_optimized_rule(rule_conf, 'NAM', 'TEST', rule_id, family)
+            for rule_id, rule_conf in rules.items()]
+
+class TestRulesetOptimizer(TestCase):
+    def test_optimize(self):
+        rules = {'10': {'action': 'accept', 'protocol': 'tcp', 'source': {'address': '192.0.2.1'},
+                        'destination': {'port': '22'}},
+                 '20': {'action': 'accept', 'protocol': 'tcp', 'source': {'address': '192.0.2.2'},
+                        'destination': {'port': '22'}},
+                 '30': {'action': 'accept', 'protocol': 'tcp', 'source': {'address': '192.0.2.0/28'},
+                        'destination': {'port': '80,443'}},
+                 '40': {'action': 'jump', 'jump_target': 'WEB', 'protocol': 'tcp',
+                        'source': {'address': '192.0.2.16/28'}, 'destination': {'port': '80,443'}},
+                 # overlaps rule 30
+                 '50': {'action': 'drop', 'protocol': 'tcp', 'source': {'address': '192.0.2.5'},
+                        'destination': {'port': '443'}},
+                 '60': {'action': 'drop', 'protocol': 'tcp', 'source': {'address': '192.0.2.6'},
+                        'destination': {'port': '443'}, 'log': {}},
+                 '70': {'action': 'reject', 'destination': {'address': '198.51.100.1'}},
+                 '80': {'action': 'reject', 'destination': {'address': '198.51.100.2-198.51.100.9'}}}
+        self.assertEqual(render_rules(rules, 'ip', True), [
+            'meta l4proto  tcp ip saddr . tcp dport { 192.0.2.1 . 22, 192.0.2.2 . 22, '
+            '192.0.2.0/28 . 80, 192.0.2.0/28 . 443, 192.0.2.16/28 . 80, 192.0.2.16/28 . 443 } '
+            'counter ip saddr . tcp dport vmap { 192.0.2.1 . 22 : accept, 192.0.2.2 . 22 : accept, '
+            '192.0.2.0/28 . 80 : accept, 192.0.2.0/28 . 443 : accept, '
+            '192.0.2.16/28 . 80 : jump NAME_WEB, 192.0.2.16/28 . 443 : jump NAME_WEB } '
+            'comment "ipv4-NAM-TEST-10,20,30,40"',
+            render_rules({'50': rules['50']}, 'ip', False)[0],
+            render_rules({'60': rules['60']}, 'ip', False)[0],
+            'ip daddr { 198.51.100.1, 198.51.100.2-198.51.100.9 } counter reject '
+            'comment "ipv4-NAM-TEST-70,80"'])
+
+        # comments are limited to 128 bytes
+        rules = {str(i): {'action': 'accept', 'source': {'address': f'10.0.{i >> 8}.{i & 0xff}'}}
+                 for i in range(1000, 1100)}
+        optimized = optimize_rules(rules, 'NAM', 'TEST')
+        self.assertEqual(sum(len(rule_id.split(',')) for rule_id in optimized), 100)
+        self.assertLess(len(optimized), 10)
+        self.assertTrue(all(len(f'ipv4-NAM-TEST-{rule_id}') <= 128 for rule_id in optimized))
+
+    def test_verdicts(self):
+        rng = Random(0)
+        for family in ['ip', 'ip6']:
+            merged = 0
+            forms = set()
+            for _ in range(50):
+                rules = random_rules(rng, family, 40)
+                plain = render_rules(rules, family, False)
+                optimized = render_rules(rules, family, True)
+                merged += len(plain) - len(optimized)
+                forms |= {form for rule in optimized for form in [' . ', ' vmap '] if form in rule}
+                for _ in range(200):
+                    packet = random_packet(rng, family)
+                    expected = nft_evaluate(plain, packet)
+                    trace = nft_evaluate(optimized, packet)
+                    self.assertEqual(len(trace), len(expected), (packet, plain, optimized))
+                    for item, expected_item in zip(trace, expected):
+                        # merged rules share a counter, its comment has the ids of all rules
+                        if isinstance(expected_item, list):
+                            self.assertIn(expected_item[0], item)
+                        else:
+                            self.assertEqual(item, expected_item)
+            self.assertGreater(merged, 200)
+            self.assertEqual(forms, {' . ', ' vmap '})
+
+    def test_render(self):
+        config = firewall_config()
+        rules = config['ipv4']['name']['WAN']['rule']
+        rules['11'] = dict(rules['10'], destination={'port': '80'})
+        config['ipv4']['name']['WAN']['rule'] = {rule_id: rules[rule_id] for rule_id in ['10', '11', '20']}
+        self.assertNotIn('dport { 22, 80 }', render(config))
+        config['global_options']['ruleset_optimize'] = {}
+        with TemporaryDirectory() as tmpdir:
+            cache = RuleCache(os.path.join(tmpdir, 'cache'))
+            with patch('vyos.firewall.rule_cache', cache):
+                text = render(config)
+                self.assertEqual(render(config), text)
+        self.assertIn('meta l4proto  tcp tcp dport { 22, 80 } ip saddr 10.0.0.0/8 counter accept '
+                      'comment "ipv4-NAM-WAN-10,11"', text)
+        # chains are optimized and cached as a whole
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_large(self):
+        rules = {str(i): {'action': 'accept', 'protocol': 'tcp',
+                          'source': {'address': f'10.{i >> 16 & 0xff}.{i >> 8 & 0xff}.{i & 0xff}'},
+                          'destination': {'port': str(1024 + i % 1000)}}
+                 for i in range(1, 50001)}
+        optimized = render_rules(rules, 'ip', True)
+        self.assertLess(len(optimized), len(rules) // 10)
+
+def fake_geoip_rows(rng, count):
+    # consecutive address ranges of random countries, as in the DB-IP database
+    codes = ['DE', 'FR', 'NL', 'US', 'JP']
+    rows = []
+    for family, first, bits in [(4, int(ip_address('1.0.0.0')), 32),
+                                (6, int(ip_address('2001::')), 128)]:
+        for _ in range(count // 2):
+            last = first + rng.choice([0, 255, 1023, rng.randint(1, 1 << (bits - 24))])
+            rows.append((str(ip_address(first)), str(ip_address(last)), rng.choice(codes)))
+            first = last + 1 + rng.choice([0, 0, 0, 4096])
+    return rows
+
+def write_geoip_database(filename, rows):
+    with gzip.open(filename, 'wt') as f:
+        f.write(''.join(f'{start},{end},{code}\n' for start, end, code in rows))
+
+def expected_ranges(rows, codes, ipv6):
+    # merged ranges of countries, computed with ipaddress
+    ranges = sorted((int(ip_address(start)), int(ip_address(end))) for start, end, code in rows
+                    if code.lower() in codes and ip_address(start).version == (6 if ipv6 else 4))
+    out = []
+    for first, last in ranges:
+        if out and first == out[-1][1] + 1:
+            out[-1][1] = last
+        else:
+            out.append([first, last])
+    return [tuple(r) for r in out]
+
+class TestGeoIP(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.database = os.path.join(self.tmpdir.name, 'dbip-country-lite.csv.gz')
+        self.ranges = os.path.join(self.tmpdir.name, 'ranges')
+        os.mkdir(self.ranges)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_compile(self):
+        rows = fake_geoip_rows(Random(0), 2000)
+        write_geoip_database(self.database, rows)
+        directory = geoip_compile(self.database, self.ranges)
+        for code, ipv6 in [('de', False), ('us', True), ('jp', False)]:
+            self.assertEqual(geoip_load_ranges(directory, code, ipv6),
+                             expected_ranges(rows, [code], ipv6))
+        self.assertEqual(geoip_load_ranges(directory, 'it'), [])
+        self.assertEqual(geoip_elements([(1, 1), (256, 511)]), ['0.0.0.1', '0.0.1.0-0.0.1.255'])
+        self.assertEqual(geoip_elements([(1, 2)], ipv6=True), ['::1-::2'])
+
+        # compiled once per database version
+        self.assertEqual(geoip_compile(self.database, self.ranges), directory)
+        write_geoip_database(self.database, rows[:10])
+        os.utime(self.database, ns=(0, 0))
+        new_directory = geoip_compile(self.database, self.ranges)
+        self.assertNotEqual(new_directory, directory)
+        self.assertEqual(os.listdir(self.ranges), [os.path.basename(new_directory)])
+
+    def update(self, firewall):
+        rendered = {}
+        def render_file(filename, template, data):
+            rendered['text'] = render_to_string(template, data, location=templates)
+        with patch('vyos.firewall.geoip_database', self.database), \
+                patch('vyos.firewall.geoip_ranges', self.ranges), \
+                patch('vyos.firewall.geoip_lock_file', os.path.join(self.tmpdir.name, 'lock')), \
+                patch('vyos.firewall.render', render_file), \
+                patch('vyos.firewall.run', lambda command: 0):
+            self.assertTrue(geoip_update(firewall))
+        return rendered['text']
+
+    def test_update(self):
+        rows = fake_geoip_rows(Random(1), 2000)
+        write_geoip_database(self.database, rows)
+        firewall = {'ipv4': {'name': {'WAN': {'rule': {'10': {'source': {'geoip': {
+                        'country_code': ['de', 'fr']}}}}}}},
+                    'ipv6': {'forward': {'filter': {'rule': {'5': {'destination': {'geoip': {
+                        'country_code': ['us']}}}}}}, 'name': {'EMPTY': {'rule': {'1': {
+                        'source': {'geoip': {'country_code': ['it']}}}}}}}}
+        text = self.update(firewall)
+        elements = geoip_elements(expected_ranges(rows, ['de', 'fr'], False))
+        self.assertIn('set GEOIP_CC_name_WAN_10 {\n        type ipv4_addr\n        flags interval\n'
+                      f'        elements = {{ {",".join(elements)} }}', text)
+        elements = geoip_elements(expected_ranges(rows, ['us'], True), ipv6=True)
+        self.assertIn(f'        elements = {{ {",".join(elements)} }}', text)
+        # sets without any ranges are flushed
+        self.assertIn('flush set ip6 vyos_filter GEOIP_CC6_name_EMPTY_1', text)
+        self.assertIn('set GEOIP_CC6_name_EMPTY_1 {\n        type ipv6_addr\n        flags interval\n    }',
+                      text)
+
+    def test_compiled_once(self):
+        rows = fake_geoip_rows(Random(2), 20000)
+        write_geoip_database(self.database, rows)
+        firewall = {'ipv4': {'name': {'WAN': {'rule': {'10': {'source': {'geoip': {
+                        'country_code': ['de', 'fr', 'us']}}}}}}},
+                    'ipv6': {'name': {'WAN': {'rule': {'10': {'source': {'geoip': {
+                        'country_code': ['de', 'fr', 'us']}}}}}}}}
+        with patch('gzip.open', wraps=gzip.open) as gzip_open:
+            text = self.update(firewall)
+            self.assertEqual(gzip_open.call_count, 1)
+            # later updates only read the compiled ranges, not the CSV
+            self.assertEqual(self.update(firewall), text)
+            self.assertEqual(gzip_open.call_count, 1)
@@ -0,0 +1,246 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import json
+import random
+import socket
+import threading
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from vyos.frr import FRRConfig
+from vyos.frr import VtyClient
+from vyos.frr import execute_json
+from vyos.frr import _config_delta
+from vyos.frr import _find_first_block
+from vyos.frr import _find_first_element
+
+running_config = '''frr version 9.1
+frr defaults traditional
+hostname vyos
+service integrated-vtysh-config
+!
+ip prefix-list PL seq 5 permit 192.0.2.0/24
+ip prefix-list PL seq 10 permit 198.51.100.0/24
+!
+route-map RM-IN permit 10
+ match ip address prefix-list PL
+ set local-preference 200
+exit
+!
+route-map RM-OUT deny 10
+exit
+!
+interface eth1
+ ip ospf cost 20
+exit
+!
+end'''
+
+new_policy = '''ip prefix-list PL seq 5 permit 192.0.2.0/24
+ip prefix-list PL seq 15   permit 203.0.113.0/24
+!
+route-map RM-IN permit 10
+ match ip address prefix-list PL
+ set local-preference 300
+exit
+!'''
+
+def interface_config(count):
+    config = ['frr version 9.1', 'frr defaults traditional', 'hostname vyos', '!']
+    for i in range(count):
+        config += [f'interface eth0.{i}', ' ip ospf cost 10', ' ip ospf dead-interval 40', 'exit', '!']
+    config += ['router ospf', ' ospf router-id 192.0.2.1', 'exit', '!', 'line vty', '!', 'end']
+    return config
+
+def list_modify_section(config, start_pattern, replacement='!', stop_pattern=r'\S+',
+                        remove_stop_mark=False, count=0):
+    # plain list implementation modify_section was derived from
+    replacement = replacement.split('\n')
+    _count = 0
+    _next_start = 0
+    while not count or count > _count:
+        _w = _find_first_block(config, start_pattern + '$', stop_pattern, start_at=_next_start)
+        if not _w:
+            break
+        start, end = _w
+        del config[start:end + 1 if remove_stop_mark else end]
+        config[start:start] = replacement
+        _count += 1
+        _next_start = start + len(replacement)
+    return _count
+
+class TestFRRConfig(TestCase):
+    def test_modify_section(self):
+        random.seed(4711)
+        config = interface_config(50)
+        frr_cfg = FRRConfig(config)
+        ops = [(rf'^interface eth0\.{i}', {'stop_pattern': '^exit', 'remove_stop_mark': True})
+               for i in random.sample(range(60), 40)]
+        ops += [(r'^interface eth0.1\d', {'stop_pattern': '^exit', 'remove_stop_mark': True}),
+                (r'^!', {'replacement': '', 'count': 3}),
+                (r' ip ospf cost \d+', {'replacement': ' ip ospf cost 5'}),
+                (r'^router ospf', {'replacement': 'router ospf\n ospf router-id 192.0.2.2\nexit',
+                                   'stop_pattern': '^exit', 'remove_stop_mark': True}),
+                (r'^interface .*', {'stop_pattern': r'(\s|!)'})]
+        for pattern, kwargs in ops:
+            self.assertEqual(frr_cfg.modify_section(pattern, **kwargs),
+                             list_modify_section(config, pattern, **kwargs))
+            self.assertEqual(frr_cfg.config, config)
+
+        addition = 'ip prefix-list PL seq 5 permit 192.0.2.0/24'
+        self.assertTrue(frr_cfg.add_before(r'(route-map .*|line vty|end)', addition))
+        i = _find_first_element(config, r'(route-map .*|line vty|end)')
+        config[i:i] = [addition]
+        self.assertEqual(frr_cfg.config, config)
+        self.assertTrue(frr_cfg.modify_section(rf'^{re.escape(addition)}'))
+
+    def test_modify_section_scale(self):
+        count = 4000
+        frr_cfg = FRRConfig(interface_config(count))
+        for i in range(count):
+            self.assertEqual(frr_cfg.modify_section(rf'^interface eth0\.{i}', stop_pattern='^exit',
+                                                    remove_stop_mark=True), 1)
+        self.assertNotIn('interface eth0.42', frr_cfg.config)
+        self.assertIn('router ospf', frr_cfg.config)
+
+    def test_delta(self):
+        frr_cfg = FRRConfig(running_config)
+        frr_cfg.modify_section(r'^ip prefix-list .*')
+        frr_cfg.modify_section(r'^route-map .*', stop_pattern='^exit',
+                               remove_stop_mark=True)
+        frr_cfg.modify_section(r'^interface eth1', stop_pattern='^exit',
+                               remove_stop_mark=True)
+        frr_cfg.add_before(r'(end)', new_policy)
+
+        self.assertEqual(_config_delta(frr_cfg.original_config, frr_cfg.config), [
+            'no ip prefix-list PL seq 10 permit 198.51.100.0/24',
+            'no route-map RM-OUT deny 10',
+            'interface eth1', 'no ip ospf cost 20', 'exit',
+            'ip prefix-list PL seq 15 permit 203.0.113.0/24',
+            'route-map RM-IN permit 10', 'no set local-preference 200',
+            'set local-preference 300', 'exit',
+        ])
+
+    def test_delta_unchanged(self):
+        frr_cfg = FRRConfig(running_config)
+        self.assertEqual(_config_delta(frr_cfg.original_config, frr_cfg.config), [])
+
+    def test_delta_nested(self):
+        bgp = ['router bgp 65000', ' neighbor 192.0.2.1 remote-as 65001',
+               ' address-family ipv4 unicast', '  network 192.0.2.0/24',
+               ' exit-address-family', 'exit', '!']
+        config = bgp + ['ip prefix-list PL seq 5 permit 192.0.2.0/24']
+        self.assertEqual(_config_delta(config, config), [])
+        # unchanged nested stanzas do not prevent a delta
+        self.assertEqual(_config_delta(config, bgp + ['ip prefix-list PL seq 5 deny any']), [
+            'no ip prefix-list PL seq 5 permit 192.0.2.0/24',
+            'ip prefix-list PL seq 5 deny any'])
+        self.assertEqual(_config_delta(config, config[6:]), ['no router bgp 65000'])
+
+        changed = list(config)
+        changed[3] = '  network 198.51.100.0/24'
+        self.assertIsNone(_config_delta(config, changed))
+        self.assertIsNone(_config_delta(config[6:], config))
+
+    def test_delta_normalized(self):
+        # as shown by FRR
+        running = ['ip prefix-list PL seq 5 permit any',
+                   'ip prefix-list PL seq 10 permit 192.0.2.0/24 le 32',
+                   'ipv6 prefix-list PL6 seq 5 permit 2001:db8::/32 ge 48',
+                   'ipv6 prefix-list PL6 seq 10 deny any']
+        # as rendered from the CLI config
+        rendered = ['ip prefix-list PL seq 5 permit 0.0.0.0/0  le 32',
+                    'ip prefix-list PL seq 10 permit 192.0.2.0/24  le 32',
+                    'ipv6 prefix-list PL6 seq 5 permit 2001:DB8:0::/32 ge 48 ',
+                    'ipv6 prefix-list PL6 seq 10 deny ::/0  le 128']
+        self.assertEqual(_config_delta(running, rendered), [])
+        self.assertEqual(_config_delta(running, rendered[1:]),
+                         ['no ip prefix-list PL seq 5 permit any'])
+
+class FakeVtyDaemon(threading.Thread):
+    # answers commands on a vty socket like an FRR daemon in vtysh mode
+    def __init__(self, path):
+        super().__init__(daemon=True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.connections = 0
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            buf = b''
+            with conn:
+                while True:
+                    data = conn.recv(4096)
+                    if not data:
+                        break
+                    buf += data
+                    while b'\0' in buf:
+                        command, buf = buf.split(b'\0', 1)
+                        conn.sendall(self.reply(command.decode()))
+
+    @staticmethod
+    def reply(command):
+        if command == 'show bgp summary json':
+            # large enough to span several reads
+            peers = {f'192.0.2.{i}': {'state': 'Established'} for i in range(250)}
+            return json.dumps({'ipv4Unicast': {'peers': peers}}).encode() + b'\0\0\0\0'
+        if command == 'show version':
+            return b'FRRouting 9.1\r\n\0\0\0\0'
+        return b'% Unknown command: ' + command.encode() + b'\0\0\0\2'
+
+class TestVtyClient(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.daemon = FakeVtyDaemon(os.path.join(self.tmpdir.name, 'bgpd.vty'))
+        self.daemon.start()
+
+    def tearDown(self):
+        self.daemon.server.close()
+        self.tmpdir.cleanup()
+
+    def test_execute(self):
+        client = VtyClient('bgpd', path=self.tmpdir.name)
+        for _ in range(10):
+            self.assertEqual(client.execute('show version'), 'FRRouting 9.1')
+            summary = json.loads(client.execute('show bgp summary json'))
+            self.assertEqual(len(summary['ipv4Unicast']['peers']), 250)
+        with self.assertRaises(OSError) as e:
+            client.execute('show foo')
+        self.assertEqual(e.exception.errno, 2)
+        self.assertEqual(self.daemon.connections, 1)
+
+        # reconnect once the connection is gone
+        client._sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(client.execute('show version'), 'FRRouting 9.1')
+        self.assertEqual(self.daemon.connections, 2)
+        client.close()
+
+    def test_execute_json(self):
+        client = VtyClient('bgpd', path=self.tmpdir.name)
+        with patch.dict('vyos.frr._vty_clients', {'bgpd': client}):
+            summary = execute_json('show bgp summary', daemon='bgpd')
+            self.assertEqual(len(summary['ipv4Unicast']['peers']), 250)
+            self.assertEqual(execute_json('show bgp summary json', daemon='bgpd'), summary)
+        client.close()
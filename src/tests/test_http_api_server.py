@@ -0,0 +1,95 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+
+from stat import S_IMODE
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(__file__))
+from helper import prepare_module
+
+services_dir = os.path.join(os.path.dirname(__file__), '..', 'services')
+sys.path.append(services_dir)
+prepare_module(os.path.join(services_dir, 'vyos-http-api-server'), 'http_api_server')
+import http_api_server as server
+
+class TestConfigSnapshot(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.stamp = os.path.join(self.tmp.name, 'vyos-commit-stamp')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def init_stamp(self):
+        with patch.object(server, 'commit_stamp', self.stamp), \
+             patch('vyos.utils.file.chown') as chown:
+            server.ConfigSnapshot.init_stamp()
+        chown.assert_called_once_with(self.stamp, None, 'vyattacfg')
+
+    def test_init_stamp(self):
+        # the post-commit hook of non-root users has to be able to touch it
+        self.init_stamp()
+        self.assertEqual(S_IMODE(os.stat(self.stamp).st_mode), 0o664)
+
+    def test_init_stamp_existing(self):
+        with open(self.stamp, 'w'):
+            pass
+        os.chmod(self.stamp, 0o644)
+
+        self.init_stamp()
+        self.assertEqual(S_IMODE(os.stat(self.stamp).st_mode), 0o664)
+        self.assertEqual(os.path.getsize(self.stamp), 0)
+
+    def cli_shell_api(self, command, *args, **kwargs):
+        # showConfig of the session in os.environ, if any
+        if '--show-active-only' in command or 'VYATTA_CONFIG_TMP' not in os.environ:
+            return self.active
+        return self.working
+
+    def query(self, snapshot, path):
+        with patch.object(server, 'commit_stamp', self.stamp), \
+             patch.object(server, 'cmd', self.cli_shell_api), \
+             patch.object(server, 'boot_configuration_complete', lambda: True):
+            return snapshot.query(lambda c: c.return_value(path))
+
+    def test_query(self):
+        self.init_stamp()
+        self.active = 'system {\n    host-name vyos\n}\n'
+        snapshot = server.ConfigSnapshot()
+        self.assertEqual(self.query(snapshot, 'system host-name'), 'vyos')
+
+        # committed
+        self.active = 'system {\n    host-name router\n}\n'
+        self.assertEqual(self.query(snapshot, 'system host-name'), 'vyos')
+        os.utime(self.stamp, ns=(0, 0))
+        self.assertEqual(self.query(snapshot, 'system host-name'), 'router')
+
+    def test_query_pending(self):
+        self.init_stamp()
+        self.active = 'system {\n    host-name vyos\n}\n'
+        snapshot = server.ConfigSnapshot()
+        # /configure set, not committed yet, in the API session which
+        # ConfigSession put into os.environ
+        self.working = 'system {\n    host-name router\n}\n'
+        env = {'VYATTA_CONFIG_TMP': '/tmp/vyos-api-session', 'UNIONFS': 'unionfs'}
+        with patch.dict(os.environ, env):
+            self.assertEqual(self.query(snapshot, 'system host-name'), 'vyos')
+            # discarded: the stamp is not touched, nothing stale is cached
+            self.working = self.active
+            self.assertEqual(self.query(snapshot, 'system host-name'), 'vyos')
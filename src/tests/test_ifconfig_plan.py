@@ -0,0 +1,184 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from vyos.ifconfig import ApplyPlan
+from vyos.ifconfig import Control
+from vyos.ifconfig import DummyIf
+
+vlan_count = 4000
+
+def nft_map(elements):
+    # 'nft -j list map' output
+    return json.dumps({'nftables': [{'map': {'elem': [
+        [key, {'jump': {'target': target}}] for key, target in elements.items()]}}]})
+
+def vlan_config(vlans):
+    config = {'ifname': 'dum0', 'mtu': '1500', 'address': ['192.0.2.1/24'],
+              'address_old': ['192.0.2.9/24'], 'ip': {'adjust_mss': '1400'}, 'vif': {}}
+    for i in range(1, vlans + 1):
+        config['vif'][str(i)] = {'ifname': f'dum0.{i}', 'mtu': '1500',
+                                 'address': [f'10.{i >> 8}.{i & 0xff}.1/24'],
+                                 'description': f'customer {i}'}
+    return config
+
+class FakeSystem:
+    """ ip, nft, tc, systemctl and sysfs as used by ApplyPlan """
+    def __init__(self):
+        self.links = [{'ifname': 'dum0', 'flags': ['BROADCAST', 'NOARP'], 'mtu': 1500,
+                       'address': '00:53:00:00:00:10', 'operstate': 'DOWN',
+                       'linkinfo': {'info_kind': 'dummy'}}]
+        self.addrs = [{'ifname': 'dum0', 'addr_info': [
+            {'family': 'inet', 'local': '192.0.2.9', 'prefixlen': 24}]}]
+        self.maps = {'raw VYOS_TCP_MSS_IFACES': {'dum0': 'VYOS_TCP_MSS_1300'}}
+        self.sysfs = {}
+        self.commands = []
+        self.batches = []
+
+    def cmd(self, command, flag='', input=None, **kwargs):
+        self.commands.append(command)
+        if command == 'ip -json addr show':
+            return json.dumps(self.addrs)
+        if command == 'ip -json -detail -statistics link show':
+            return json.dumps(self.links)
+        if command.startswith('systemctl list-units'):
+            return ''
+        if command == 'tc -json qdisc show':
+            return '[]'
+        if command in ['ip -batch -', 'nft -f -']:
+            self.batches.append((command, input.splitlines()))
+            return ''
+        raise ValueError(command)
+
+    def rc_cmd(self, command, **kwargs):
+        self.commands.append(command)
+        if command.startswith('nft -j list map '):
+            return 0, nft_map(self.maps.get(command[16:], {}))
+        raise ValueError(command)
+
+    def write_sysfs(self, filename, value):
+        self.batches.append(('sysfs', [filename]))
+        self.sysfs[filename] = value
+
+    def applied(self, plan):
+        # system state after the plan has been applied
+        self.links = list(plan._link.values())
+        self.addrs = [{'ifname': ifname, 'addr_info': [
+            {'family': 'inet6' if ':' in addr else 'inet', 'local': addr.split('/')[0],
+             'prefixlen': int(addr.split('/')[1])} for addr in addrs]}
+            for ifname, addrs in plan._addr.items()]
+        self.maps = {'raw VYOS_TCP_MSS_IFACES': {'dum0': 'VYOS_TCP_MSS_1400'}}
+        self.commands = []
+        self.batches = []
+
+def no_process(command, *args, **kwargs):
+    raise AssertionError(f'"{command}" executed outside of the plan')
+
+class TestApplyPlan(TestCase):
+    def setUp(self):
+        self.system = FakeSystem()
+        self.patches = [
+            patch('vyos.ifconfig.snapshot.cmd', self.system.cmd),
+            patch('vyos.ifconfig.plan.cmd', self.system.cmd),
+            patch('vyos.ifconfig.plan.rc_cmd', self.system.rc_cmd),
+            patch('vyos.ifconfig.plan._write_sysfs', self.system.write_sysfs),
+            patch('vyos.ifconfig.control.cmd', no_process),
+            patch('vyos.ifconfig.control.popen', no_process),
+            patch.object(Control, '_read_sysfs', lambda _, filename: self.system.sysfs.get(filename)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def update(self, config):
+        with ApplyPlan.update('dum0') as plan:
+            DummyIf('dum0').update(config)
+        return plan
+
+    def test_update(self):
+        plan = self.update(vlan_config(2))
+        self.assertIsNone(ApplyPlan.active)
+        self.assertEqual([kind for kind, _ in self.system.batches if kind != 'sysfs'],
+                         ['ip -batch -', 'ip -batch -', 'nft -f -'])
+
+        ip = self.system.batches[0][1]
+        self.assertEqual(ip[:3], ['addr del 192.0.2.9/24 dev dum0',
+                                  'addr add 192.0.2.1/24 dev dum0 brd +',
+                                  'addr add fe80::253:ff:fe00:10/64 dev dum0'])
+        self.assertEqual(ip[3:6], ['link add link dum0 name dum0.1 type vlan id 1',
+                                   'link set dev dum0.1 alias "customer 1"',
+                                   'addr add 10.0.1.1/24 dev dum0.1 brd +'])
+        # MTU is inherited from the parent, admin state is deferred
+        self.assertFalse([line for line in ip if ' mtu ' in line or line.endswith(' up')])
+        self.assertEqual(self.system.batches[-2][1], ['link set dev dum0 up',
+                                                      'link set dev dum0.1 up',
+                                                      'link set dev dum0.2 up'])
+        self.assertEqual(self.system.batches[-1][1], [
+            'add chain raw VYOS_TCP_MSS_1400',
+            'flush chain raw VYOS_TCP_MSS_1400',
+            'add rule raw VYOS_TCP_MSS_1400 tcp option maxseg size 1401-65535 '
+            'tcp option maxseg size set 1400',
+            'delete element raw VYOS_TCP_MSS_IFACES { "dum0" }',
+            'add element raw VYOS_TCP_MSS_IFACES { "dum0" : jump VYOS_TCP_MSS_1400 }'])
+        self.assertEqual(self.system.sysfs['/proc/sys/net/ipv4/neigh/dum0.2/base_reachable_time_ms'],
+                         '30000')
+        self.assertEqual(set(plan.timing), {'dum0', 'dum0.1', 'dum0.2'})
+
+    def test_noop(self):
+        config = vlan_config(2)
+        plan = self.update(config)
+        self.system.applied(plan)
+
+        del config['address_old']
+        self.update(config)
+        self.assertEqual(self.system.batches, [])
+
+        config['vif']['2']['mtu'] = '1400'
+        config['vif']['2']['ip'] = {'disable_forwarding': {}}
+        self.update(config)
+        self.assertEqual(self.system.batches, [
+            ('ip -batch -', ['link set dev dum0.2 mtu 1400']),
+            ('sysfs', ['/proc/sys/net/ipv4/conf/dum0.2/forwarding'])])
+
+    def test_error(self):
+        def fail(command, flag='', input=None, **kwargs):
+            if command == 'ip -batch -':
+                raise OSError('ip batch failed')
+            return self.system.cmd(command, flag, input, **kwargs)
+
+        with patch('vyos.ifconfig.plan.cmd', fail):
+            with self.assertRaisesRegex(ValueError, 'invalid VLAN'):
+                with ApplyPlan.update('dum0'):
+                    DummyIf('dum0').update(vlan_config(2))
+                    raise ValueError('invalid VLAN')
+        self.assertIsNone(ApplyPlan.active)
+
+    def test_scale(self):
+        config = vlan_config(vlan_count)
+        plan = self.update(config)
+        # commands executed do not depend on the number of interfaces
+        self.assertLess(len(self.system.commands), 20)
+
+        self.system.applied(plan)
+        del config['address_old']
+        self.update(config)
+        self.assertLess(len(self.system.commands), 20)
+        self.assertEqual(self.system.batches, [])
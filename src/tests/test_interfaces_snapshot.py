@@ -0,0 +1,173 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.ifconfig.snapshot
+
+sys.path.append(os.path.dirname(__file__))
+from helper import prepare_module
+
+op_mode_dir = os.path.join(os.path.dirname(__file__), '..', 'op_mode')
+prepare_module(os.path.join(op_mode_dir, 'interfaces.py'), 'op_mode_interfaces')
+import op_mode_interfaces as interfaces
+
+vlan_count = 4000
+
+def fake_dump(vlans):
+    # interfaces as dumped by 'ip -json addr show' and
+    # 'ip -json -detail -statistics link show'
+    addr = [{'ifindex': 1, 'ifname': 'lo', 'flags': ['LOOPBACK', 'UP', 'LOWER_UP'],
+             'mtu': 65536, 'operstate': 'UNKNOWN', 'link_type': 'loopback',
+             'address': '00:00:00:00:00:00',
+             'addr_info': [{'family': 'inet', 'local': '127.0.0.1', 'prefixlen': 8},
+                           {'family': 'inet6', 'local': '::1', 'prefixlen': 128}]},
+            {'ifindex': 2, 'ifname': 'eth0', 'flags': ['BROADCAST', 'MULTICAST', 'UP', 'LOWER_UP'],
+             'mtu': 1500, 'operstate': 'UP', 'link_type': 'ether', 'address': '00:53:00:00:00:01',
+             'addr_info': [{'family': 'inet6', 'local': 'fe80::253:ff:fe00:1', 'prefixlen': 64},
+                           {'family': 'inet', 'local': '192.0.2.1', 'prefixlen': 24},
+                           {'family': 'inet6', 'local': '2001:db8::1', 'prefixlen': 64}]},
+            {'ifindex': 3, 'ifname': 'MGMT', 'flags': ['NOARP', 'MASTER', 'UP', 'LOWER_UP'],
+             'mtu': 65575, 'operstate': 'UP', 'link_type': 'ether', 'address': '00:53:00:00:00:02',
+             'addr_info': []},
+            {'ifindex': 4, 'ifname': 'tun0', 'flags': ['POINTOPOINT', 'NOARP'],
+             'mtu': 1452, 'operstate': 'DOWN', 'link_type': 'tunnel6', 'address': '::',
+             'addr_info': []}]
+    for i in range(1, vlans + 1):
+        addr.append({'ifindex': 4 + i, 'ifname': f'eth0.{i}', 'link': 'eth0',
+                     'flags': ['BROADCAST', 'MULTICAST', 'UP', 'LOWER_UP'], 'mtu': 1500,
+                     'operstate': 'UP' if i % 10 else 'LOWERLAYERDOWN',
+                     'link_type': 'ether', 'address': '00:53:00:00:00:01',
+                     'addr_info': [{'family': 'inet', 'local': f'10.{i >> 8}.{i & 0xff}.1',
+                                    'prefixlen': 24}]})
+
+    link = []
+    for entry in addr:
+        entry = {k: v for k, v in entry.items() if k != 'addr_info'}
+        index = entry['ifindex']
+        entry['stats64'] = {'rx': {'bytes': index * 1000, 'packets': index * 10, 'errors': 0,
+                                   'dropped': 1, 'over_errors': 0, 'multicast': 2},
+                            'tx': {'bytes': index * 2000, 'packets': index * 20, 'errors': 0,
+                                   'dropped': 0, 'carrier_errors': 3, 'collisions': 0}}
+        if entry['ifname'].startswith('eth0.'):
+            entry['ifalias'] = f"customer {entry['ifname']}"
+            if index % 2:
+                entry['master'] = 'MGMT'
+                entry['linkinfo'] = {'info_kind': 'vlan', 'info_slave_kind': 'vrf'}
+        link.append(entry)
+    return addr, link
+
+def fake_text(addr):
+    lines = []
+    for entry in addr:
+        link = f"@{entry['link']}" if 'link' in entry else ''
+        lines.append(f"{entry['ifindex']}: {entry['ifname']}{link}: "
+                     f"<{','.join(entry['flags'])}> mtu {entry['mtu']} state {entry['operstate']}")
+        lines.append(f"    link/{entry['link_type']} {entry['address']}")
+        for a in entry['addr_info']:
+            lines.append(f"    {a['family']} {a['local']}/{a['prefixlen']} scope global")
+    return '\n'.join(lines)
+
+class FakeIp:
+    def __init__(self, vlans):
+        addr, link = fake_dump(vlans)
+        self.output = {
+            'ip -json addr show': json.dumps(addr),
+            'ip -json -detail -statistics link show': json.dumps(link),
+            'ip -json -6 tun show': json.dumps([{'ifname': 'tun0', 'mode': 'ip6ip6',
+                                                 'hoplimit': 64, 'ip6_tnl_f_use_orig_tclass': True}]),
+            'ip addr show': fake_text(addr),
+        }
+        self.commands = []
+
+    def __call__(self, command):
+        self.commands.append(command)
+        return self.output[command]
+
+class TestInterfaceSnapshot(TestCase):
+    def setUp(self):
+        self.ip = FakeIp(vlan_count)
+        self.cmd = patch('vyos.ifconfig.snapshot.cmd', self.ip)
+        self.cmd.start()
+
+    def tearDown(self):
+        self.cmd.stop()
+
+    def test_snapshot(self):
+        snapshot = vyos.ifconfig.InterfaceSnapshot()
+        self.assertEqual(snapshot.get_addr('eth0'),
+                         ['192.0.2.1/24', 'fe80::253:ff:fe00:1/64', '2001:db8::1/64'])
+        self.assertEqual(snapshot.get_mtu('eth0'), 1500)
+        self.assertEqual(snapshot.get_oper_state('eth0.10'), 'lowerlayerdown')
+        self.assertEqual(snapshot.get_admin_state('tun0'), 'down')
+        self.assertEqual(snapshot.get_vrf('eth0.1'), 'MGMT')
+        self.assertIsNone(snapshot.get_vrf('eth0.2'))
+        self.assertEqual(snapshot.get_alias('eth0.2'), 'customer eth0.2')
+        self.assertEqual(snapshot.get_alias('eth0'), '')
+        self.assertEqual(snapshot.get_stats('eth0')['rx_bytes'], 2000)
+        self.assertEqual(snapshot.get_stats('eth0')['tx_carrier_errors'], 3)
+        self.assertEqual(snapshot.get_text('eth0.1'),
+                         '\n'.join(['eth0.1@eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 state UP',
+                                    '    link/ether 00:53:00:00:00:01',
+                                    '    inet 10.0.1.1/24 scope global']))
+        self.assertEqual(snapshot.get_text('eth9'), '')
+        self.assertEqual(len(self.ip.commands), 3)
+
+    def test_summary(self):
+        data = interfaces._get_summary_data(None, None, False, False)
+        self.assertEqual(self.ip.commands, ['ip -json -detail -statistics link show',
+                                            'ip -json addr show'])
+        self.assertEqual([intf['ifname'] for intf in data[:4]],
+                         ['eth0', 'eth0.1', 'eth0.2', 'eth0.3'])
+        self.assertEqual(data[1], {'ifname': 'eth0.1', 'oper_state': 'up', 'admin_state': 'up',
+                                   'addr': ['10.0.1.1/24'], 'description': 'customer eth0.1',
+                                   'mtu': 1500, 'mac': '00:53:00:00:00:01', 'vrf': 'MGMT'})
+        self.assertEqual(data[0]['addr'], ['192.0.2.1/24', '2001:db8::1/64'])
+
+        data = interfaces._get_summary_data(None, 'tunnel', False, False)
+        self.assertEqual([intf['ifname'] for intf in data], ['tun0'])
+        self.assertEqual(data[0]['mac'], 'n/a')
+
+    def test_show(self):
+        data = interfaces._get_raw_data('tun0', None, False, False)
+        self.assertEqual(data[0]['tunnel6'], {'ifname': 'tun0', 'mode': 'ip6ip6',
+                                              'hoplimit': 64, 'tclass': 'inherit'})
+        self.assertEqual(data[0]['stats']['rx_packets'], 40)
+
+        data = interfaces._get_raw_data(None, 'ethernet', True, False)
+        self.assertEqual(len(data), vlan_count)
+        self.assertEqual(data[0]['ifname'], 'eth0.1')
+        self.assertEqual(data[0]['description'], 'customer eth0.1')
+
+    def test_counters(self):
+        data = interfaces._get_counter_data(None, None, False, False)
+        self.assertEqual(self.ip.commands, ['ip -json -detail -statistics link show'])
+        # interfaces which are not up are skipped
+        self.assertEqual(len(data), 2 + vlan_count - vlan_count // 10)
+        self.assertEqual(data[0], {'ifname': 'eth0', 'rx_packets': 20, 'rx_bytes': 2000,
+                                   'tx_packets': 40, 'tx_bytes': 4000, 'rx_dropped': 1,
+                                   'tx_dropped': 0, 'rx_over_errors': 0, 'tx_carrier_errors': 3})
+
+    def test_ip_calls(self):
+        for func in (interfaces._get_raw_data, interfaces._get_summary_data,
+                     interfaces._get_counter_data):
+            self.ip.commands = []
+            func(None, None, False, False)
+            # addresses, links and the tunnel6 parameters at most
+            self.assertLessEqual(len(self.ip.commands), 3)
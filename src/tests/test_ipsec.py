@@ -0,0 +1,239 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import sys
+import socket
+import types
+
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import vyos.ipsec
+import vyos.opmode
+
+sys.path.append(os.path.dirname(__file__))
+from helper import prepare_module
+
+op_mode_dir = os.path.join(os.path.dirname(__file__), '..', 'op_mode')
+prepare_module(os.path.join(op_mode_dir, 'ipsec.py'), 'op_mode_ipsec')
+import op_mode_ipsec as ipsec
+
+def vici_dump(peers, tunnels=4):
+    # list-conns and list-sas as returned by vici after convert_data()
+    conns = []
+    sas = []
+    for i in range(peers):
+        name = f'peer-{i}'
+        children = {f'{name}-tunnel-{t}': {'mode': 'TUNNEL',
+                                           'local-ts': [f'10.{i >> 8 & 0xff}.{i & 0xff}.0/24'],
+                                           'remote-ts': [f'172.{16 + t}.{i & 0xff}.0/24'],
+                                           'dpd_action': 'restart', 'close_action': 'none'}
+                    for t in range(tunnels)}
+        conns.append({name: {'remote_addrs': [f'192.0.2.{i & 0xff}'], 'version': 'IKEv2',
+                             'local-1': {'id': '192.0.2.254'},
+                             'remote-1': {'id': f'192.0.2.{i & 0xff}'},
+                             'children': children}})
+        # every third peer is down, every fifth has a rekeyed duplicate IKE SA
+        if i % 3 == 0:
+            continue
+        for dup in range(2 if i % 5 == 0 else 1):
+            child_sas = {}
+            for t in range(tunnels):
+                # the last tunnel of a peer is not installed
+                state = 'INSTALLED' if t < tunnels - 1 else 'REKEYED'
+                uniqueid = i * tunnels + t + dup * 100000
+                child_sas[f'{name}-tunnel-{t}-{uniqueid}'] = {
+                    'name': f'{name}-tunnel-{t}', 'uniqueid': str(uniqueid),
+                    'state': state, 'mode': 'TUNNEL', 'encr-alg': 'AES_GCM_16',
+                    'encr-keysize': '256', 'bytes-in': '0', 'bytes-out': '0'}
+            sas.append({name: {'uniqueid': str(i + dup * 100000), 'version': '2',
+                               'state': 'CONNECTING' if dup else 'ESTABLISHED',
+                               'remote-host': f'192.0.2.{i & 0xff}',
+                               'encr-alg': 'AES_CBC', 'encr-keysize': '256',
+                               'integ-alg': 'HMAC_SHA2_256_128', 'dh-group': 'MODP_2048',
+                               'child-sas': child_sas}})
+    return conns, sas
+
+def scan_join(list_connections, list_sas):
+    # connection view as built by scanning all SAs per connection and tunnel
+    result = []
+    for connections in list_connections:
+        for connection, conn_conf in connections.items():
+            matching = [sa[connection] for sa in list_sas if connection in sa]
+            first = matching[0] if matching else None
+            up = any(sa['state'].lower() == 'established' for sa in matching)
+            children = []
+            for tunnel in conn_conf['children']:
+                child_sas = [v for v in first['child-sas'].values()
+                             if v['name'] == tunnel] if first else []
+                installed = [v for v in child_sas if v['state'] == 'INSTALLED']
+                children.append((tunnel, 'up' if installed else 'down',
+                                 installed[-1] if installed else ({} if first else None)))
+            result.append((connection, 'up' if up else 'down', children))
+    return result
+
+class TestIPsecConnections(TestCase):
+    def test_connections(self):
+        conns, sas = vici_dump(60)
+        data = ipsec._get_raw_data_connections(conns, sas)
+        self.assertEqual([(c['ike_connection_name'], c['ike_connection_state'],
+                           [(t['name'], t['state'], t['sa']) for t in c['children']])
+                          for c in data], scan_join(conns, sas))
+
+        self.assertIsNone(data[0]['ike_proposal'])
+        self.assertEqual(data[0]['children'][0]['esp_proposal'], {})
+        self.assertEqual(data[1]['ike_proposal'],
+                         {'cipher': 'AES', 'mode': 'CBC', 'key_size': '256',
+                          'hash': 'HMAC_SHA2_256_128', 'dh': 'MODP_2048'})
+        self.assertEqual(data[1]['children'][0]['esp_proposal']['mode'], 'GCM')
+
+        summary = ipsec._get_raw_connections_summary(conns, sas)
+        self.assertEqual(summary['total'], 240)
+        self.assertEqual(summary['up'], 40 * 3)
+
+class CommandException(Exception):
+    pass
+
+class SessionException(Exception):
+    pass
+
+class FakeViciSession:
+    # stands in for vici.Session, fails like a broken socket on demand
+    sessions = []
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.requests = []
+        self.broken = False
+        FakeViciSession.sessions.append(self)
+
+    def _request(self, command, args):
+        if self.broken:
+            raise BrokenPipeError()
+        self.requests.append((command, args))
+        if args.get('other-host') == '198.51.100.1':
+            raise CommandException('unreachable')
+        yield {'command': command}
+
+    def list_sas(self, args={}):
+        return self._request('list-sas', args)
+
+    def terminate(self, args):
+        return self._request('terminate', args)
+
+    def initiate(self, args):
+        return self._request('initiate', args)
+
+class TestViciSession(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'charon.vici')
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+
+        FakeViciSession.sessions = []
+        vici = types.ModuleType('vici')
+        vici.Session = FakeViciSession
+        exception = types.ModuleType('vici.exception')
+        exception.CommandException = CommandException
+        exception.SessionException = SessionException
+        self.modules = patch.dict(sys.modules, {'vici': vici, 'vici.exception': exception})
+        self.modules.start()
+        self.session = patch('vyos.ipsec._vici_session', vyos.ipsec.ViciSession(path))
+        self.session.start()
+
+    def tearDown(self):
+        self.session.stop()
+        self.modules.stop()
+        self.server.close()
+        self.tmpdir.cleanup()
+
+    def test_session_reuse(self):
+        spokes = [('dmvpn-NHRP-tun0', 'dmvpn', '192.0.2.1', f'203.0.113.{i}')
+                  for i in range(1, 101)]
+        vyos.ipsec.get_vici_sas_by_name('dmvpn-NHRP-tun0', None)
+        vyos.ipsec.terminate_vici_by_name('dmvpn-NHRP-tun0', None)
+        self.assertTrue(vyos.ipsec.vici_initiate_list(spokes))
+        self.assertEqual(len(FakeViciSession.sessions), 1)
+        self.assertEqual(len(FakeViciSession.sessions[0].requests), 102)
+
+        # the session is re-opened once the connection broke
+        FakeViciSession.sessions[0].broken = True
+        self.assertEqual(vyos.ipsec.get_vici_sas(), [{'command': 'list-sas'}])
+        self.assertEqual(len(FakeViciSession.sessions), 2)
+
+    def test_batch_failures(self):
+        spokes = [('dmvpn-NHRP-tun0', 'dmvpn', '192.0.2.1', address)
+                  for address in ('203.0.113.1', '198.51.100.1', '203.0.113.2')]
+        with self.assertRaises(vyos.ipsec.ViciCommandError) as e:
+            vyos.ipsec.vici_initiate_list(spokes)
+        self.assertIn('198.51.100.1', str(e.exception))
+        # a failed command does not affect the session or the other requests
+        self.assertEqual(len(FakeViciSession.sessions), 1)
+        self.assertEqual(len(FakeViciSession.sessions[0].requests), 3)
+
+    def test_retry(self):
+        vyos.ipsec.get_vici_sas()
+        # read-only commands are sent again on a new session
+        FakeViciSession.sessions[0].broken = True
+        self.assertEqual(vyos.ipsec.get_vici_sas(), [{'command': 'list-sas'}])
+        self.assertEqual(len(FakeViciSession.sessions), 2)
+
+        # charon may have acted on a command before the connection broke
+        FakeViciSession.sessions[1].broken = True
+        with self.assertRaises(vyos.ipsec.ViciCommandError):
+            vyos.ipsec.vici_initiate('dmvpn-NHRP-tun0', 'dmvpn', '192.0.2.1', '203.0.113.1')
+        self.assertEqual(len(FakeViciSession.sessions), 2)
+        self.assertTrue(vyos.ipsec.vici_initiate('dmvpn-NHRP-tun0', 'dmvpn', '192.0.2.1',
+                                                 '203.0.113.1'))
+        self.assertEqual(len(FakeViciSession.sessions), 3)
+        self.assertEqual(len(FakeViciSession.sessions[2].requests), 1)
+
+    def test_closed_by_charon(self):
+        vyos.ipsec.get_vici_sas()
+        conn, _ = self.server.accept()
+        conn.close()
+        # the closed session is detected before the command is sent
+        vyos.ipsec.terminate_vici_by_name('dmvpn-NHRP-tun0', None)
+        self.assertEqual(len(FakeViciSession.sessions), 2)
+        self.assertEqual(FakeViciSession.sessions[1].requests,
+                         [('terminate', {'ike': 'dmvpn-NHRP-tun0'})])
+
+    def test_reset_profile_all(self):
+        ike_sa_name = 'dmvpn-NHRP-tun0'
+        sa_list = [{ike_sa_name: {'local-host': '192.0.2.1', 'remote-host': address}}
+                   for address in ('203.0.113.1', '198.51.100.1', '203.0.113.2')]
+        output = io.StringIO()
+        with patch.object(ipsec, 'convert_data', lambda data: data), \
+                patch('vyos.ipsec.get_vici_sas_by_name', lambda ike, child: sa_list), \
+                redirect_stdout(output):
+            with self.assertRaises(vyos.opmode.IncorrectValue) as e:
+                ipsec.reset_profile_all('NHRP', 'tun0')
+        self.assertIn('198.51.100.1', str(e.exception))
+        # every peer is reset and reported
+        self.assertEqual(len(FakeViciSession.sessions[0].requests), 4)
+        self.assertEqual(output.getvalue().splitlines(), [
+            'Profile NHRP tunnel tun0 remote-host 203.0.113.1 reset result: success',
+            'Profile NHRP tunnel tun0 remote-host 198.51.100.1 reset result: failed',
+            'Profile NHRP tunnel tun0 remote-host 203.0.113.2 reset result: success'])
+
+    def test_not_initialized(self):
+        with patch('vyos.ipsec._vici_session', vyos.ipsec.ViciSession('/non-existent')):
+            with self.assertRaises(vyos.ipsec.ViciInitiateError):
+                vyos.ipsec.get_vici_sas()
@@ -0,0 +1,131 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import socket
+import threading
+
+from ipaddress import ip_address
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import vyos.kea
+
+from vyos.kea import kea_get_leases
+from vyos.kea import kea_iter_leases
+
+lease_count = 12345
+
+def synthetic_leases(count):
+    return [{'ip-address': str(ip_address('100.64.0.0') + i),
+             'hw-address': f'00:53:00:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}',
+             'hostname': '{host}' if i % 100 == 0 else f'host-{i}',
+             'subnet-id': 1, 'state': 0, 'cltt': 1700000000, 'valid-lft': 3600}
+            for i in range(count)]
+
+class FakeKea(threading.Thread):
+    # answers lease commands on a UNIX control socket like kea-dhcp4
+    def __init__(self, path, leases, keep_open=False):
+        super().__init__(daemon=True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        os.chmod(path, 0o775)
+        self.server.listen()
+        self.leases = leases
+        self.keep_open = keep_open
+        self.commands = []
+
+    def run(self):
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                buf = ''
+                while True:
+                    buf += conn.recv(4096).decode()
+                    try:
+                        request, _ = decoder.raw_decode(buf)
+                        break
+                    except ValueError:
+                        continue
+                self.commands.append(request)
+                reply = json.dumps(self.reply(request)).encode()
+                # small writes produce short reads on the client side
+                for i in range(0, len(reply), 1000):
+                    conn.sendall(reply[i:i + 1000])
+                if self.keep_open:
+                    conn.recv(1)
+
+    def reply(self, request):
+        command = request['command']
+        args = request.get('arguments', {})
+        if command == 'lease4-get-all':
+            leases = self.leases
+            if 'subnets' in args:
+                leases = [l for l in leases if l['subnet-id'] in args['subnets']]
+            return {'result': 0, 'arguments': {'leases': leases}}
+        if command == 'lease4-get-page':
+            start = 0
+            if args['from'] != 'start':
+                start = int(ip_address(args['from'])) - int(ip_address('100.64.0.0')) + 1
+            leases = self.leases[start:start + args['limit']]
+            if not leases:
+                return {'result': 3, 'text': '0 IPv4 lease(s) found.'}
+            return {'result': 0, 'arguments': {'leases': leases, 'count': len(leases)}}
+        return {'result': 2, 'text': f"'{command}' command not supported."}
+
+class TestKeaControlSocket(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.leases = synthetic_leases(lease_count)
+        self.ctrl_socket = vyos.kea.kea_ctrl_socket
+        vyos.kea.kea_ctrl_socket = os.path.join(self.tmpdir.name, 'dhcp{inet}-ctrl-socket')
+
+    def tearDown(self):
+        self.kea.server.close()
+        vyos.kea.kea_ctrl_socket = self.ctrl_socket
+        self.tmpdir.cleanup()
+
+    def start(self, keep_open=False):
+        self.kea = FakeKea(vyos.kea.kea_ctrl_socket.format(inet='4'), self.leases,
+                           keep_open=keep_open)
+        self.kea.start()
+
+    def test_get_leases(self):
+        self.start()
+        self.assertEqual(kea_get_leases('4'), self.leases)
+
+    def test_get_leases_open_connection(self):
+        self.start(keep_open=True)
+        self.assertEqual(kea_get_leases('4'), self.leases)
+
+    def test_iter_leases(self):
+        self.start()
+        leases = kea_iter_leases('4', limit=1000)
+        self.assertEqual(next(leases), self.leases[0])
+        # nothing beyond the first page is requested before it is needed
+        self.assertEqual(len(self.kea.commands), 1)
+        self.assertEqual(list(leases), self.leases[1:])
+        self.assertEqual(len(self.kea.commands), lease_count // 1000 + 1)
+        self.assertEqual(self.kea.commands[1]['arguments'],
+                         {'from': '100.64.3.231', 'limit': 1000})
+
+    def test_iter_leases_empty(self):
+        self.leases = []
+        self.start()
+        self.assertEqual(list(kea_iter_leases('4')), [])
@@ -0,0 +1,135 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(__file__))
+from helper import prepare_module
+
+op_mode_dir = os.path.join(os.path.dirname(__file__), '..', 'op_mode')
+prepare_module(os.path.join(op_mode_dir, 'firewall.py'), 'op_mode_firewall')
+import op_mode_firewall as firewall
+
+chain_count = 500
+rule_count = 20
+
+def rule(family, chain, comment, expr):
+    return {'rule': {'family': family, 'table': 'vyos_filter', 'chain': chain,
+                     'handle': 1, 'comment': comment, 'expr': expr}}
+
+def counter(index):
+    return {'counter': {'packets': index, 'bytes': index * 100}}
+
+def fake_ruleset(chains, rules):
+    # ruleset as dumped by 'nft -j list ruleset'
+    objects = [{'metainfo': {'version': '1.0.9', 'json_schema_version': 1}},
+               {'table': {'family': 'ip', 'name': 'vyos_filter', 'handle': 1}}]
+    objects.append(rule('ip', 'VYOS_FORWARD_filter', 'ipv4-FWD-filter-5', [
+        {'match': {'op': '==', 'left': {'meta': {'key': 'iifname'}}, 'right': 'eth0'}},
+        counter(5), {'jump': {'target': 'NAME_WAN'}}]))
+    objects.append(rule('ip', 'VYOS_FORWARD_filter', 'FWD-filter default-action accept', [
+        counter(7), {'accept': None}]))
+    objects.append(rule('ip', 'VYOS_STATE_POLICY', None, [
+        {'match': {'op': 'in', 'left': {'ct': {'key': 'state'}}, 'right': 'established'}},
+        counter(11), {'accept': None}]))
+    objects.append(rule('ip', 'VYOS_STATE_POLICY', None, [
+        {'match': {'op': 'in', 'left': {'ct': {'key': 'state'}}, 'right': 'invalid'}},
+        counter(12), {'drop': None}]))
+    # rules 10 and 20 merged by the ruleset optimizer
+    objects.append(rule('ip', 'NAME_WAN', 'ipv4-NAM-WAN-10,20', [
+        {'match': {'op': '==', 'left': {'meta': {'key': 'l4proto'}}, 'right': 'tcp'}},
+        {'match': {'op': '==', 'left': {'payload': {'protocol': 'ip', 'field': 'saddr'}},
+                   'right': {'set': ['192.0.2.1', {'prefix': {'addr': '192.0.2.16', 'len': 28}}]}}},
+        counter(3),
+        {'vmap': {'key': {'payload': {'protocol': 'ip', 'field': 'saddr'}},
+                  'data': {'set': [['192.0.2.1', {'accept': None}],
+                                   [{'prefix': {'addr': '192.0.2.16', 'len': 28}},
+                                    {'jump': {'target': 'NAME_WEB'}}]]}}}]))
+    objects.append(rule('ip', 'NAME_WAN', 'ipv4-NAM-WAN-30', [
+        {'match': {'op': '!=', 'left': {'payload': {'protocol': 'tcp', 'field': 'dport'}},
+                   'right': {'set': [22, {'range': [1000, 2000]}]}}},
+        {'log': {'prefix': '[ipv4-NAM-WAN-30-D]'}}, counter(4), {'drop': None}]))
+    objects.append(rule('ip', 'NAME_WAN', 'WAN default-action drop', [counter(9), {'drop': None}]))
+    objects.append({'set': {'family': 'ip', 'name': 'DA_BLOCKED', 'table': 'vyos_filter',
+                            'type': 'ipv4_addr', 'handle': 2, 'flags': ['dynamic', 'timeout'],
+                            'elem': [{'elem': {'val': '198.51.100.1', 'timeout': 3600,
+                                               'expires': 1234}}, '198.51.100.2']}})
+    for i in range(chains):
+        for j in range(1, rules + 1):
+            objects.append(rule('ip', f'NAME_CHAIN{i}', f'ipv4-NAM-CHAIN{i}-{j}', [
+                {'match': {'op': '==', 'left': {'payload': {'protocol': 'ip', 'field': 'daddr'}},
+                           'right': f'10.0.{i & 0xff}.{j}'}},
+                counter(j), {'accept': None}]))
+        objects.append(rule('ip', f'NAME_CHAIN{i}', f'CHAIN{i} default-action drop',
+                            [counter(0), {'drop': None}]))
+    return json.dumps({'nftables': objects})
+
+class FakeNft:
+    def __init__(self, chains, rules):
+        self.output = {'nft -j list ruleset': fake_ruleset(chains, rules)}
+        self.commands = []
+
+    def __call__(self, command):
+        self.commands.append(command)
+        return self.output[command]
+
+class TestRulesetSnapshot(TestCase):
+    def setUp(self):
+        self.nft = FakeNft(chain_count, rule_count)
+        self.patches = [patch.object(firewall, 'cmd', self.nft),
+                        patch.object(firewall, 'ruleset', firewall.RulesetSnapshot())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_details(self):
+        details = firewall.get_nftables_details('ipv4', 'name', 'WAN')
+        self.assertEqual(set(details), {'10', '20', '30', 'default-action'})
+        self.assertIs(details['10'], details['20'])
+        self.assertEqual(details['10']['packets'], 3)
+        self.assertEqual(details['10']['conditions'],
+                         'meta l4proto tcp ip saddr { 192.0.2.1, 192.0.2.16/28 } ip saddr vmap '
+                         '{ 192.0.2.1 : accept, 192.0.2.16/28 : jump NAME_WEB }')
+        self.assertEqual(details['30'], {'packets': 4, 'bytes': 400,
+                                         'conditions': 'tcp dport != { 22, 1000-2000 }'})
+        self.assertEqual(details['default-action'], {'packets': 9, 'bytes': 900, 'conditions': ''})
+
+        details = firewall.get_nftables_details('ipv4', 'forward', 'filter')
+        self.assertEqual(details['5']['conditions'], 'iifname eth0 jump NAME_WAN')
+        self.assertEqual(details['default-action']['packets'], 7)
+        self.assertEqual(firewall.get_nftables_details('ipv6', 'forward', 'filter'), {})
+
+        state = firewall.get_nftables_state_details('ipv4')
+        self.assertEqual(set(state), {'established', 'invalid'})
+        self.assertEqual(state['invalid']['packets'], 12)
+
+        self.assertEqual(firewall.get_nftables_group_members('ipv4', 'vyos_filter', 'DA_BLOCKED'),
+                         [{'val': '198.51.100.1', 'timeout': 3600, 'expires': 1234}, '198.51.100.2'])
+        self.assertEqual(firewall.get_nftables_group_members('ipv6', 'vyos_filter', 'DA6_BLOCKED'), [])
+        self.assertEqual(self.nft.commands, ['nft -j list ruleset'])
+
+    def test_all_chains(self):
+        for i in range(chain_count):
+            details = firewall.get_nftables_details('ipv4', 'name', f'CHAIN{i}')
+            self.assertEqual(len(details), rule_count + 1)
+        # one ruleset dump for all chains
+        self.assertEqual(len(self.nft.commands), 1)
@@ -0,0 +1,161 @@
+# Copyright (C) 2024 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from vyos.xml_ref import load_reference
+from vyos.xml_ref.binary_cache import BinaryReference
+from vyos.xml_ref.binary_cache import write_index
+from vyos.xml_ref.definition import Xml
+from vyos.xml_ref.definition import XmlIndex
+
+def node(node_type, multi=False, valueless=False, default_value=None,
+         owner=None, priority=None, **children):
+    return {'node_data': {'node_type': node_type, 'multi': multi,
+                          'valueless': valueless,
+                          'default_value': default_value,
+                          'owner': owner, 'priority': priority},
+            **children}
+
+def synthetic_reference():
+    return {
+        'firewall': node('node', owner='${vyos_conf_scripts_dir}/firewall.py',
+                         priority='319', ipv4=node('node', name=node('tag',
+            **{'default-action': node('leaf', default_value='drop'),
+               'rule': node('tag', **{
+                   'action': node('leaf'),
+                   'log': node('leaf', valueless=True),
+                   'source': node('node', address=node('leaf'),
+                                  port=node('leaf')),
+               })}))),
+        'system': node('node', **{
+            'host-name': node('leaf', default_value='vyos'),
+            'name-server': node('leaf', multi=True),
+            'option': node('node', **{'ssh-client': node('leaf', multi=True,
+                                                         default_value='a b')}),
+        }),
+        'component_version': {'firewall': '15', 'system': '27'},
+    }
+
+paths = [
+    [], ['firewall'], ['firewall', 'ipv4'], ['firewall', 'ipv4', 'name'],
+    ['firewall', 'ipv4', 'name', 'FOO'],
+    ['firewall', 'ipv4', 'name', 'FOO', 'default-action'],
+    ['firewall', 'ipv4', 'name', 'FOO', 'rule'],
+    ['firewall', 'ipv4', 'name', 'FOO', 'rule', '10'],
+    ['firewall', 'ipv4', 'name', 'FOO', 'rule', '10', 'log'],
+    ['firewall', 'ipv4', 'name', 'FOO', 'rule', '10', 'source', 'port'],
+    ['system', 'host-name'], ['system', 'host-name', 'vyos'],
+    ['system', 'name-server'], ['system', 'option', 'ssh-client'],
+    ['system', 'non-existent'], ['non-existent'],
+]
+
+def result(func, path):
+    try:
+        return func(path)
+    except ValueError:
+        return ValueError
+
+class TestXmlRefIndex(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.ref = synthetic_reference()
+        self.bin = os.path.join(self.tmpdir.name, 'cache.bin')
+        write_index(self.ref, self.bin)
+
+        self.xml = Xml()
+        self.xml.define(self.ref)
+        self.xml_index = XmlIndex(BinaryReference(self.bin), lambda: self.ref)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_queries(self):
+        for path in paths:
+            for q in ('is_tag', 'is_tag_value', 'is_multi', 'is_valueless',
+                      'is_leaf', 'default_value', 'owner', 'priority'):
+                self.assertEqual(result(getattr(self.xml_index, q), path),
+                                 result(getattr(self.xml, q), path),
+                                 msg=f'{q}({path})')
+        self.assertEqual(self.xml_index.component_version(),
+                         self.xml.component_version())
+
+    def test_lazy_dict(self):
+        loaded = []
+        def loader():
+            loaded.append(True)
+            return self.ref
+        xml_index = XmlIndex(BinaryReference(self.bin), loader)
+        xml_index.is_tag(['firewall', 'ipv4', 'name'])
+        xml_index.default_value(['system', 'host-name'])
+        self.assertFalse(loaded)
+        self.assertEqual(xml_index.get_defaults(['system'], recursive=True),
+                         self.xml.get_defaults(['system'], recursive=True))
+        self.assertTrue(loaded)
+
+    def test_load_reference(self):
+        cache_py = os.path.join(self.tmpdir.name, 'cache.py')
+        with open(cache_py, 'w') as f:
+            f.write('reference = {}')
+        os.utime(cache_py, (0, 0))
+        loaded = []
+        def loader():
+            loaded.append(True)
+            return self.ref
+        with patch('vyos.xml_ref.ref_cache', cache_py), \
+                patch('vyos.xml_ref.ref_cache_bin', self.bin), \
+                patch('vyos.xml_ref.load_reference_dict', loader):
+            # startup queries do not import the reference dict
+            xml = load_reference([])
+            self.assertIsInstance(xml, XmlIndex)
+            self.assertTrue(xml.is_tag(['firewall', 'ipv4', 'name']))
+            self.assertEqual(xml.default_value(['system', 'host-name']), 'vyos')
+            self.assertFalse(loaded)
+
+            # index older than cache.py
+            os.utime(self.bin, (0, 0))
+            os.utime(cache_py)
+            self.assertNotIsInstance(load_reference([]), XmlIndex)
+            self.assertTrue(loaded)
+
+class TestXmlPathCache(TestCase):
+    def test_multi_to_list_cache(self):
+        xml = Xml()
+        xml.define(synthetic_reference())
+        base = ['firewall', 'ipv4', 'name']
+        conf = {'FOO': {'default-action': 'accept',
+                        'rule': {str(i): {'action': 'accept',
+                                          'source': {'port': '22'}}
+                                 for i in range(1, 20001)}}}
+        xml.multi_to_list(base, conf)
+        # one entry per reference path, independent of the number of rules
+        misses = xml.cache_info()['misses']
+        self.assertEqual(misses, 10)
+        conf['BAR'] = conf.pop('FOO')
+        xml.multi_to_list(base, conf)
+        self.assertEqual(xml.cache_info()['misses'], misses)
+        self.assertGreater(xml.cache_info()['hits'], 0)
+        self.assertEqual(xml.multi_to_list(base, {'FOO': {'rule': {'10': {'log': {}}}}}),
+                         {'FOO': {'rule': {'10': {'log': {}}}}})
+        self.assertTrue(xml.is_tag(base + ['FOO', 'rule']))
+        self.assertFalse(xml.is_tag(base + ['FOO', 'rule', '10']))
+        with self.assertRaises(ValueError):
+            xml.is_tag(base + ['FOO', 'non-existent'])
+
+        xml.define(synthetic_reference())
+        self.assertEqual(xml.cache_info()['currsize'], 0)